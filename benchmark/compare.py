@@ -0,0 +1,78 @@
+"""
+Compare two benchmark reports and flag the metrics that got worse.
+
+    python -m benchmark.compare baseline.json current.json --threshold 10
+"""
+
+import argparse
+from json import load
+import sys
+
+# Metrics where a larger value is better, all others are costs
+HIGHER_IS_BETTER = ("_rate",)
+
+
+def load_report(path: str) -> dict:
+    with open(path, "r") as f:
+        return load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """
+    Print the change of the median of every metric present in both reports
+    and return the regressions beyond the threshold, in percent.
+    """
+    regressions = []
+
+    for scenario, metrics in current["results"].items():
+        print(scenario)
+
+        for metric, values in metrics.items():
+            before = baseline["results"].get(scenario, {}).get(metric)
+
+            if before is None or before["median"] == 0:
+                print(f"  {metric:<36} {values['median']:>10.2f} (new)")
+                continue
+
+            change = (values["median"] - before["median"]) / before["median"] * 100
+            worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+            flag = "REGRESSION" if worse > threshold else ""
+
+            print(
+                f"  {metric:<36} {before['median']:>10.2f} -> "
+                f"{values['median']:>10.2f} {values['unit']:<6} {change:+7.1f}% {flag}"
+            )
+
+            if flag:
+                regressions.append(f"{scenario}.{metric}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="Change, in percent, beyond which a metric is a regression",
+    )
+    args = parser.parse_args()
+
+    baseline, current = load_report(args.baseline), load_report(args.current)
+
+    for key in ("delays", "log_size", "status_updates"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"Warning: the reports differ in {key}, medians may not compare")
+
+    regressions = compare(baseline, current, args.threshold)
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+"""
+Stand-in for the Kubernetes API server, serving the calls the q8s client makes
+and playing the lifecycle of jobs and their pods with configurable delays.
+"""
+
+from copy import deepcopy
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from time import monotonic, sleep
+from urllib.parse import parse_qs, urlparse
+
+import yaml
+
+NAMESPACE = "bench"
+
+# Kinds served, by the collection segment of their path
+KINDS = {
+    "jobs": "Job",
+    "pods": "Pod",
+    "configmaps": "ConfigMap",
+    "secrets": "Secret",
+}
+
+PATH = re.compile(
+    r"^/(?:api/v1|apis/batch/v1)/namespaces/(?P<namespace>[^/]+)"
+    r"/(?P<collection>jobs|pods|configmaps|secrets)"
+    r"(?:/(?P<name>[^/]+))?(?:/(?P<subresource>log))?$"
+)
+
+
+@dataclass
+class Delays:
+    """
+    Simulated cluster behaviour, delays in seconds.
+    """
+
+    schedule: float = 0.0
+    pull: float = 0.0
+    run: float = 0.0
+    # Size, in bytes, of the output of every pod
+    log_size: int = 1024
+    # Job status updates sent while the pod runs, to load the watch
+    status_updates: int = 0
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def matches(obj: dict, label_selector: str | None, field_selector: str | None):
+    labels = obj["metadata"].get("labels") or {}
+
+    for requirement in (label_selector or "").split(","):
+        if not requirement:
+            continue
+        key, _, value = requirement.partition("=")
+        if key not in labels or (value and labels[key] != value):
+            return False
+
+    for requirement in (field_selector or "").split(","):
+        if not requirement:
+            continue
+        path, _, value = requirement.partition("=")
+        current = obj
+        for segment in path.split("."):
+            current = (current or {}).get(segment)
+        if current != value:
+            return False
+
+    return True
+
+
+class Cluster:
+    """
+    Objects of the fake cluster with the history of their changes, so that
+    watches can resume from a resource version.
+    """
+
+    def __init__(self, delays: Delays):
+        self.delays = delays
+        self.objects: dict[str, dict[str, dict]] = {kind: {} for kind in KINDS}
+        self.history: list[tuple[int, str, str, dict]] = []
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def record(self, collection: str, event_type: str, obj: dict):
+        with self.changed:
+            self.version += 1
+            obj["metadata"]["resourceVersion"] = str(self.version)
+
+            if event_type == "DELETED":
+                self.objects[collection].pop(obj["metadata"]["name"], None)
+            else:
+                self.objects[collection][obj["metadata"]["name"]] = obj
+
+            self.history.append((self.version, collection, event_type, deepcopy(obj)))
+            self.changed.notify_all()
+
+    def create(self, collection: str, obj: dict) -> dict:
+        obj.setdefault("metadata", {})
+        obj["metadata"]["namespace"] = NAMESPACE
+        obj["metadata"]["uid"] = f"uid-{obj['metadata']['name']}"
+        obj["metadata"]["creationTimestamp"] = now()
+        obj["apiVersion"] = "batch/v1" if collection == "jobs" else "v1"
+        obj["kind"] = KINDS[collection]
+
+        if collection == "jobs":
+            obj["status"] = {}
+
+        self.record(collection, "ADDED", obj)
+
+        if collection == "jobs" and not obj["spec"].get("suspend"):
+            self.start(obj)
+
+        return obj
+
+    def patch(self, collection: str, name: str, patch: dict) -> dict:
+        obj = deepcopy(self.objects[collection][name])
+        suspended = obj["spec"].get("suspend")
+        obj["spec"].update(patch.get("spec", {}))
+        self.record(collection, "MODIFIED", obj)
+
+        if collection == "jobs" and suspended and not obj["spec"].get("suspend"):
+            self.start(obj)
+
+        return obj
+
+    def delete(self, collection: str, name: str) -> dict:
+        obj = self.objects[collection][name]
+        self.record(collection, "DELETED", deepcopy(obj))
+
+        if collection == "jobs":
+            for pod in list(self.objects["pods"].values()):
+                if pod["metadata"]["labels"].get("job-name") == name:
+                    self.record("pods", "DELETED", deepcopy(pod))
+
+        return obj
+
+    def start(self, job: dict):
+        threading.Thread(target=self.__run_job, args=(job,), daemon=True).start()
+
+    def __update(self, collection: str, name: str, change):
+        with self.changed:
+            if name not in self.objects[collection]:
+                return None
+            obj = deepcopy(self.objects[collection][name])
+        change(obj)
+        self.record(collection, "MODIFIED", obj)
+        return obj
+
+    def __run_job(self, job: dict):
+        """
+        Play the lifecycle of the single pod of the job.
+        """
+        name = job["metadata"]["name"]
+        template = job["spec"]["template"]
+        container = template["spec"]["containers"][0]
+        pod_name = f"{name}-{len(self.history)}"
+
+        pod = {
+            "metadata": {
+                "name": pod_name,
+                "labels": {**template["metadata"].get("labels", {}), "job-name": name},
+            },
+            "spec": deepcopy(template["spec"]),
+            "status": {"phase": "Pending", "conditions": []},
+        }
+        self.create("pods", pod)
+
+        def condition(kind):
+            return {"type": kind, "status": "True", "lastTransitionTime": now()}
+
+        def container_status(state):
+            return [
+                {
+                    "name": container["name"],
+                    "image": container.get("image") or "image",
+                    "imageID": "",
+                    "ready": True,
+                    "restartCount": 0,
+                    "state": state,
+                }
+            ]
+
+        sleep(self.delays.schedule)
+        self.__update(
+            "pods",
+            pod_name,
+            lambda p: p["status"]["conditions"].append(condition("PodScheduled")),
+        )
+        self.__update(
+            "pods",
+            pod_name,
+            lambda p: p["status"]["conditions"].append(
+                condition("PodReadyToStartContainers")
+            ),
+        )
+
+        sleep(self.delays.pull)
+        started = now()
+
+        def running(p):
+            p["status"]["phase"] = "Running"
+            p["status"]["containerStatuses"] = container_status(
+                {"running": {"startedAt": started}}
+            )
+
+        if self.__update("pods", pod_name, running) is None:
+            return
+
+        def active(j):
+            j["status"] = {"active": 1, "startTime": started}
+
+        self.__update("jobs", name, active)
+
+        deadline = monotonic() + self.delays.run
+        for update in range(self.delays.status_updates):
+            sleep(
+                max(0, deadline - monotonic()) / (self.delays.status_updates - update)
+            )
+            if self.__update("jobs", name, lambda j: None) is None:
+                return
+        sleep(max(0, deadline - monotonic()))
+
+        finished = now()
+
+        def succeeded(p):
+            p["status"]["phase"] = "Succeeded"
+            p["status"]["containerStatuses"] = container_status(
+                {
+                    "terminated": {
+                        "exitCode": 0,
+                        "startedAt": started,
+                        "finishedAt": finished,
+                    }
+                }
+            )
+
+        self.__update("pods", pod_name, succeeded)
+
+        def complete(j):
+            j["status"] = {
+                "succeeded": 1,
+                "startTime": started,
+                "completionTime": finished,
+                "conditions": [
+                    {
+                        "type": "Complete",
+                        "status": "True",
+                        "lastTransitionTime": finished,
+                    }
+                ],
+            }
+
+        self.__update("jobs", name, complete)
+
+    def pod_finished(self, name: str) -> bool:
+        pod = self.objects["pods"].get(name)
+        return pod is None or pod["status"]["phase"] in ("Succeeded", "Failed")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, keep them from waiting on
+    # delayed acknowledgements
+    disable_nagle_algorithm = True
+    cluster: Cluster
+
+    def log_message(self, format, *args):
+        pass
+
+    def __json(self, status: int, body: dict):
+        data = dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def __not_found(self, name: str):
+        self.__json(
+            404,
+            {"kind": "Status", "status": "Failure", "reason": "NotFound", "code": 404},
+        )
+
+    def __start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def __chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def __end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def __body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return loads(self.rfile.read(length)) if length else {}
+
+    def __route(self):
+        url = urlparse(self.path)
+        match = PATH.match(url.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        return match, query
+
+    def do_GET(self):
+        match, query = self.__route()
+
+        if match is None:
+            return self.__not_found(self.path)
+
+        collection, name = match["collection"], match["name"]
+
+        if match["subresource"] == "log":
+            return self.__log(name, query.get("follow", "").lower() == "true")
+
+        if name is not None:
+            obj = self.cluster.objects[collection].get(name)
+            return self.__not_found(name) if obj is None else self.__json(200, obj)
+
+        if query.get("watch", "").lower() == "true":
+            return self.__watch(collection, query)
+
+        items = [
+            obj
+            for obj in list(self.cluster.objects[collection].values())
+            if matches(obj, query.get("labelSelector"), query.get("fieldSelector"))
+        ]
+        self.__json(
+            200,
+            {
+                "kind": f"{KINDS[collection]}List",
+                "apiVersion": "v1",
+                "metadata": {"resourceVersion": str(self.cluster.version)},
+                "items": items,
+            },
+        )
+
+    def __watch(self, collection: str, query: dict):
+        cluster = self.cluster
+        deadline = monotonic() + int(query.get("timeoutSeconds", 60))
+        labels, fields = query.get("labelSelector"), query.get("fieldSelector")
+
+        self.__start_chunked("application/json")
+
+        with cluster.changed:
+            if "resourceVersion" in query:
+                version = int(query["resourceVersion"])
+                pending = []
+            else:
+                # Start with the current state of the selected objects
+                version = cluster.version
+                pending = [
+                    ("ADDED", deepcopy(obj))
+                    for obj in cluster.objects[collection].values()
+                ]
+
+        try:
+            while True:
+                for event_type, obj in pending:
+                    if matches(obj, labels, fields):
+                        self.__chunk(
+                            (dumps({"type": event_type, "object": obj}) + "\n").encode()
+                        )
+
+                with cluster.changed:
+                    cluster.changed.wait_for(
+                        lambda: cluster.version > version or monotonic() >= deadline,
+                        timeout=max(0, deadline - monotonic()),
+                    )
+                    pending = [
+                        (event_type, obj)
+                        for v, c, event_type, obj in cluster.history[version:]
+                        if c == collection
+                    ]
+                    version = cluster.version
+
+                if not pending and monotonic() >= deadline:
+                    break
+
+            self.__end_chunked()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def __log(self, name: str, follow: bool):
+        size = self.cluster.delays.log_size
+        line = b"x" * 79 + b"\n"
+        output = (line * (size // len(line) + 1))[:size]
+
+        if not follow:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(output)))
+            self.end_headers()
+            self.wfile.write(output)
+            return
+
+        self.__start_chunked("text/plain")
+
+        try:
+            for offset in range(0, len(output), 16 * 1024):
+                self.__chunk(output[offset : offset + 16 * 1024])
+
+            with self.cluster.changed:
+                self.cluster.changed.wait_for(
+                    lambda: self.cluster.pod_finished(name), timeout=60
+                )
+
+            self.__end_chunked()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        match, _ = self.__route()
+        collection = match["collection"]
+        obj = self.__body()
+
+        if obj["metadata"]["name"] in self.cluster.objects[collection]:
+            return self.__json(
+                409,
+                {"kind": "Status", "reason": "AlreadyExists", "code": 409},
+            )
+
+        self.__json(201, self.cluster.create(collection, obj))
+
+    def do_PATCH(self):
+        match, _ = self.__route()
+
+        if match["name"] not in self.cluster.objects[match["collection"]]:
+            return self.__not_found(match["name"])
+
+        self.__json(
+            200, self.cluster.patch(match["collection"], match["name"], self.__body())
+        )
+
+    def do_DELETE(self):
+        match, _ = self.__route()
+        self.__body()
+
+        if match["name"] not in self.cluster.objects[match["collection"]]:
+            return self.__not_found(match["name"])
+
+        self.__json(200, self.cluster.delete(match["collection"], match["name"]))
+
+
+def serve(delays: Delays, connection):
+    cluster = Cluster(delays)
+    handler = type("BoundHandler", (Handler,), {"cluster": cluster})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+
+    connection.send(server.server_address)
+    server.serve_forever()
+
+
+class FakeKubernetes:
+    """
+    Fake API server running in a child process, so that it takes no CPU time
+    from the measured client, with a kubeconfig file pointing at it.
+    """
+
+    def __init__(self, delays: Delays = None):
+        self.delays = delays or Delays()
+        self.kubeconfig = None
+
+    def __kubeconfig(self, host: str, port: int) -> dict:
+        return {
+            "apiVersion": "v1",
+            "kind": "Config",
+            "clusters": [
+                {"name": "fake", "cluster": {"server": f"http://{host}:{port}"}}
+            ],
+            "users": [{"name": "fake", "user": {"token": "fake"}}],
+            "contexts": [
+                {
+                    "name": "fake",
+                    "context": {
+                        "cluster": "fake",
+                        "user": "fake",
+                        "namespace": NAMESPACE,
+                    },
+                }
+            ],
+            "current-context": "fake",
+        }
+
+    def __enter__(self):
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=serve, args=(self.delays, sender), daemon=True
+        )
+        self.process.start()
+        host, port = receiver.recv()
+
+        fd, self.kubeconfig = tempfile.mkstemp(suffix=".yaml")
+        with os.fdopen(fd, "w") as f:
+            yaml.safe_dump(self.__kubeconfig(host, port), f)
+
+        return self
+
+    def __exit__(self, *args):
+        self.process.terminate()
+        self.process.join()
+        os.remove(self.kubeconfig)
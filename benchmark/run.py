@@ -0,0 +1,307 @@
+"""
+Client overhead benchmarks of K8sContext and Q8sKernel against the fake API
+server.
+
+    python -m benchmark.run --output benchmark/results/current.json
+    python -m benchmark.compare benchmark/results/baseline.json \\
+        benchmark/results/current.json
+"""
+
+import argparse
+from datetime import datetime, timezone
+from json import dumps
+import logging
+import os
+import platform
+from statistics import mean, median, quantiles
+import subprocess
+import sys
+from time import perf_counter, process_time, sleep
+import tracemalloc
+
+from rich.console import Console
+from rich.progress import Progress
+
+from benchmark.fake_api import Delays, FakeKubernetes
+from q8s.enums import Cleanup, Target
+from q8s.execution import K8sContext
+
+CODE = "print('hello')"
+
+IMAGE = "benchmark/q8s-benchmark:cpu"
+
+
+def stats(values: list[float], unit: str) -> dict:
+    return {
+        "unit": unit,
+        "count": len(values),
+        "mean": mean(values),
+        "median": median(values),
+        "p95": quantiles(values, n=20)[-1] if len(values) > 1 else values[0],
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def make_context(kubeconfig: str, cleanup: Cleanup) -> K8sContext:
+    # Keep the step messages of the client out of the report
+    context = K8sContext(
+        kubeconfig, progress=Progress(disable=True, console=Console(quiet=True))
+    )
+    context.set_target(Target.cpu)
+    context.set_container_image(IMAGE)
+    context.set_cleanup(cleanup)
+
+    return context
+
+
+def simulated(delays: Delays) -> float:
+    return (delays.schedule + delays.pull + delays.run) * 1000
+
+
+def cell_overhead(delays: Delays, iterations: int) -> dict:
+    """
+    Time a cell takes beyond the simulated scheduling, pull and run delays,
+    with the logs fetched at the end or followed, per cleanup mode.
+    """
+    results = {}
+
+    with FakeKubernetes(delays) as fake:
+        for cleanup in (Cleanup.client, Cleanup.server):
+            for follow in (False, True):
+                context = make_context(fake.kubeconfig, cleanup)
+                overhead, cpu, spans = [], [], {}
+
+                for _ in range(iterations):
+                    started, cpu_started = perf_counter(), process_time()
+                    context.execute(
+                        CODE, on_output=(lambda text: None) if follow else None
+                    )
+                    elapsed = (perf_counter() - started) * 1000
+
+                    overhead.append(elapsed - simulated(delays))
+                    cpu.append((process_time() - cpu_started) * 1000)
+
+                    for span in context.timings.spans:
+                        if span.source == "client" and span.name != "configuration":
+                            spans.setdefault(span.name, []).append(span.duration)
+
+                mode = f"{cleanup.value}_{'follow' if follow else 'fetch'}"
+                results[f"{mode}_overhead"] = stats(overhead, "ms")
+                results[f"{mode}_cpu"] = stats(cpu, "ms")
+
+                for name, values in spans.items():
+                    results[f"{mode}_{name}"] = stats(values, "ms")
+
+                # Let the background deletions finish before the next mode
+                sleep(0.2)
+
+    return results
+
+
+def watch_events(updates: int, iterations: int) -> dict:
+    """
+    Client CPU time spent per job status event while waiting for a job.
+    """
+    delays = Delays(run=1.0, status_updates=updates)
+    per_event = []
+
+    with FakeKubernetes(delays) as fake:
+        context = make_context(fake.kubeconfig, Cleanup.client)
+
+        for _ in range(iterations):
+            cpu_started = process_time()
+            context.execute(CODE)
+            per_event.append((process_time() - cpu_started) * 1_000_000 / updates)
+
+    return {"cpu_per_event": stats(per_event, "us")}
+
+
+def log_throughput(size: int, iterations: int) -> dict:
+    """
+    Rate at which logs are fetched at the end or followed, and the peak memory
+    the client needs meanwhile.
+    """
+    results = {}
+
+    with FakeKubernetes(Delays(log_size=size)) as fake:
+        context = make_context(fake.kubeconfig, Cleanup.client)
+
+        for follow in (False, True):
+            rates, peaks = [], []
+
+            for _ in range(iterations):
+                tracemalloc.start()
+                context.execute(CODE, on_output=(lambda text: None) if follow else None)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                logs = [s for s in context.timings.spans if s.name == "logs"][0]
+                rates.append(size / 1024 / 1024 / (logs.duration / 1000))
+                peaks.append(peak / 1024 / 1024)
+
+            mode = "follow" if follow else "fetch"
+            results[f"{mode}_rate"] = stats(rates, "MiB/s")
+            results[f"{mode}_peak_memory"] = stats(peaks, "MiB")
+
+    return results
+
+
+def make_kernel(kubeconfig: str):
+    """
+    Kernel running cells on the fake cluster, and the kinds of the messages it
+    sends to the frontend.
+    """
+    os.environ.update(
+        {
+            "KUBECONFIG": kubeconfig,
+            "DOCKER_IMAGE": IMAGE,
+            "Q8S_RESULT_CACHE": "0",
+            "Q8S_CLEANUP": Cleanup.server.value,
+        }
+    )
+
+    from q8s.kernel import Q8sKernel
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    kernel = Q8sKernel()
+    kernel.k8s_context.set_target(Target.cpu)
+    messages = []
+    kernel.send_response = lambda socket, kind, content: messages.append(kind)
+
+    return kernel, messages
+
+
+def kernel_cell(delays: Delays, iterations: int) -> dict:
+    """
+    Time a notebook cell takes in the kernel beyond the simulated delays, and
+    the messages it sends to the frontend.
+    """
+    with FakeKubernetes(delays) as fake:
+        kernel, messages = make_kernel(fake.kubeconfig)
+        overhead, counts = [], []
+
+        for _ in range(iterations):
+            messages.clear()
+            started = perf_counter()
+            kernel.do_execute(CODE, silent=False)
+            overhead.append((perf_counter() - started) * 1000 - simulated(delays))
+            counts.append(len(messages))
+
+        sleep(0.2)
+
+    return {"overhead": stats(overhead, "ms"), "messages": stats(counts, "")}
+
+
+def kernel_output(size: int, iterations: int) -> dict:
+    """
+    Rate at which the kernel passes the lines of a long output on to the
+    frontend, and the messages it takes.
+    """
+    # The fake API server writes lines of 80 bytes
+    lines = size // 80
+
+    with FakeKubernetes(Delays(log_size=size)) as fake:
+        kernel, messages = make_kernel(fake.kubeconfig)
+        # Pass the whole output on
+        kernel.k8s_context.set_output_limit(-1)
+        rates, counts = [], []
+
+        for _ in range(iterations):
+            messages.clear()
+            kernel.do_execute(CODE, silent=False)
+
+            logs = [s for s in kernel.k8s_context.timings.spans if s.name == "logs"][0]
+            rates.append(lines / (logs.duration / 1000))
+            counts.append(len(messages))
+
+        sleep(0.2)
+
+    return {"lines_rate": stats(rates, "lines/s"), "messages": stats(counts, "")}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--schedule", type=float, default=0.05)
+    parser.add_argument("--pull", type=float, default=0.05)
+    parser.add_argument("--run", type=float, default=0.1)
+    parser.add_argument("--log-size", type=int, default=16 * 1024 * 1024)
+    parser.add_argument("--status-updates", type=int, default=500)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=["cell", "watch", "logs", "kernel", "kernel_output"],
+        help="Scenarios to run, all by default",
+    )
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    delays = Delays(schedule=args.schedule, pull=args.pull, run=args.run)
+    scenarios = args.scenario or ["cell", "watch", "logs", "kernel", "kernel_output"]
+
+    # The client reports every step on the console and the log
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {}
+
+    if "cell" in scenarios:
+        results["cell_overhead"] = cell_overhead(delays, args.iterations)
+    if "watch" in scenarios:
+        results["watch_events"] = watch_events(
+            args.status_updates, max(1, args.iterations // 4)
+        )
+    if "logs" in scenarios:
+        results["log_throughput"] = log_throughput(
+            args.log_size, max(1, args.iterations // 4)
+        )
+    if "kernel" in scenarios:
+        results["kernel_cell"] = kernel_cell(delays, args.iterations)
+    if "kernel_output" in scenarios:
+        results["kernel_output"] = kernel_output(
+            args.log_size, max(1, args.iterations // 4)
+        )
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "delays": delays.__dict__,
+            "log_size": args.log_size,
+            "status_updates": args.status_updates,
+        },
+        "results": results,
+    }
+
+    for scenario, metrics in results.items():
+        print(scenario)
+        for metric, values in metrics.items():
+            print(
+                f"  {metric:<36} {values['median']:>10.2f} {values['unit']:<6}"
+                f" p95 {values['p95']:.2f}"
+            )
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import logging
+import threading
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from rich.progress import Progress
+
+from q8s.cache import ResultCache
+from q8s.enums import Target
+from q8s.execution import K8sContext, job_status
+from q8s.timings import Timings
+from q8s.watcher import resumable_watch
+
+# Requests to the API server issued at the same time
+DEFAULT_CONCURRENCY = 16
+
+CONTEXT_LABEL = "qubernetes.dev/context"
+
+# Longest single watch request, the time the watch takes to stop once closed
+WATCH_WINDOW = 5
+
+
+class Execution:
+    """
+    Handle of a submitted execution, await it to get its output and stream.
+    """
+
+    name: str
+    status: str = "Pending"
+
+    def __init__(self, context: "AsyncK8sContext", execution_context: K8sContext):
+        self.name = execution_context.name
+        self.__context = context
+        self.__execution_context = execution_context
+        self.__finished = asyncio.get_running_loop().create_future()
+        self.__task: asyncio.Task | None = None
+
+    def _start(self, code: str, cache: bool):
+        self.__task = asyncio.ensure_future(
+            self.__context._run(self, self.__execution_context, code, cache)
+        )
+
+    def _update(self, status: str, done: bool, stream: str):
+        self.status = status
+
+        if done and not self.__finished.done():
+            self.__finished.set_result(stream)
+
+    def _fail(self, error: Exception):
+        if not self.__finished.done():
+            self.__finished.set_exception(error)
+
+    async def _finished(self) -> str:
+        return await self.__finished
+
+    def __await__(self):
+        return self.__task.__await__()
+
+    @property
+    def timings(self) -> Timings:
+        """
+        Time spent in every phase of the execution.
+        """
+        return self.__execution_context.timings
+
+    def done(self) -> bool:
+        return self.__task.done()
+
+    def cancel(self) -> bool:
+        return self.__task.cancel()
+
+    async def result(self) -> tuple[str, str]:
+        """
+        Wait for the output and stream of the execution.
+        """
+        return await self.__task
+
+    async def logs(self) -> str:
+        """
+        Get the logs written so far.
+        """
+        return await self.__context._logs(self.__execution_context)
+
+
+class AsyncK8sContext:
+    """
+    Asyncio client running many executions at once.
+
+    The API calls of all executions share one connection pool and a thread pool
+    of the same size; a single watch follows the jobs of every execution, so
+    waiting executions hold no thread.
+    """
+
+    def __init__(
+        self,
+        kubeconfig: str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        progress: Progress = None,
+    ):
+        self.__context = K8sContext(
+            kubeconfig,
+            progress=progress if progress is not None else Progress(disable=True),
+        )
+
+        configuration = client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = concurrency
+        api_client = client.ApiClient(configuration)
+
+        self.__context.core_api_instance = client.CoreV1Api(api_client)
+        self.__context.batch_api_instance = client.BatchV1Api(api_client)
+
+        self.namespace = self.__context.namespace
+        self.__executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="q8s"
+        )
+        self.__executions: dict[str, Execution] = {}
+        self.__inflight: dict[str, asyncio.Future] = {}
+        self.__watcher: threading.Thread | None = None
+        self.__closed = threading.Event()
+
+    def set_container_image(self, image: str):
+        self.__context.set_container_image(image)
+
+    def set_registry_pat(self, pat: str):
+        self.__context.set_registry_pat(pat)
+
+    def set_target(self, target: Target):
+        self.__context.set_target(target)
+
+    def set_result_cache(self, cache: ResultCache | None):
+        self.__context.set_result_cache(cache)
+
+    def set_timeout(self, timeout: int | None):
+        self.__context.set_timeout(timeout)
+
+    async def __call(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.__executor, partial(func, *args, **kwargs)
+        )
+
+    def submit(self, code: str, cache: bool = True) -> Execution:
+        """
+        Start the execution of the given code, unless the result cache holds
+        its result or the same code already runs.
+        """
+        execution_context = self.__context.fork()
+        execution = Execution(self, execution_context)
+
+        self.__executions[execution.name] = execution
+        self.__start_watcher(asyncio.get_running_loop())
+        execution._start(code, cache)
+
+        return execution
+
+    async def execute(self, code: str, cache: bool = True) -> tuple[str, str]:
+        """
+        Execute the given code and wait for its output.
+        """
+        return await self.submit(code, cache)
+
+    async def _run(
+        self, execution: Execution, context: K8sContext, code: str, cache: bool
+    ) -> tuple[str, str]:
+        # The context is a fork of this execution, it keeps the routed target
+        await self.__call(context.route, code)
+
+        result_cache = context.result_cache
+        key = None
+
+        if cache and result_cache is not None:
+            key = await self.__call(context.result_key, code)
+
+        if key is None:
+            return await self.__run_job(execution, context, code)
+
+        result = result_cache.get(key)
+
+        if result is not None:
+            self.__executions.pop(execution.name, None)
+            execution._update("Cached", True, result[1])
+            return result
+
+        inflight = self.__inflight.get(key)
+
+        if inflight is not None:
+            self.__executions.pop(execution.name, None)
+            result = await asyncio.shield(inflight)
+            execution._update("Merged", True, result[1])
+            return result
+
+        inflight = asyncio.get_running_loop().create_future()
+        # Followers retrieve the outcome, the leader raises it anyway
+        inflight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.__inflight[key] = inflight
+
+        try:
+            result = await self.__run_job(execution, context, code)
+
+            if result[1] == "stdout":
+                await self.__call(result_cache.put, key, *result)
+
+            inflight.set_result(result)
+
+            return result
+        except asyncio.CancelledError:
+            inflight.cancel()
+            raise
+        except Exception as e:
+            inflight.set_exception(e)
+            raise
+        finally:
+            self.__inflight.pop(key, None)
+
+    async def __run_job(
+        self, execution: Execution, context: K8sContext, code: str
+    ) -> tuple[str, str]:
+        core = context.core_api_instance
+        batch = context.batch_api_instance
+
+        job = context.create_job_object(code)
+        job.metadata.labels[CONTEXT_LABEL] = self.__context.name
+
+        # The job goes last, so that its pod finds the code and secrets in place
+        dependencies = [
+            self.__call(
+                core.create_namespaced_config_map,
+                namespace=self.namespace,
+                body=context.create_config_map_object(code),
+            ),
+            self.__call(
+                context.ensure_secret, context.create_environment_secret_object()
+            ),
+        ]
+        if context.registry_pat:
+            dependencies.append(
+                self.__call(
+                    context.ensure_secret,
+                    context.create_registry_credentials_secret_object(),
+                )
+            )
+
+        timings = context.timings
+
+        try:
+            with timings.span("dependencies"):
+                await asyncio.gather(*dependencies)
+            with timings.span("job"):
+                await self.__call(
+                    batch.create_namespaced_job, namespace=self.namespace, body=job
+                )
+
+            with timings.span("status"):
+                try:
+                    stream = await asyncio.wait_for(
+                        execution._finished(), context.timeout
+                    )
+                except asyncio.TimeoutError:
+                    execution._update("Timed out", True, "stderr")
+                    return (
+                        f"Execution did not finish within {context.timeout} seconds",
+                        "stderr",
+                    )
+            with timings.span("logs"):
+                logs = await self._logs(context)
+
+            return logs, stream
+        finally:
+            self.__executions.pop(execution.name, None)
+            with timings.span("cleanup"):
+                await self.__cleanup(context)
+
+    async def _logs(self, context: K8sContext) -> str:
+        pods = await self.__call(
+            context.core_api_instance.list_namespaced_pod,
+            self.namespace,
+            label_selector=f"app={context.name}",
+        )
+
+        if not pods.items:
+            return ""
+
+        return await self.__call(context.get_pod_logs, pods.items[0].metadata.name)
+
+    async def __cleanup(self, context: K8sContext):
+        core = context.core_api_instance
+        batch = context.batch_api_instance
+        options = client.V1DeleteOptions(propagation_policy="Background")
+
+        deletions = [
+            self.__call(
+                batch.delete_namespaced_job, context.name, self.namespace, body=options
+            ),
+            self.__call(
+                core.delete_namespaced_config_map, context.name, self.namespace
+            ),
+        ]
+
+        for result in await asyncio.gather(*deletions, return_exceptions=True):
+            if isinstance(result, ApiException) and result.status != 404:
+                logging.warning(f"Cleanup of {context.name} failed: {result.reason}")
+
+    def __start_watcher(self, loop: asyncio.AbstractEventLoop):
+        if self.__watcher is not None and self.__watcher.is_alive():
+            return
+
+        self.__watcher = threading.Thread(
+            target=self.__watch, args=(loop,), daemon=True, name="q8s-watch"
+        )
+        self.__watcher.start()
+
+    def __watch(self, loop: asyncio.AbstractEventLoop):
+        """
+        Follow the jobs of all executions and report their status.
+        """
+        try:
+            for event in resumable_watch(
+                self.__context.batch_api_instance.list_namespaced_job,
+                stopped=self.__closed.is_set,
+                window=WATCH_WINDOW,
+                namespace=self.namespace,
+                label_selector=f"{CONTEXT_LABEL}={self.__context.name}",
+            ):
+                if self.__closed.is_set():
+                    return
+
+                execution = self.__executions.get(event["object"].metadata.name)
+
+                if execution is None:
+                    continue
+
+                message, _, done, stream = job_status(event["type"], event["object"])
+                loop.call_soon_threadsafe(execution._update, message, done, stream)
+        except Exception as e:
+            logging.error(f"Watching the jobs failed: {e}")
+
+            for execution in list(self.__executions.values()):
+                loop.call_soon_threadsafe(execution._fail, e)
+
+    async def close(self):
+        """
+        Cancel the running executions and release the thread pool.
+        """
+        executions = list(self.__executions.values())
+
+        for execution in executions:
+            execution.cancel()
+
+        await asyncio.gather(
+            *(execution.result() for execution in executions), return_exceptions=True
+        )
+
+        self.__closed.set()
+
+        try:
+            await self.__call(self.__context.collect_garbage)
+        except ApiException as e:
+            logging.warning(f"Secret garbage collection failed: {e.reason}")
+
+        if self.__watcher is not None:
+            await self.__call(self.__watcher.join)
+
+        self.__executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
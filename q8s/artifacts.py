@@ -0,0 +1,218 @@
+import base64
+from dataclasses import dataclass
+from io import BytesIO
+from json import loads
+import mimetypes
+import os
+from pathlib import Path
+import tarfile
+from typing import Any
+
+from kubernetes import client
+
+from q8s.pool import exec_in_pod
+
+# Folder the program writes its artifacts to, also given as Q8S_OUTPUT_DIR
+ARTIFACTS_PATH = "/q8s/artifacts"
+
+COLLECTOR_CONTAINER = "q8s-collector"
+
+# Markers the program and the client leave in the folder, never collected
+MARKER_PREFIX = ".q8s-"
+DONE_MARKER = f"{ARTIFACTS_PATH}/{MARKER_PREFIX}done"
+COLLECTED_MARKER = f"{ARTIFACTS_PATH}/{MARKER_PREFIX}collected"
+
+# Time, in seconds, the artifacts wait for the client once the program ended
+ARTIFACTS_GRACE = int(os.environ.get("Q8S_ARTIFACTS_GRACE", 5 * 60))
+
+# Run the program, then tell the collector it ended
+RUN_COMMAND = """
+import subprocess, sys
+
+marker, command = sys.argv[1], sys.argv[2:]
+
+try:
+    returncode = subprocess.call(command)
+finally:
+    open(marker, "w").close()
+
+sys.exit(returncode if returncode >= 0 else 128 - returncode)
+"""
+
+# Keep the pod running once the program ended, until the client collected the
+# artifacts or the grace period passed
+COLLECTOR_COMMAND = """
+import os, sys, time
+
+grace, done, collected = int(sys.argv[1]), sys.argv[2], sys.argv[3]
+
+while not os.path.exists(done):
+    time.sleep(1)
+
+deadline = time.monotonic() + grace
+while not os.path.exists(collected) and time.monotonic() < deadline:
+    time.sleep(0.2)
+"""
+
+# Write the artifacts as a base64 encoded, compressed archive
+ARCHIVE_COMMAND = f"""
+import base64, io, os, sys, tarfile
+
+path, collected = sys.argv[1], sys.argv[2]
+buffer = io.BytesIO()
+
+try:
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name in sorted(os.listdir(path)):
+            if not name.startswith("{MARKER_PREFIX}"):
+                archive.add(os.path.join(path, name), arcname=name)
+    sys.stdout.write(base64.b64encode(buffer.getvalue()).decode())
+finally:
+    open(collected, "w").close()
+"""
+
+mimetypes.add_type("application/x-npz", ".npz")
+mimetypes.add_type("application/x-npy", ".npy")
+
+
+@dataclass
+class Artifact:
+    """
+    File the program wrote to its output folder, named by its path there.
+    """
+
+    name: str
+    data: bytes
+
+    @property
+    def mimetype(self) -> str:
+        return mimetypes.guess_type(self.name)[0] or "application/octet-stream"
+
+    def load(self) -> Any:
+        """
+        The content as an object of its type: parsed JSON, NumPy arrays, text,
+        or else the bytes as they are.
+        """
+        mimetype = self.mimetype
+
+        if mimetype == "application/json":
+            return loads(self.data)
+
+        if mimetype in ("application/x-npz", "application/x-npy"):
+            import numpy
+
+            return numpy.load(BytesIO(self.data), allow_pickle=False)
+
+        if mimetype.startswith("text/") or mimetype == "image/svg+xml":
+            return self.data.decode()
+
+        return self.data
+
+    def mimebundle(self) -> dict[str, Any]:
+        """
+        Representation of the artifact in a notebook.
+        """
+        mimetype = self.mimetype
+        summary = f"{self.name} ({len(self.data)} bytes, {mimetype})"
+
+        if mimetype in ("image/png", "image/jpeg", "image/gif"):
+            return {
+                mimetype: base64.b64encode(self.data).decode(),
+                "text/plain": summary,
+            }
+
+        if mimetype in (
+            "image/svg+xml",
+            "text/html",
+            "text/markdown",
+            "application/json",
+        ):
+            return {mimetype: self.load(), "text/plain": summary}
+
+        if mimetype.startswith("text/"):
+            return {"text/plain": self.load()}
+
+        return {"text/plain": summary}
+
+    def save(self, directory: str | os.PathLike) -> Path:
+        path = Path(directory) / self.name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(self.data)
+
+        return path
+
+
+def unpack(archive: bytes) -> list[Artifact]:
+    """
+    Artifacts in the compressed archive, in the order of their names.
+    """
+    artifacts = []
+
+    with tarfile.open(fileobj=BytesIO(archive), mode="r:gz") as files:
+        for member in files.getmembers():
+            # Files outside of the output folder are not expected
+            if not member.isfile() or member.name.startswith("/"):
+                continue
+            if ".." in Path(member.name).parts:
+                continue
+
+            artifacts.append(Artifact(member.name, files.extractfile(member).read()))
+
+    return sorted(artifacts, key=lambda artifact: artifact.name)
+
+
+def make_collected(job: client.V1Job) -> client.V1Job:
+    """
+    Give the program of the job an output folder, and add the container that
+    keeps it available until the client collected it.
+    """
+    spec = job.spec.template.spec
+    container = spec.containers[0]
+    mount = client.V1VolumeMount(name="q8s-artifacts", mount_path=ARTIFACTS_PATH)
+
+    container.args = [DONE_MARKER] + (container.command or []) + (container.args or [])
+    container.command = ["python", "-c", RUN_COMMAND]
+    container.volume_mounts = (container.volume_mounts or []) + [mount]
+    container.env = (container.env or []) + [
+        client.V1EnvVar(name="Q8S_OUTPUT_DIR", value=ARTIFACTS_PATH)
+    ]
+
+    spec.containers.append(
+        client.V1Container(
+            name=COLLECTOR_CONTAINER,
+            image=container.image,
+            image_pull_policy=container.image_pull_policy,
+            command=["python", "-c", COLLECTOR_COMMAND],
+            args=[str(ARTIFACTS_GRACE), DONE_MARKER, COLLECTED_MARKER],
+            volume_mounts=[mount],
+            resources=client.V1ResourceRequirements(
+                requests={"cpu": "10m", "memory": "32Mi"}
+            ),
+        )
+    )
+    spec.volumes = (spec.volumes or []) + [
+        client.V1Volume(name="q8s-artifacts", empty_dir=client.V1EmptyDirVolumeSource())
+    ]
+
+    return job
+
+
+def collect_artifacts(
+    api: client.CoreV1Api, pod: str, namespace: str
+) -> list[Artifact]:
+    """
+    Get the artifacts of the ended program from the collector of its pod,
+    which lets the pod complete.
+    """
+    output, returncode = exec_in_pod(
+        api,
+        pod,
+        namespace,
+        ["python", "-c", ARCHIVE_COMMAND, ARTIFACTS_PATH, COLLECTED_MARKER],
+        container=COLLECTOR_CONTAINER,
+    )
+
+    if returncode != 0:
+        raise RuntimeError(f"Collecting the artifacts failed: {output.strip()}")
+
+    return unpack(base64.b64decode(output))
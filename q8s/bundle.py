@@ -0,0 +1,161 @@
+import base64
+import gzip
+from io import BytesIO
+import os
+from pathlib import Path
+import tarfile
+
+from kubernetes import client
+
+from q8s.constants import WORKSPACE
+from q8s.deps.code_analyzer import CodeAnalyzer
+
+# Where the parts of the bundle are mounted in the pod
+BUNDLE_PATH = "/q8s/bundle"
+
+# Bytes of the archive per ConfigMap, within the 1 MiB limit of an object once
+# base64 encoded
+PART_SIZE = 700 * 1024
+
+# Code larger than this, in bytes, is bundled even without local modules
+INLINE_SIZE = int(os.environ.get("Q8S_INLINE_SIZE", 256 * 1024))
+
+# Join the parts, unpack the archive into the workspace, then run the program
+UNPACK_COMMAND = """
+import glob, io, os, runpy, sys, tarfile
+
+parts, workspace, main = sys.argv[1], sys.argv[2], sys.argv[3]
+
+data = b""
+for part in sorted(glob.glob(os.path.join(parts, "part-*"))):
+    with open(part, "rb") as f:
+        data += f.read()
+
+with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as archive:
+    if hasattr(tarfile, "data_filter"):
+        archive.extractall(workspace, filter="data")
+    else:
+        archive.extractall(workspace)
+
+os.chdir(workspace)
+sys.path.insert(0, workspace)
+sys.argv = [main]
+runpy.run_path(main, run_name="__main__")
+"""
+
+
+def module_files(root: Path, name: str) -> list[Path]:
+    """
+    Files of the module or package of the given name in the root folder.
+    """
+    module = root / f"{name}.py"
+
+    if module.is_file():
+        return [module]
+
+    package = root / name
+
+    if package.is_dir():
+        return sorted(
+            path
+            for path in package.rglob("*.py")
+            if "__pycache__" not in path.relative_to(root).parts
+        )
+
+    return []
+
+
+def collect_modules(entry: Path) -> dict[str, str]:
+    """
+    Source of the modules next to the entry file it imports, directly or
+    through other local modules, keyed by their path relative to its folder.
+    """
+    root = entry.parent
+    modules = {}
+    pending = [entry.read_text()]
+
+    while pending:
+        for name in CodeAnalyzer(pending.pop()).getImports():
+            for path in module_files(root, name):
+                key = path.relative_to(root).as_posix()
+
+                if key in modules or path == entry:
+                    continue
+
+                modules[key] = path.read_text()
+                pending.append(modules[key])
+
+    return modules
+
+
+def pack(files: dict[str, str]) -> bytes:
+    """
+    Compressed archive of the files, identical for identical files.
+    """
+    buffer = BytesIO()
+
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as compressed:
+        with tarfile.open(fileobj=compressed, mode="w") as archive:
+            for name in sorted(files):
+                data = files[name].encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mode = 0o644
+                archive.addfile(info, BytesIO(data))
+
+    return buffer.getvalue()
+
+
+def split(data: bytes, size: int = PART_SIZE) -> list[dict[str, str]]:
+    """
+    Binary data of the ConfigMaps holding the archive, one base64 encoded part
+    each.
+    """
+    return [
+        {f"part-{index:03d}": base64.b64encode(data[start : start + size]).decode()}
+        for index, start in enumerate(range(0, max(len(data), 1), size))
+    ]
+
+
+def part_names(name: str, count: int) -> list[str]:
+    """
+    Names of the ConfigMaps of a bundle, the first one named after the job.
+    """
+    return [name] + [f"{name}-{index}" for index in range(1, count)]
+
+
+def make_bundled(job: client.V1Job, names: list[str]) -> client.V1Job:
+    """
+    Turn the job of a program into one unpacking its bundle, mounted from the
+    given ConfigMaps, into a writable workspace before running it.
+    """
+    spec = job.spec.template.spec
+    container = spec.containers[0]
+
+    container.command = ["python", "-c", UNPACK_COMMAND]
+    container.args = [BUNDLE_PATH, WORKSPACE, f"{WORKSPACE}/main.py"]
+    container.volume_mounts = [
+        mount for mount in container.volume_mounts or [] if mount.name != "app-volume"
+    ] + [
+        client.V1VolumeMount(name="bundle", mount_path=BUNDLE_PATH, read_only=True),
+        client.V1VolumeMount(name="app-volume", mount_path=WORKSPACE),
+    ]
+
+    spec.volumes = [
+        volume for volume in spec.volumes or [] if volume.name != "app-volume"
+    ] + [
+        client.V1Volume(
+            name="bundle",
+            projected=client.V1ProjectedVolumeSource(
+                sources=[
+                    client.V1VolumeProjection(
+                        config_map=client.V1ConfigMapProjection(name=name)
+                    )
+                    for name in names
+                ]
+            ),
+        ),
+        client.V1Volume(name="app-volume", empty_dir=client.V1EmptyDirVolumeSource()),
+    ]
+
+    return job
@@ -0,0 +1,211 @@
+from concurrent.futures import Future
+from json import dump, load
+import logging
+import os
+from pathlib import Path
+import subprocess
+import tempfile
+import threading
+from typing import Callable
+
+from q8s.logs import OutputCallback
+
+RESULT_CACHE_DIR = os.environ.get("Q8S_RESULT_CACHE_DIR", ".q8s_cache/results")
+
+# Size, in bytes, the stored results may take on disk
+RESULT_CACHE_SIZE = int(os.environ.get("Q8S_RESULT_CACHE_SIZE", 256 * 1024 * 1024))
+
+Result = tuple[str, str]
+
+
+def resolve_image_digest(image: str | None) -> str | None:
+    """
+    Digest of the image, from a pinned reference or the local Docker daemon.
+
+    Without a digest the image contents are unknown, so None is returned and
+    the result of the execution is not cached.
+    """
+    if image is None:
+        return None
+
+    if "@sha256:" in image:
+        return image.split("@", 1)[1]
+
+    try:
+        process = subprocess.run(
+            ["docker", "image", "inspect", "--format", "{{json .RepoDigests}}", image],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.debug(f"Image digest of {image} not resolved: {e}")
+        return None
+
+    if process.returncode != 0:
+        return None
+
+    repository = image.rsplit(":", 1)[0] if ":" in image.split("/")[-1] else image
+
+    digests = [
+        digest.split("@", 1)
+        for digest in process.stdout.strip().strip("[]").replace('"', "").split(",")
+        if "@" in digest
+    ]
+
+    for name, digest in digests:
+        if name == repository:
+            return digest
+
+    return digests[0][1] if digests else None
+
+
+class ResultCache:
+    """
+    Results of executions stored on disk, evicting the least recently used
+    ones beyond the size limit.
+
+    Executions of the same key running at the same time are merged, the first
+    one runs and the others wait for its result.
+    """
+
+    def __init__(
+        self, directory: str = RESULT_CACHE_DIR, size: int = RESULT_CACHE_SIZE
+    ):
+        self.directory = Path(directory)
+        self.size = size
+        self.__lock = threading.Lock()
+        self.__inflight: dict[str, Future] = {}
+
+    def __path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Result | None:
+        path = self.__path(key)
+
+        try:
+            with open(path, "r") as f:
+                entry = load(f)
+            # Mark the entry as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return entry["output"], entry["stream"]
+
+    def put(self, key: str, output: str, stream: str):
+        if len(output.encode()) > self.size:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # Write aside and rename, so that readers never see a partial entry
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                dump({"output": output, "stream": stream}, f)
+            os.replace(temporary, self.__path(key))
+        except OSError as e:
+            logging.warning(f"Result not cached: {e}")
+            Path(temporary).unlink(missing_ok=True)
+            return
+
+        self.__evict()
+
+    def __evict(self):
+        entries = []
+
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.size:
+                break
+
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+    def run(
+        self,
+        key: str,
+        execute: Callable[[OutputCallback | None], Result],
+        on_output: OutputCallback | None = None,
+    ) -> Result:
+        """
+        Get the result of the key, from the cache, from the execution of the
+        same key already running, or by running the execution.
+
+        Only successful results are stored.
+        """
+        result = self.get(key)
+
+        if result is None:
+            with self.__lock:
+                future = self.__inflight.get(key)
+                leader = future is None
+
+                if leader:
+                    future = Future()
+                    self.__inflight[key] = future
+
+            if leader:
+                return self.__lead(key, future, execute, on_output)
+
+            result = future.result()
+
+        output, stream = result
+
+        if on_output is None:
+            return output, stream
+
+        on_output(output)
+
+        return "", stream
+
+    def __lead(
+        self,
+        key: str,
+        future: Future,
+        execute: Callable[[OutputCallback | None], Result],
+        on_output: OutputCallback | None,
+    ) -> Result:
+        chunks = []
+        captured = 0
+
+        def capture(text: str):
+            nonlocal captured
+
+            # Output beyond the cache size is forwarded but not kept
+            if captured <= self.size:
+                chunks.append(text)
+                captured += len(text)
+
+            on_output(text)
+
+        try:
+            output, stream = execute(capture if on_output is not None else None)
+            result = "".join(chunks) + output, stream
+
+            if stream == "stdout" and captured <= self.size:
+                self.put(key, *result)
+
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            # Later executions of the key find the result in the cache
+            with self.__lock:
+                self.__inflight.pop(key, None)
+
+        return output, stream
@@ -3,13 +3,21 @@ from pathlib import Path
 from subprocess import Popen
 from time import sleep
 import typer
+import yaml
+from rich.console import Console
+from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
 import sys
 from typing_extensions import Annotated
-from q8s.execution import K8sContext
-from q8s.enums import Target
+from q8s.bundle import collect_modules
+from q8s.cache import ResultCache
+from q8s.execution import SECRET_GRACE, K8sContext
+from q8s.prepull import PREPULL_TIMEOUT
+from q8s.enums import Cleanup, Target
 from q8s.install import install_my_kernel_spec
-from q8s.project import Project
+from q8s.project import BUILD_PARALLELISM, CacheNotBuiltException, Project
+from q8s.routing import Router, RunHistory
+from q8s.sweep import DEFAULT_PARALLELISM, sweep_parameters, write_results
 from q8s.utils import get_docker_image, get_kubeconfig
 
 app = typer.Typer()
@@ -25,7 +33,18 @@ def build(
         bool, typer.Option(help="Dry run does not push images to the registry")
     ] = False,
     silent: Annotated[bool, typer.Option(help="Silent mode")] = True,
+    parallelism: Annotated[
+        int, typer.Option(help="Targets built and pushed at the same time")
+    ] = BUILD_PARALLELISM,
+    force: Annotated[
+        bool, typer.Option(help="Build even when the inputs of an image are unchanged")
+    ] = False,
+    verify: Annotated[
+        bool,
+        typer.Option(help="Rebuild the built images and check they are identical"),
+    ] = False,
 ):
+    failures = {}
 
     with Progress(
         SpinnerColumn(),
@@ -52,23 +71,63 @@ def build(
             project.init_cache()
             progress.advance(task)
 
-        if target:
+        if verify:
+            targets = (
+                [target.value]
+                if target not in (None, Target.local, Target.auto)
+                else project.configuration.targets.keys()
+            )
+
+            for verified in targets:
+                try:
+                    built, rebuilt = project.verify_container(
+                        verified, progress=progress, silent=silent
+                    )
+                except Exception as e:
+                    failures[verified] = e
+                    continue
+
+                if built == rebuilt:
+                    progress.console.print(
+                        f"Image of {verified} is reproducible: {built}"
+                    )
+                else:
+                    failures[verified] = Exception(
+                        f"the rebuilt image {rebuilt} differs from {built}"
+                    )
+        elif target == Target.local:
+            progress.console.print("The local target runs without an image")
+        elif target == Target.auto:
+            progress.console.print("The auto target uses the cpu and gpu images")
+        elif target:
             project.build_container(
                 target=target.value,
                 progress=progress,
                 push=(not dry_run),
                 silent=silent,
+                force=force,
             )
 
         else:
-            for build in project.configuration.targets.keys():
-                project.build_container(
-                    build, progress=progress, push=(not dry_run), silent=silent
-                )
+            failures = project.build_containers(
+                project.configuration.targets.keys(),
+                progress=progress,
+                push=(not dry_run),
+                silent=silent,
+                parallelism=parallelism,
+                force=force,
+            )
 
-    print(f"Project {project.name} ready")
+    # Keep the images of the targets that were built
     project.update_images_cache()
 
+    if failures:
+        for failed, error in failures.items():
+            print(f"Target {failed} failed: {error}")
+        raise typer.Exit(code=1)
+
+    print(f"Project {project.name} ready")
+
 
 @app.command()
 def execute(
@@ -87,10 +146,64 @@ def execute(
             envvar="REGISTRY_PAT",
         ),
     ] = None,
+    follow: Annotated[
+        bool, typer.Option(help="Stream the job output while it runs")
+    ] = True,
+    timeout: Annotated[
+        int,
+        typer.Option(
+            help="Longest time the execution may take, in seconds",
+            envvar="Q8S_JOB_TIMEOUT",
+        ),
+    ] = None,
+    suspend: Annotated[
+        bool,
+        typer.Option(
+            help="Release the job only once its code and secrets exist",
+            envvar="Q8S_SUSPENDED_START",
+        ),
+    ] = False,
+    cache: Annotated[
+        bool,
+        typer.Option(help="Reuse the stored result of an identical execution"),
+    ] = True,
+    bundle: Annotated[
+        bool,
+        typer.Option(help="Ship the local modules the file imports along with it"),
+    ] = True,
+    artifacts: Annotated[
+        Path,
+        typer.Option(
+            help="Save the files the program writes to Q8S_OUTPUT_DIR in this folder"
+        ),
+    ] = None,
+    output_file: Annotated[
+        Path,
+        typer.Option(
+            help="Write the complete output to this file, only its head and "
+            "tail are shown"
+        ),
+    ] = None,
+    cleanup: Annotated[
+        Cleanup,
+        typer.Option(
+            help="Remove the job waiting (client), in the background (server), "
+            "or leave it to its TTL (ttl)",
+            case_sensitive=False,
+            envvar="Q8S_CLEANUP",
+        ),
+    ] = Cleanup.server,
+    timings: Annotated[
+        bool, typer.Option(help="Show the time spent in every phase")
+    ] = False,
+    timings_file: Annotated[
+        Path,
+        typer.Option(help="Write the phases as JSON, also readable as a Chrome trace"),
+    ] = None,
 ):
     project = Project()
 
-    if image is None:
+    if image is None and target not in (Target.local, Target.auto):
         image = project.cached_images(target.value)
 
     if kubeconfig is None:
@@ -116,15 +229,296 @@ def execute(
         k8s_context.set_target(target)
         k8s_context.set_container_image(image)
         k8s_context.set_registry_pat(registry_pat)
+        if timeout is not None:
+            k8s_context.set_timeout(timeout)
+        k8s_context.set_target_images(project.routed_images())
+        k8s_context.set_router(Router(RunHistory()))
+        k8s_context.set_suspended_start(suspend)
+        k8s_context.set_result_cache(ResultCache())
+        k8s_context.set_cleanup(cleanup)
+        k8s_context.set_output_limit(spill=output_file)
+        k8s_context.set_artifacts(artifacts is not None)
+
+        modules = collect_modules(file) if bundle else None
 
         with open(file, "r") as f:
             code = f.read()
             # output, stream_name = execute_k8s(code, None, image, registry_pat)
-            output, stream_name = k8s_context.execute(code)
+            if follow:
+                print("output:")
+                output, stream_name = k8s_context.execute(
+                    code,
+                    on_output=lambda text: print(text, end="", flush=True),
+                    cache=cache,
+                    modules=modules,
+                )
+                print(output)
+            else:
+                output, stream_name = k8s_context.execute(
+                    code, cache=cache, modules=modules
+                )
 
-            print(f"output:\n{output}")
+                print(f"output:\n{output}")
             print(f"output stream: {stream_name}")
 
+        if timings:
+            print(f"timings:\n{k8s_context.timings.summary()}")
+
+        if timings_file is not None:
+            k8s_context.timings.write(timings_file)
+
+        for artifact in k8s_context.artifacts:
+            path = artifact.save(artifacts)
+            print(f"artifact: {path} ({artifact.mimetype})")
+
+
+@app.command()
+def sweep(
+    file: Annotated[Path, typer.Argument(help="Python file to be executed")],
+    param: Annotated[
+        list[str],
+        typer.Option(
+            help="Parameter values, name=value1,value2,... (repeatable)",
+        ),
+    ] = [],
+    grid: Annotated[
+        Path,
+        typer.Option(
+            help="YAML or JSON file with a list of values per parameter, "
+            "or a list of parameter sets"
+        ),
+    ] = None,
+    parallelism: Annotated[
+        int, typer.Option(help="Indexes running at the same time")
+    ] = DEFAULT_PARALLELISM,
+    output: Annotated[
+        Path, typer.Option(help="Write the results as JSON to this file")
+    ] = None,
+    target: Annotated[
+        Target, typer.Option(help="Execution target", case_sensitive=False)
+    ] = Target.gpu,
+    kubeconfig: Annotated[
+        Path, typer.Option(help="Kubernetes configuration", envvar="KUBECONFIG")
+    ] = None,
+    image: Annotated[str, typer.Option(help="Docker image")] = None,
+    registry_pat: Annotated[
+        str,
+        typer.Option(
+            help="Registry personal access token (PAT)",
+            envvar="REGISTRY_PAT",
+        ),
+    ] = None,
+    timeout: Annotated[
+        int,
+        typer.Option(
+            help="Longest time the sweep may take, in seconds",
+            envvar="Q8S_JOB_TIMEOUT",
+        ),
+    ] = None,
+    cleanup: Annotated[
+        Cleanup,
+        typer.Option(
+            help="Remove the job waiting (client), in the background (server), "
+            "or leave it to its TTL (ttl)",
+            case_sensitive=False,
+            envvar="Q8S_CLEANUP",
+        ),
+    ] = Cleanup.server,
+):
+    """
+    Execute a program once per combination of parameters, in a single job.
+
+    Every run finds its parameters in the Q8S_PARAM_<NAME> environment
+    variables, and all of them as JSON in Q8S_PARAMS.
+    """
+    values = None
+
+    if grid is not None:
+        with open(grid, "r") as f:
+            values = yaml.safe_load(f)
+
+    try:
+        parameters = sweep_parameters(values, param)
+    except ValueError as e:
+        typer.echo(e)
+        raise typer.Exit(code=1)
+
+    if not parameters:
+        typer.echo("No parameters given")
+        raise typer.Exit(code=1)
+
+    if target == Target.local:
+        typer.echo("Sweeps run in the cluster, choose another target")
+        raise typer.Exit(code=1)
+
+    project = Project()
+
+    if image is None and target != Target.auto:
+        image = project.cached_images(target.value)
+
+    if kubeconfig is None:
+        kubeconfig = project.kubeconfig
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        TimeElapsedColumn(),
+        expand=True,
+    ) as progress:
+        k8s_context = K8sContext(kubeconfig.as_posix(), progress=progress)
+        k8s_context.set_target(target)
+        k8s_context.set_container_image(image)
+        k8s_context.set_registry_pat(registry_pat)
+        k8s_context.set_target_images(project.routed_images())
+        if timeout is not None:
+            k8s_context.set_timeout(timeout)
+        k8s_context.set_cleanup(cleanup)
+
+        with open(file, "r") as f:
+            results = k8s_context.sweep(f.read(), parameters, parallelism)
+
+    table = Table(title=f"Sweep of {file.name}")
+    table.add_column("Index", justify="right")
+    table.add_column("Parameters")
+    table.add_column("Status")
+    table.add_column("Output")
+
+    for result in results:
+        lines = result.output.strip().splitlines()
+        table.add_row(
+            str(result.index),
+            ", ".join(f"{k}={v}" for k, v in result.parameters.items()),
+            result.status,
+            lines[-1] if lines else "",
+        )
+
+    Console().print(table)
+
+    if output is not None:
+        write_results(results, output)
+        print(f"Results written to {output}")
+
+    if any(result.status != "Succeeded" for result in results):
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def warm(
+    target: Annotated[
+        Target, typer.Option(help="Execution target", case_sensitive=False)
+    ] = None,
+    kubeconfig: Annotated[
+        Path, typer.Option(help="Kubernetes configuration", envvar="KUBECONFIG")
+    ] = None,
+    registry_pat: Annotated[
+        str,
+        typer.Option(
+            help="Registry personal access token (PAT)",
+            envvar="REGISTRY_PAT",
+        ),
+    ] = None,
+    timeout: Annotated[
+        int,
+        typer.Option(help="Longest time the nodes may take to pull, in seconds"),
+    ] = PREPULL_TIMEOUT,
+):
+    """
+    Pull the built images of the targets onto the nodes their jobs run on, so
+    that the first executions start warm.
+    """
+    project = Project()
+
+    if kubeconfig is None:
+        kubeconfig = project.kubeconfig
+
+    if kubeconfig.exists() is False:
+        typer.echo(f"kubeconfig file {kubeconfig} does not exist")
+        raise typer.Exit(code=1)
+
+    if target in (Target.local, Target.auto):
+        typer.echo("Only the images of cluster targets can be pulled")
+        raise typer.Exit(code=1)
+
+    targets = [target.value] if target else project.configuration.targets.keys()
+    failures = {}
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        TimeElapsedColumn(),
+        expand=True,
+    ) as progress:
+        k8s_context = K8sContext(kubeconfig.as_posix(), progress=progress)
+        k8s_context.set_registry_pat(registry_pat)
+
+        for warmed in targets:
+            tasks = {}
+
+            def on_node(node: str, state: str):
+                if node not in tasks:
+                    tasks[node] = progress.add_task(description="", total=1)
+
+                progress.update(
+                    tasks[node],
+                    description=f"[cyan]Image of {warmed} on {node}: {state}",
+                    completed=state == "pulled",
+                )
+
+            try:
+                k8s_context.set_target(Target(warmed))
+                k8s_context.set_container_image(project.cached_images(warmed))
+                nodes = k8s_context.warm(on_node=on_node, timeout=timeout)
+            except (CacheNotBuiltException, KeyError):
+                failures[warmed] = "no image built, run q8sctl build first"
+                continue
+            except Exception as e:
+                failures[warmed] = e
+                continue
+
+            if nodes:
+                progress.console.print(
+                    f"Image of {warmed} pulled on {len(nodes)} node(s)"
+                )
+            else:
+                progress.console.print(f"No node runs the jobs of {warmed}")
+
+    if failures:
+        for failed, error in failures.items():
+            print(f"Target {failed} failed: {error}")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def gc(
+    kubeconfig: Annotated[
+        Path, typer.Option(help="Kubernetes configuration", envvar="KUBECONFIG")
+    ] = None,
+    grace: Annotated[
+        int,
+        typer.Option(help="Keep secrets used within this many seconds"),
+    ] = SECRET_GRACE,
+):
+    """
+    Remove the shared environment and registry secrets no job refers to.
+
+    The DaemonSets of q8sctl warm are not collected: the pre-pull removes
+    them when it ends, also when it fails or is interrupted.
+    """
+    kubeconfig = get_kubeconfig(kubeconfig)
+
+    if kubeconfig is None:
+        typer.echo("KUBECONFIG not set")
+        raise typer.Exit(code=1)
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        TimeElapsedColumn(),
+        expand=True,
+    ) as progress:
+        k8s_context = K8sContext(Path(kubeconfig).as_posix(), progress=progress)
+        k8s_context.collect_garbage(grace=grace)
+
 
 @app.command()
 def jupyter(
@@ -148,6 +542,44 @@ def jupyter(
             envvar="REGISTRY_PAT",
         ),
     ] = None,
+    suspend: Annotated[
+        bool,
+        typer.Option(
+            help="Release each job only once its code and secrets exist",
+            envvar="Q8S_SUSPENDED_START",
+        ),
+    ] = False,
+    cache: Annotated[
+        bool,
+        typer.Option(
+            help="Reuse the stored results of identical cells, except in cells "
+            "with the comment # q8s: no-cache"
+        ),
+    ] = False,
+    session: Annotated[
+        bool,
+        typer.Option(
+            help="Run all cells in one remote interpreter that keeps their state"
+        ),
+    ] = False,
+    cleanup: Annotated[
+        Cleanup,
+        typer.Option(
+            help="Remove the job waiting (client), in the background (server), "
+            "or leave it to its TTL (ttl)",
+            case_sensitive=False,
+            envvar="Q8S_CLEANUP",
+        ),
+    ] = Cleanup.server,
+    timings: Annotated[
+        bool, typer.Option(help="Show the time spent in every phase after each cell")
+    ] = False,
+    artifacts: Annotated[
+        bool,
+        typer.Option(
+            help="Show the files each cell writes to Q8S_OUTPUT_DIR after it ends"
+        ),
+    ] = False,
 ):
     if install:
         install_my_kernel_spec(user=False, prefix=sys.prefix)
@@ -157,11 +589,32 @@ def jupyter(
 
     kubeconfig = get_kubeconfig(kubeconfig)
 
-    environment_variables = {"KUBECONFIG": kubeconfig.as_posix(), "DOCKER_IMAGE": image}
+    environment_variables = {
+        "KUBECONFIG": kubeconfig.as_posix(),
+        "DOCKER_IMAGE": image,
+        "Q8S_TARGET": target.value,
+    }
 
     if registry_pat:
         environment_variables["REGISTRY_PAT"] = registry_pat
 
+    if suspend:
+        environment_variables["Q8S_SUSPENDED_START"] = "1"
+
+    if cache:
+        environment_variables["Q8S_RESULT_CACHE"] = "1"
+
+    if session:
+        environment_variables["Q8S_SESSION"] = "1"
+
+    environment_variables["Q8S_CLEANUP"] = cleanup.value
+
+    if timings:
+        environment_variables["Q8S_TIMINGS"] = "1"
+
+    if artifacts:
+        environment_variables["Q8S_ARTIFACTS"] = "1"
+
     jupyter_process = Popen(
         [sys.executable, "-m", "jupyter", "lab", "-y"],
         env=environment_variables,
@@ -1,8 +1,6 @@
 import ast
 import sys
 
-from stdlib_list import stdlib_list
-
 
 class CodeAnalyzer(ast.NodeVisitor):
     stdlibs = []
@@ -23,6 +21,9 @@ class CodeAnalyzer(ast.NodeVisitor):
 
     def stdlib_list(self):
         if sys.version_info.major == 3 and sys.version_info.minor < 10:
+            # Only needed before sys.stdlib_module_names existed
+            from stdlib_list import stdlib_list
+
             return stdlib_list(self.version)
         else:
             return sys.stdlib_module_names
@@ -59,3 +60,127 @@ class CodeAnalyzer(ast.NodeVisitor):
 
     def getImports(self):
         return sorted(self.imports)
+
+
+# Library circuits whose first argument is their number of qubits
+CIRCUIT_CONSTRUCTORS = {
+    "QuantumCircuit",
+    "QFT",
+    "QuantumVolume",
+    "EfficientSU2",
+    "RealAmplitudes",
+    "TwoLocal",
+    "NLocal",
+    "ZZFeatureMap",
+    "ZFeatureMap",
+    "PauliFeatureMap",
+    "GraphState",
+    "random_circuit",
+}
+
+
+def call_name(node: ast.Call) -> str | None:
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+class CircuitAnalyzer(CodeAnalyzer):
+    """
+    Estimate the size of the circuits the code simulates from the integer
+    constants passed to registers and circuit constructors, and which device
+    it asks the simulator for.
+    """
+
+    def __init__(self, code):
+        self.constants = {}
+        self.registers = 0
+        self.circuits = []
+        self.shots = None
+        self.device = None
+        self.simulator = False
+
+        super().__init__(code)
+
+    @property
+    def qubits(self) -> int | None:
+        """
+        Largest number of qubits of a circuit, None when no size is known.
+        """
+        sizes = self.circuits + ([self.registers] if self.registers else [])
+
+        return max(sizes) if sizes else None
+
+    @property
+    def quantum(self) -> bool:
+        return bool({"qiskit", "qiskit_aer"} & self.imports)
+
+    def evaluate(self, node) -> int | None:
+        """
+        Value of an integer expression made of literals, module level
+        constants and arithmetic, None otherwise.
+        """
+        if isinstance(node, ast.Constant) and type(node.value) is int:
+            return node.value
+        if isinstance(node, ast.Name):
+            return self.constants.get(node.id)
+        if isinstance(node, ast.BinOp):
+            left, right = self.evaluate(node.left), self.evaluate(node.right)
+            if left is None or right is None:
+                return None
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Sub):
+                return left - right
+            if isinstance(node.op, ast.Mult):
+                return left * right
+            if isinstance(node.op, ast.FloorDiv) and right != 0:
+                return left // right
+        return None
+
+    def keyword(self, node: ast.Call, name: str):
+        for keyword in node.keywords:
+            if keyword.arg == name:
+                return keyword.value
+        return None
+
+    def visit_Assign(self, node):
+        value = self.evaluate(node.value)
+
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                if value is None:
+                    self.constants.pop(target.id, None)
+                else:
+                    self.constants[target.id] = value
+
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        name = call_name(node)
+
+        if name == "QuantumRegister":
+            size = self.evaluate(
+                node.args[0] if node.args else self.keyword(node, "size")
+            )
+            if size is not None:
+                self.registers += size
+        elif name in CIRCUIT_CONSTRUCTORS:
+            size = self.evaluate(
+                node.args[0] if node.args else self.keyword(node, "num_qubits")
+            )
+            if size is not None:
+                self.circuits.append(size)
+        elif name in ("AerSimulator", "StatevectorSimulator", "QasmSimulator"):
+            self.simulator = True
+            device = self.keyword(node, "device")
+            if isinstance(device, ast.Constant) and isinstance(device.value, str):
+                self.device = device.value.upper()
+
+        shots = self.evaluate(self.keyword(node, "shots"))
+        if shots is not None:
+            self.shots = max(self.shots or 0, shots)
+
+        self.generic_visit(node)
@@ -5,3 +5,16 @@ class Target(str, Enum):
     cpu = "cpu"
     gpu = "gpu"
     qpu = "qpu"
+    # Runs on this machine, in the Python environment of the project
+    local = "local"
+    # Picks cpu or gpu for every execution from the size of its circuits
+    auto = "auto"
+
+
+class Cleanup(str, Enum):
+    # Delete the job and its objects, waiting for the deletion
+    client = "client"
+    # Delete the job in the background, the cluster removes the objects it owns
+    server = "server"
+    # Leave the job to the cluster, removed once its TTL after finishing expires
+    ttl = "ttl"
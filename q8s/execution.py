@@ -1,21 +1,73 @@
 import base64
-from json import JSONEncoder, loads
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from datetime import datetime, timezone
+from hashlib import sha256
+from json import JSONEncoder, dumps, loads
 import logging
 import os
 import random
 import string
-from time import sleep
+import threading
+from typing import Callable
+from time import monotonic, perf_counter, sleep, time
 from dotenv import dotenv_values
-from kubernetes import client, config, watch
+from kubernetes import client, config
+from kubernetes.client.rest import ApiException
 import pluggy
 from rich.progress import Progress
 
+from q8s.artifacts import Artifact, collect_artifacts, make_collected
+from q8s.bundle import INLINE_SIZE, make_bundled, pack, part_names, split
+from q8s.cache import ResultCache, resolve_image_digest
 from q8s.constants import WORKSPACE
-from q8s.enums import Target
+from q8s.enums import Cleanup, Target
+from q8s.logs import (
+    OUTPUT_HEAD,
+    OUTPUT_TAIL,
+    BoundedOutput,
+    OutputCallback,
+    iter_text,
+)
 from q8s.plugins.job_template_spec import JobTemplatePluginSpec
 from q8s.plugins.cpu_job import CPUJobTemplatePlugin
 from q8s.plugins.cuda_job import CUDAJobTemplatePlugin
+from q8s.plugins.local_job import LocalJobTemplatePlugin
+from q8s.pool import MAX_CODE_SIZE, POOL_LABEL, WarmPool
+from q8s.prepull import PREPULL_TIMEOUT, NodeCallback, prepull
+from q8s.project import Q8SPoolPolicy
+from q8s.routing import Router, Routing, circuit_qubits
+from q8s.session import SESSION_IDLE_TIMEOUT, SESSION_LABEL, RemoteSession
+from q8s.sweep import (
+    DEFAULT_PARALLELISM,
+    SweepResult,
+    latest_pods,
+    make_indexed,
+    parameters_file,
+)
+from q8s.timings import Span, Timings, pod_spans
 from q8s.utils import extract_non_none_value
+from q8s.watcher import WatchTimeoutException, resumable_watch
+
+CONTENT_HASH_LABEL = "qubernetes.dev/content-hash"
+
+# Time an execution last used a shared Secret
+LAST_USED_ANNOTATION = "qubernetes.dev/last-used"
+
+# Time, in seconds, since its last use before an unreferenced shared Secret is
+# removed
+SECRET_GRACE = 10 * 60
+
+# Logs of a sweep read at the same time, within the default connection pool
+LOG_WORKERS = 4
+
+# Longest time an execution may take, in seconds
+JOB_TIMEOUT = int(os.environ.get("Q8S_JOB_TIMEOUT", 24 * 60 * 60))
+
+# Time, in seconds, a finished job is kept before the cluster removes it, along
+# with the objects it owns
+JOB_TTL = int(os.environ.get("Q8S_JOB_TTL", 5 * 60))
 
 
 def load_env():
@@ -24,13 +76,105 @@ def load_env():
     return env
 
 
+def job_status(event_type: str, job: client.V1Job) -> tuple[str, str, bool, str]:
+    """
+    Map a job event to its status message and color, whether the job is done
+    and the stream of its output.
+    """
+    status = job.status
+
+    # Job not picked up by the controller yet
+    if status.active is None and status.start_time is None and not status.failed:
+        return "Scheduled", "orange3", False, "stdout"
+
+    # Job execution completed
+    if status.active is None:
+        # Failed
+        if status.conditions is None:
+            return "Failed", "red", True, "stderr"
+
+        message = status.conditions[-1].type
+
+        if message == "Failed":
+            return message, "red", True, "stderr"
+
+        # Succeeded
+        return message, "green", message == "Complete", "stdout"
+
+    # Job schedukled
+    if event_type == "ADDED":
+        return "Scheduled", "orange3", False, "stdout"
+
+    # Job running
+    return "Running", "yellow", False, "stdout"
+
+
+def content_hash(data: dict) -> str:
+    """
+    Hash of the content of a Secret, used to name and share it.
+    """
+    return sha256(dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def referenced_secrets(spec: client.V1PodSpec) -> set[str]:
+    """
+    Names of the Secrets a pod spec refers to.
+    """
+    names = {secret.name for secret in spec.image_pull_secrets or []}
+
+    for container in spec.containers:
+        for env in container.env or []:
+            if env.value_from is not None and env.value_from.secret_key_ref:
+                names.add(env.value_from.secret_key_ref.name)
+
+    return names
+
+
+def last_used(secret: client.V1Secret) -> datetime:
+    """
+    Time an execution last used the shared Secret, its creation if unknown.
+    """
+    used = (secret.metadata.annotations or {}).get(LAST_USED_ANNOTATION)
+
+    if used is None:
+        return secret.metadata.creation_timestamp
+
+    return max(secret.metadata.creation_timestamp, datetime.fromisoformat(used))
+
+
 class K8sContext:
     container_image: str | None = None
     registry_pat: str | None = None
     jupyter_logger: None
     target: Target = Target.gpu
-    jm: pluggy.PluginManager = pluggy.PluginManager("q8s")
+    jm: pluggy.PluginManager
     __progress: Progress | None
+    __pools: dict[Target, WarmPool]
+    __session: RemoteSession | None = None
+    __deadline: float | None = None
+    timeout: int | None = JOB_TIMEOUT
+    suspended_start: bool = False
+    startup_latency: dict[str, float] = {}
+    result_cache: ResultCache | None = None
+    cached: bool = False
+    __image_digests: dict[str, str | None]
+    cleanup: Cleanup = Cleanup.server
+    timings: Timings
+    __configuration: Span | None = None
+    __pod: client.V1Pod | None = None
+    __job: client.V1Job | None = None
+    __bundle_parts: list[str] = []
+    output_head: int = OUTPUT_HEAD
+    output_tail: int = OUTPUT_TAIL
+    output_spill: str | os.PathLike | None = None
+    collect: bool = False
+    artifacts: list[Artifact] = []
+    __log_container: str | None = None
+    job_ttl: int = JOB_TTL
+    router: Router | None = None
+    routing: Routing | None = None
+    resources: dict[str, str] | None = None
+    __target_images: dict[Target, str] = {}
 
     def __init__(self, kubeconfig: str, logger=None, progress: Progress = None):
         """
@@ -38,13 +182,16 @@ class K8sContext:
         """
         self.__progress = progress
 
+        self.jm = pluggy.PluginManager("q8s")
         self.jm.add_hookspecs(JobTemplatePluginSpec)
         self.jm.register(CPUJobTemplatePlugin())
         self.jm.register(CUDAJobTemplatePlugin())
+        self.jm.register(LocalJobTemplatePlugin())
 
         task_config = self.__progress.add_task(
             "[cyan]Loading configuration...", total=1
         )
+        started = time()
 
         config.load_kube_config(kubeconfig)
         self.__progress.console.print("Cluster configuration loaded")
@@ -56,13 +203,22 @@ class K8sContext:
         except KeyError:
             self.namespace = "default"
         self.__progress.console.print(f"Active namespace: {self.namespace}")
+        # Reported with the first execution
+        self.__configuration = Span("configuration", started, time())
+        self.timings = Timings()
+        # Looked up once per image, shared with the forks of the context
+        self.__image_digests = {}
 
         self.core_api_instance = client.CoreV1Api()
         self.batch_api_instance = client.BatchV1Api()
+        self.apps_api_instance = client.AppsV1Api()
+        # stream() swaps the request method of its api client, keep it separate
+        self.exec_api_instance = client.CoreV1Api(client.ApiClient())
 
         self.name = f"qubernetes-job-{K8sContext.get_id()}"
 
         self.__env = load_env()
+        self.__pools = {}
 
         self.jupyter_logger = logger
 
@@ -82,17 +238,277 @@ class K8sContext:
     def set_target(self, target: Target):
         self.target = target
 
-    def create_job_object(self, code: str) -> client.V1Job:
-        return None
+    def set_output_limit(
+        self,
+        head: int = OUTPUT_HEAD,
+        tail: int = OUTPUT_TAIL,
+        spill: str | os.PathLike | None = None,
+    ):
+        """
+        Keep only the first head and last tail characters of the output, a
+        negative head keeping all of it. The whole output is written to the
+        spill file, or to a new file per execution when it is a folder.
+        """
+        self.output_head = head
+        self.output_tail = tail
+        self.output_spill = spill
+
+    def set_artifacts(self, collect: bool):
+        """
+        Collect the files the program writes to Q8S_OUTPUT_DIR once it ends.
+        """
+        self.collect = collect
 
-    def __registry_credentials_secret_name(self):
-        return f"{self.name}-regcred"
+    def set_router(self, router: Router | None):
+        """
+        Route the executions of the auto target, and record the run times
+        that refine the routing.
+        """
+        self.router = router
 
-    def __create_job_object(self, code: str):
+    def set_target_images(self, images: dict[Target, str]):
         """
-        Create a job object with the given code.
+        Images of the targets the auto target may route to.
+        """
+        self.__target_images = images
+
+    def set_suspended_start(self, suspended: bool):
+        """
+        Create jobs suspended and release them once their dependencies exist.
+        """
+        self.suspended_start = suspended
+
+    def set_timeout(self, timeout: int | None):
+        """
+        Limit how long an execution may take, in seconds.
+        """
+        self.timeout = timeout
+
+    def set_cleanup(self, cleanup: Cleanup, job_ttl: int = JOB_TTL):
+        """
+        Choose how the job and its objects are removed after the execution.
+        Whatever the mode, the cluster removes finished jobs after their TTL.
+        """
+        self.cleanup = cleanup
+        self.job_ttl = job_ttl
+
+    def set_result_cache(self, cache: ResultCache | None):
+        """
+        Reuse the stored results of identical executions.
+        """
+        self.result_cache = cache
+
+    def set_pool_policy(self, policy: Q8SPoolPolicy | None):
+        """
+        Keep a pool of warm pods for the current target, stopping the pools of
+        the targets used before.
+        """
+        for target in list(self.__pools):
+            self.__shutdown_pool(self.__pools.pop(target))
+
+        if policy is None or policy.size <= 0:
+            return
+
+        if self.target in (Target.local, Target.auto):
+            return
+
+        pool_name = f"{self.name}-pool-{self.target.value}"
+
+        pool = WarmPool(
+            pool_name, self.namespace, self.__pod_template(pool_name), policy
+        )
+        self.__pools[self.target] = pool
+        pool.refill()
+
+        self.__progress.console.print(
+            f"Warm pool {pool_name} started with {policy.size} pod(s)"
+        )
+
+    def set_session(self, enabled: bool, idle_timeout: int = SESSION_IDLE_TIMEOUT):
+        """
+        Run the code in one long lived interpreter of the current target, so
+        that the state persists between executions.
+        """
+        if self.__session is not None:
+            self.__session.shutdown()
+            self.__session = None
+
+        if not enabled:
+            return
+
+        if self.target in (Target.local, Target.auto):
+            self.__progress.console.print(
+                f"Sessions are not available for the {self.target.value} target"
+            )
+            return
+
+        session_name = f"{self.name}-session-{self.target.value}"
+
+        self.__session = RemoteSession(
+            session_name,
+            self.namespace,
+            self.__pod_template(session_name),
+            idle_timeout,
+        )
+
+    def __pod_template(self, name: str) -> client.V1PodTemplateSpec:
+        """
+        Build the pod template of the current target for pods kept between
+        executions, with the Secrets it refers to in place.
+        """
+        self.__create_environment_secret()
+        if self.registry_pat:
+            self.__create_registry_credentials_secret()
+
+        return extract_non_none_value(
+            self.jm.hook.makejob(
+                env=self.__prepare_environment(),
+                container_image=self.container_image,
+                target=self.target,
+                registry_credentials_secret_name=(
+                    self.registry_credentials_secret_name()
+                    if self.registry_pat
+                    else None
+                ),
+                name=name,
+                registry_pat=self.registry_pat,
+            )
+        )
+
+    def __shutdown_pool(self, pool: WarmPool):
+        pool.shutdown()
+
+    def shutdown(self):
+        """
+        Release the resources kept between executions.
+        """
+        for pool in self.__pools.values():
+            self.__shutdown_pool(pool)
+
+        self.__pools = {}
+
+        if self.__session is not None:
+            self.__session.shutdown()
+            self.__session = None
+
+        try:
+            self.collect_garbage()
+        except ApiException as e:
+            logging.warning(f"Secret garbage collection failed: {e.reason}")
+
+    def collect_garbage(self, grace: int = SECRET_GRACE):
+        """
+        Delete the shared Secrets that no job or warm pod refers to anymore.
+
+        Secrets used within the grace period, in seconds, are kept, since an
+        execution may be about to refer to them. A Secret used again while the
+        collection runs is kept as well.
+        """
+        secrets = self.core_api_instance.list_namespaced_secret(
+            self.namespace, label_selector=CONTENT_HASH_LABEL
+        )
+        jobs = self.batch_api_instance.list_namespaced_job(
+            self.namespace, label_selector="qubernetes.dev/job.type"
+        )
+        pods = [
+            pod
+            for label in (POOL_LABEL, SESSION_LABEL)
+            for pod in self.core_api_instance.list_namespaced_pod(
+                self.namespace, label_selector=label
+            ).items
+        ]
+
+        referenced = set()
+
+        for spec in [job.spec.template.spec for job in jobs.items] + [
+            pod.spec for pod in pods
+        ]:
+            referenced.update(referenced_secrets(spec))
+
+        now = datetime.now(timezone.utc)
+        removed = 0
+
+        for secret in secrets.items:
+            age = (now - last_used(secret)).total_seconds()
+
+            if secret.metadata.name in referenced or age < grace:
+                continue
+
+            try:
+                # Fails when an execution marked the Secret as used meanwhile
+                self.core_api_instance.delete_namespaced_secret(
+                    secret.metadata.name,
+                    self.namespace,
+                    body=client.V1DeleteOptions(
+                        preconditions=client.V1Preconditions(
+                            resource_version=secret.metadata.resource_version
+                        )
+                    ),
+                )
+                removed += 1
+            except ApiException as e:
+                if e.status not in (404, 409):
+                    raise
+
+        self.__progress.console.print(f"Unreferenced secrets removed: {removed}")
+
+        return removed
+
+    def warm(
+        self, on_node: NodeCallback | None = None, timeout: int = PREPULL_TIMEOUT
+    ) -> list[str]:
+        """
+        Pull the image of the target onto every node its jobs may run on, so
+        that the first execution there starts without pulling it, and get the
+        names of the nodes.
+        """
+        if self.target in (Target.local, Target.auto):
+            raise ValueError("Only the images of cluster targets can be pulled")
+
+        if self.registry_pat:
+            self.__create_registry_credentials_secret()
+
+        name = f"q8s-prepull-{self.target.value}-{K8sContext.get_id()}"
+        template = extract_non_none_value(
+            self.jm.hook.prepull(
+                name=name,
+                registry_credentials_secret_name=(
+                    self.registry_credentials_secret_name()
+                    if self.registry_pat
+                    else None
+                ),
+                container_image=self.container_image,
+                target=self.target,
+            )
+        )
+
+        if template is None:
+            raise ValueError(f"No plugin pulls the images of {self.target.value}")
+
+        return prepull(
+            self.apps_api_instance,
+            self.core_api_instance,
+            self.namespace,
+            name,
+            template,
+            on_node,
+            timeout,
+        )
+
+    def fork(self) -> "K8sContext":
+        """
+        Copy of the context for another execution, sharing its API clients.
+        """
+        context = copy(self)
+        context.name = f"qubernetes-job-{K8sContext.get_id()}"
+        context.timings = Timings()
+
+        return context
+
+    def create_job_object(self, code: str) -> client.V1Job:
+        """
+        Build the job object for the given code.
         """
-        prepare_task = self.__progress.add_task("[cyan]Prepare job...", total=1)
         env = self.__prepare_environment()
 
         self.jm.hook.prepare(
@@ -107,14 +523,23 @@ class K8sContext:
                 env=env,
                 container_image=self.container_image,
                 target=self.target,
-                registry_credentials_secret_name=self.__registry_credentials_secret_name(),
+                registry_credentials_secret_name=(
+                    self.registry_credentials_secret_name()
+                    if self.registry_pat
+                    else None
+                ),
                 name=self.name,
                 registry_pat=self.registry_pat,
             )
         )
+        self.__apply_resources(template)
 
         # Create the specification of deployment
-        spec = client.V1JobSpec(template=template)  # , ttl_seconds_after_finished=10
+        # The cluster removes the job, and the objects it owns, even when the
+        # client does not
+        spec = client.V1JobSpec(
+            template=template, ttl_seconds_after_finished=self.job_ttl
+        )
 
         # Instantiate the job object
         job_spec = client.V1Job(
@@ -128,95 +553,307 @@ class K8sContext:
             spec=spec,
         )
 
+        return job_spec
+
+    def resource_profile(self) -> str:
+        """
+        Hash of the resources, runtime and placement the target requests.
+        """
+        template = extract_non_none_value(
+            self.jm.hook.makejob(
+                env=[],
+                container_image=self.container_image,
+                target=self.target,
+                registry_credentials_secret_name=None,
+                name="profile",
+                registry_pat=None,
+            )
+        )
+        self.__apply_resources(template)
+        spec = template.spec
+
+        return content_hash(
+            client.ApiClient().sanitize_for_serialization(
+                {
+                    "resources": [c.resources for c in spec.containers],
+                    "runtime_class_name": spec.runtime_class_name,
+                    "node_selector": spec.node_selector,
+                    "tolerations": spec.tolerations,
+                    "affinity": spec.affinity,
+                }
+            )
+        )
+
+    def __apply_resources(self, template: client.V1PodTemplateSpec):
+        """
+        Add the resource requests chosen by the routing to the container.
+        """
+        if not self.resources:
+            return
+
+        container = template.spec.containers[0]
+        resources = container.resources or client.V1ResourceRequirements()
+        resources.requests = {**(resources.requests or {}), **self.resources}
+        container.resources = resources
+
+    def result_key(
+        self, code: str, modules: dict[str, str] | None = None
+    ) -> str | None:
+        """
+        Key of the result of the given code, None when the image digest is
+        unknown and the result cannot be reused safely. Local executions depend
+        on the packages installed on this machine and are never reused.
+        """
+        if self.target == Target.local:
+            return None
+
+        if self.container_image not in self.__image_digests:
+            self.__image_digests[self.container_image] = resolve_image_digest(
+                self.container_image
+            )
+
+        digest = self.__image_digests[self.container_image]
+
+        if digest is None:
+            return None
+
+        return content_hash(
+            {
+                "code": sha256(code.encode()).hexdigest(),
+                **({"modules": content_hash(modules)} if modules else {}),
+                "image": digest,
+                "target": self.target.value,
+                "environment": content_hash(self.__env),
+                "resources": self.resource_profile(),
+            }
+        )
+
+    def environment_secret_name(self) -> str:
+        return f"q8s-env-{content_hash(self.__env)}"
+
+    def registry_credentials_secret_name(self) -> str:
+        return f"q8s-regcred-{content_hash(self.__registry_credentials())}"
+
+    def ensure_secret(self, secret: client.V1Secret):
+        """
+        Create the content addressed Secret unless it already exists, and mark
+        it as used so that the garbage collection keeps it.
+        """
+        used = datetime.now(timezone.utc).isoformat()
+
+        try:
+            self.core_api_instance.patch_namespaced_secret(
+                secret.metadata.name,
+                self.namespace,
+                {"metadata": {"annotations": {LAST_USED_ANNOTATION: used}}},
+            )
+            return
+        except ApiException as e:
+            if e.status != 404:
+                raise
+
+        secret.metadata.annotations = {
+            **(secret.metadata.annotations or {}),
+            LAST_USED_ANNOTATION: used,
+        }
+
+        try:
+            self.core_api_instance.create_namespaced_secret(
+                namespace=self.namespace, body=secret
+            )
+        except ApiException as e:
+            # Created meanwhile by another execution
+            if e.status != 409:
+                raise
+
+    def __create_job_object(
+        self,
+        code: str,
+        parameters: list[dict] | None = None,
+        parallelism: int = DEFAULT_PARALLELISM,
+        modules: dict[str, str] | None = None,
+    ):
+        """
+        Create a job object with the given code, as an Indexed Job running it
+        once per set of parameters when given. The code is shipped in a
+        compressed bundle along with its modules, if any, or when too large to
+        be sent as is.
+        """
+        prepare_task = self.__progress.add_task("[cyan]Prepare job...", total=1)
+        self.startup_latency = {}
+        # The job of the previous execution may still be around until the
+        # cluster removes it
+        self.name = f"qubernetes-job-{K8sContext.get_id()}"
+
+        job_spec = self.create_job_object(code)
+        files = None
+        bundle = None
+        self.__bundle_parts = []
+        if parameters is not None:
+            make_indexed(job_spec, parameters, parallelism)
+            files = parameters_file(parameters)
+        elif modules or len(code.encode()) > INLINE_SIZE:
+            archive = pack({"main.py": code, **(modules or {})})
+            bundle = split(archive)
+            self.__bundle_parts = part_names(self.name, len(bundle))
+            make_bundled(job_spec, self.__bundle_parts)
+        self.__log_container = None
+        if self.collect and parameters is None:
+            # The pod has two containers, the logs are those of the program
+            self.__log_container = job_spec.spec.template.spec.containers[0].name
+            make_collected(job_spec)
+        if self.suspended_start:
+            # Keep the pod from being scheduled before its dependencies exist
+            job_spec.spec.suspend = True
+
+        started = perf_counter()
         job = self.batch_api_instance.create_namespaced_job(
             body=job_spec, namespace=self.namespace
         )
-        self.__progress.console.print("Job created")
+        self.__progress.console.print(f"Job created {self.__latency('job', started)}")
+
+        started = perf_counter()
+        if bundle is None:
+            self.__create_config_map_object(code, job, files)
+            self.__progress.console.print(
+                f"Application code created {self.__latency('config_map', started)}"
+            )
+        else:
+            for name, binary_data in zip(self.__bundle_parts, bundle):
+                self.core_api_instance.create_namespaced_config_map(
+                    namespace=self.namespace,
+                    body=self.create_config_map_object(
+                        code, job, name=name, binary_data=binary_data
+                    ),
+                )
+            self.__progress.console.print(
+                f"Application bundle of {len(archive)} bytes created in "
+                f"{len(bundle)} part(s) "
+                f"{self.__latency('config_map', started)}"
+            )
 
-        self.__create_config_map_object(code, job)
-        self.__progress.console.print("Application code created")
+        started = perf_counter()
         self.__create_environment_secret()
-        self.__progress.console.print("Environment variables created")
+        self.__progress.console.print(
+            f"Environment variables created {self.__latency('environment', started)}"
+        )
 
         if self.registry_pat:
+            started = perf_counter()
             self.__create_registry_credentials_secret()
+            self.__progress.console.print(
+                f"Registry credentials created "
+                f"{self.__latency('registry_credentials', started)}"
+            )
+
+        if self.suspended_start:
+            started = perf_counter()
+            job = self.batch_api_instance.patch_namespaced_job(
+                self.name, self.namespace, {"spec": {"suspend": False}}
+            )
+            self.__progress.console.print(
+                f"Job released {self.__latency('release', started)}"
+            )
 
         self.__progress.advance(prepare_task, 1)
         return job
 
-    def __create_config_map_object(self, code: str, job: client.V1Job):
+    def __latency(self, step: str, started: float) -> str:
         """
-        Create a ConfigMap object with the given code.
+        Record the latency of a startup step and format it.
+        """
+        latency = (perf_counter() - started) * 1000
+        self.startup_latency[step] = latency
+        end = time()
+        self.timings.add(step, end - latency / 1000, end)
+
+        return f"({latency:.0f} ms)"
+
+    def create_config_map_object(
+        self,
+        code: str,
+        job: client.V1Job | None = None,
+        files: dict[str, str] | None = None,
+        name: str | None = None,
+        binary_data: dict[str, str] | None = None,
+    ) -> client.V1ConfigMap:
+        """
+        Build the ConfigMap object with the given code and extra files, or
+        with a part of a bundle, owned by the job if any.
         """
         # Configureate ConfigMap from a local file
-        configmap = client.V1ConfigMap(
+        return client.V1ConfigMap(
             api_version="v1",
             kind="ConfigMap",
-            data={"main.py": code},
+            data=({"main.py": code, **(files or {})} if binary_data is None else None),
+            binary_data=binary_data,
             metadata=client.V1ObjectMeta(
-                name=self.name,
-                owner_references=[
-                    client.V1OwnerReference(
-                        api_version="batch/v1",
-                        kind="Job",
-                        name=job.metadata.name,
-                        uid=job.metadata.uid,
-                        # block_owner_deletion=True,
-                        # controller=True,
-                    )
-                ],
+                name=name or self.name,
+                owner_references=(
+                    [
+                        client.V1OwnerReference(
+                            api_version="batch/v1",
+                            kind="Job",
+                            name=job.metadata.name,
+                            uid=job.metadata.uid,
+                            # block_owner_deletion=True,
+                            # controller=True,
+                        )
+                    ]
+                    if job is not None
+                    else None
+                ),
             ),
         )
 
+    def __create_config_map_object(
+        self, code: str, job: client.V1Job, files: dict[str, str] | None = None
+    ):
+        """
+        Create a ConfigMap object with the given code.
+        """
         self.core_api_instance.create_namespaced_config_map(
-            namespace=self.namespace, body=configmap
+            namespace=self.namespace,
+            body=self.create_config_map_object(code, job, files),
         )
 
-    def __create_environment_secret(self):
+    def create_environment_secret_object(self) -> client.V1Secret:
         """
-        Create a Secret object with the environment variables.
+        Build the Secret object with the environment variables, named after
+        their content.
         """
         data = {}
 
         for key in self.__env.keys():
             data[key] = base64.b64encode(self.__env[key].encode()).decode()
 
-        secret = client.V1Secret(
+        return client.V1Secret(
             api_version="v1",
             kind="Secret",
             type="Opaque",
             immutable=True,
             data=data,
             metadata=client.V1ObjectMeta(
-                name=self.name,
+                name=self.environment_secret_name(),
                 namespace=self.namespace,
-                # owner_references=[
-                #     client.V1OwnerReference(
-                #         api_version="v1",
-                #         kind="Job",
-                #         name=job.metadata.name,
-                #         uid=job.metadata.uid,
-                #         # block_owner_deletion=True,
-                #         # controller=True,
-                #     )
-                # ],
+                labels={CONTENT_HASH_LABEL: content_hash(self.__env)},
             ),
         )
 
-        self.core_api_instance.create_namespaced_secret(
-            namespace=self.namespace, body=secret
-        )
-
-    def __create_registry_credentials_secret(self):
+    def __create_environment_secret(self):
         """
-        Create a Secret object with the registry credentials.
+        Create the Secret object with the environment variables, unless an
+        execution with the same environment did already.
         """
+        self.ensure_secret(self.create_environment_secret_object())
+
+    def __registry_credentials(self) -> dict:
         segments = self.container_image.split("/")
         # Find user name for images on Docker Hub
         username = segments[0] if len(segments) == 2 else segments[1]
         registry = segments[0] if len(segments) == 3 else "https://index.docker.io/v1/"
 
-        config = {
+        return {
             "auths": {
                 registry: {
                     "auth": base64.b64encode(
@@ -226,14 +863,22 @@ class K8sContext:
             }
         }
 
-        secret = client.V1Secret(
+    def create_registry_credentials_secret_object(self) -> client.V1Secret:
+        """
+        Build the Secret object with the registry credentials, named after
+        their content.
+        """
+        config = self.__registry_credentials()
+
+        return client.V1Secret(
             api_version="v1",
             kind="Secret",
             type="kubernetes.io/dockerconfigjson",
             immutable=True,
             metadata=client.V1ObjectMeta(
-                name=self.__registry_credentials_secret_name(),
+                name=self.registry_credentials_secret_name(),
                 namespace=self.namespace,
+                labels={CONTENT_HASH_LABEL: content_hash(config)},
             ),
             data={
                 ".dockerconfigjson": base64.b64encode(
@@ -242,30 +887,61 @@ class K8sContext:
             },
         )
 
-        self.core_api_instance.create_namespaced_secret(
-            namespace=self.namespace, body=secret
-        )
+    def __create_registry_credentials_secret(self):
+        """
+        Create the Secret object with the registry credentials, unless an
+        execution with the same credentials did already.
+        """
+        self.ensure_secret(self.create_registry_credentials_secret_object())
 
     def __delete_job(self):
         """
-        Delete the job and its associated resources.
+        Delete the job and its associated resources, according to the cleanup
+        mode.
         """
-        cleanup_task = self.__progress.add_task("[cyan]Cleaning up...", total=1)
+        if self.cleanup == Cleanup.ttl:
+            self.jm.hook.cleanup(name=self.name, namespace=self.namespace)
+            return
 
-        if self.registry_pat:
-            self.core_api_instance.delete_namespaced_secret(
-                self.__registry_credentials_secret_name(), self.namespace
+        if self.cleanup == Cleanup.server:
+            threading.Thread(
+                target=self.__delete_job_in_background,
+                args=(self.name,),
+                daemon=True,
+            ).start()
+            return
+
+        self.__delete_job_and_wait()
+
+    def __delete_job_in_background(self, name: str):
+        """
+        Delete the job, the cluster removes the objects it owns.
+        """
+        try:
+            self.jm.hook.cleanup(name=name, namespace=self.namespace)
+
+            self.batch_api_instance.delete_namespaced_job(
+                name,
+                self.namespace,
+                body=client.V1DeleteOptions(propagation_policy="Background"),
             )
-            self.__progress.console.print("Registry credentials removed")
+        except ApiException as e:
+            # The TTL of the job removes it anyway
+            if e.status != 404:
+                logging.warning(f"Failed to delete job {name}: {e.reason}")
 
-        self.core_api_instance.delete_namespaced_secret(self.name, self.namespace)
-        self.__progress.console.print("Environment variables removed.")
+    def __delete_job_and_wait(self):
+        """
+        Delete the job and its associated resources, waiting for the deletion.
+        """
+        cleanup_task = self.__progress.add_task("[cyan]Cleaning up...", total=1)
 
-        self.core_api_instance.delete_namespaced_config_map(
-            self.name,
-            self.namespace,
-            body=client.V1DeleteOptions(propagation_policy="Foreground"),
-        )
+        for name in self.__bundle_parts or [self.name]:
+            self.core_api_instance.delete_namespaced_config_map(
+                name,
+                self.namespace,
+                body=client.V1DeleteOptions(propagation_policy="Foreground"),
+            )
         self.__progress.console.print("Application code removed.")
 
         self.jm.hook.cleanup(name=self.name, namespace=self.namespace)
@@ -290,15 +966,67 @@ class K8sContext:
         finally:
             self.__progress.advance(cleanup_task, 1)
 
-    def __get_job_logs(self, name="qiskit-aer-gpu"):
+    def __get_job_logs(
+        self, name="qiskit-aer-gpu", on_output: OutputCallback | None = None
+    ) -> str:
         """
-        Get the logs of the job.
+        Get the logs of the job, passed on chunk by chunk when a callback is
+        given, or else their head and tail.
         """
         api_response = self.core_api_instance.read_namespaced_pod_log(
-            name=name, namespace=self.namespace
+            name=name,
+            namespace=self.namespace,
+            container=self.__log_container,
+            _preload_content=False,
+        )
+
+        if on_output is not None:
+            for text in iter_text(api_response):
+                on_output(text)
+            return ""
+
+        output = BoundedOutput(self.output_head, self.output_tail)
+        for text in iter_text(api_response):
+            output.write(text)
+
+        return output.close()
+
+    def get_pod_logs(self, name: str) -> str:
+        """
+        Get the head and tail of the logs of the pod.
+        """
+        return self.__get_job_logs(name)
+
+    def __follow_job_logs(self, name: str, on_output: OutputCallback):
+        """
+        Forward the logs of the running pod as they are written.
+        """
+        api_response = self.core_api_instance.read_namespaced_pod_log(
+            name=name,
+            namespace=self.namespace,
+            container=self.__log_container,
+            follow=True,
+            _preload_content=False,
         )
-        logging.debug("Job logs='%s'" % str(api_response))
-        return api_response
+
+        for text in iter_text(api_response):
+            on_output(text)
+
+    def __wait_for_pod_start(self):
+        """
+        Wait until the pod of the job has started and get its name.
+        """
+        for event in resumable_watch(
+            self.core_api_instance.list_namespaced_pod,
+            deadline=self.__deadline,
+            namespace=self.namespace,
+            label_selector=f"app={self.name}",
+        ):
+            pod = event["object"]
+
+            if pod.status.phase in ("Running", "Succeeded", "Failed"):
+                self.__pod = pod
+                return pod.metadata.name
 
     def __get_pods_in_job(self):
         """
@@ -308,7 +1036,8 @@ class K8sContext:
             self.namespace, label_selector=f"app={self.name}"
         )
 
-        pod_name = pods.items[0].metadata.name
+        self.__pod = pods.items[0]
+        pod_name = self.__pod.metadata.name
 
         return pod_name
 
@@ -319,49 +1048,29 @@ class K8sContext:
         result = "stdout"
 
         execute_task = self.__progress.add_task("[cyan]Executing job...", total=1)
+        started = time()
 
-        w = watch.Watch()
-
-        for event in w.stream(
+        for event in resumable_watch(
             self.batch_api_instance.list_namespaced_job,
+            deadline=self.__deadline,
             namespace=self.namespace,
-            label_selector=f"qubernetes.dev/job.type=jupyter",
+            field_selector=f"metadata.name={self.name}",
         ):
-            if event["object"].metadata.name == self.name:
-
-                # Job execution completed
-                if event["object"].status.active is None:
-                    # Failed
-                    if event["object"].status.conditions is None:
-                        message = "Failed"
-                        color = "red"
-                        w.stop()
-                        result = "stderr"
-
-                    # Succeeded
-                    else:
-                        message = event["object"].status.conditions[-1].type
-                        color = "green"
-
-                        if event["object"].status.conditions[-1].type == "Complete":
-                            w.stop()
-                # Job schedukled
-                elif event["type"] == "ADDED":
-                    message = "Scheduled"
-                    color = "orange3"
-                # Job running
-                else:
-                    message = "Running"
-                    color = "yellow"
-
-                if self.jupyter_logger is None:
-                    self.__progress.update(
-                        execute_task,
-                        description=f"[cyan]Executing job... [{color}]{message}",
-                    )
-                else:
-                    self.jupyter_logger(f"Pod status: {message}")
+            self.__job = event["object"]
+            message, color, done, result = job_status(event["type"], self.__job)
+
+            if self.jupyter_logger is None:
+                self.__progress.update(
+                    execute_task,
+                    description=f"[cyan]Executing job... [{color}]{message}",
+                )
+            else:
+                self.jupyter_logger(f"Pod status: {message}")
+
+            if done:
+                break
 
+        self.timings.add("status", started, time())
         self.__progress.advance(execute_task, 1)
 
         return result
@@ -378,7 +1087,7 @@ class K8sContext:
                     name=key,
                     value_from=client.V1EnvVarSource(
                         secret_key_ref=client.V1SecretKeySelector(
-                            name=self.name, key=key
+                            name=self.environment_secret_name(), key=key
                         )
                     ),
                 )
@@ -386,31 +1095,480 @@ class K8sContext:
 
         return env
 
-    def execute(self, code: str) -> tuple[str, str]:
+    def execute(
+        self,
+        code: str,
+        on_output: OutputCallback | None = None,
+        cache: bool = True,
+        modules: dict[str, str] | None = None,
+    ) -> tuple[str, str]:
+        """
+        Execute the given code, along with the local modules it imports, keyed
+        by their path relative to it.
+
+        With an output callback, the logs are forwarded while the job runs and
+        the returned output only holds what was not forwarded. Unless bypassed,
+        a stored result of the same code, modules, image, target, environment
+        and resources is returned instead of running the code again, and cached
+        is set.
+
+        The time spent in every phase is recorded in the timings of the
+        context, and the artifacts the job wrote, when collected, in its
+        artifacts. Results with artifacts are not stored.
+        """
+        self.timings = Timings()
+        self.artifacts = []
+        self.cached = False
+
+        if self.__configuration is not None:
+            self.timings.extend([self.__configuration])
+            self.__configuration = None
+
+        if self.__session is not None:
+            # The output depends on the state left by earlier executions
+            return self.__bounded(
+                lambda write, follow: self.__execute_in_session(code, write),
+                on_output,
+            )
+
+        with self.__routed(code):
+            return self.__execute_cached(code, on_output, cache, modules)
+
+    def __execute_cached(
+        self,
+        code: str,
+        on_output: OutputCallback | None,
+        cache: bool,
+        modules: dict[str, str] | None,
+    ) -> tuple[str, str]:
+        key = None
+
+        if cache and self.result_cache is not None and not self.collect:
+            with self.timings.span("result_key"):
+                key = self.result_key(code, modules)
+
+        if key is None:
+            return self.__execute_and_record(code, on_output, modules)
+
+        def execute(forward: OutputCallback | None) -> tuple[str, str]:
+            self.cached = False
+            return self.__execute_and_record(code, forward, modules)
+
+        # Unless the code runs, the result is the one of an earlier execution
+        self.cached = True
+
+        return self.result_cache.run(key, execute, on_output)
+
+    def route(self, code: str) -> Routing | None:
+        """
+        When the target is auto, switch to the target, image and resources
+        the router picks for the code and report why.
+        """
+        if self.target != Target.auto:
+            self.routing = None
+            return None
+
+        with self.timings.span("routing"):
+            routing = (self.router or Router()).route(code)
+
+        notice = f"Routed to {routing.target.value}: {routing.reason}"
+        self.__progress.console.print(notice)
+        if self.jupyter_logger is not None:
+            self.jupyter_logger(notice)
+
+        self.routing = routing
+        self.target = routing.target
+        self.container_image = self.__target_images.get(
+            routing.target, self.container_image
+        )
+        self.resources = routing.resources
+
+        return routing
+
+    @contextmanager
+    def __routed(self, code: str):
+        """
+        Run the block routed for the code, back on the auto target after.
+        """
+        image = self.container_image
+
+        if self.route(code) is None:
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            self.target = Target.auto
+            self.container_image = image
+            self.resources = None
+
+    def __execute_and_record(
+        self,
+        code: str,
+        on_output: OutputCallback | None = None,
+        modules: dict[str, str] | None = None,
+    ) -> tuple[str, str]:
+        """
+        Execute the given code, recording how long successful simulations
+        took on the target.
+        """
+        started = monotonic()
+        output, stream = self.__execute(code, on_output, modules)
+
+        if (
+            self.router is not None
+            and stream == "stdout"
+            and self.target in (Target.cpu, Target.gpu)
+        ):
+            qubits = (
+                self.routing.qubits
+                if self.routing is not None
+                else circuit_qubits(code)
+            )
+            if qubits is not None:
+                self.router.record(qubits, self.target, monotonic() - started)
+
+        return output, stream
+
+    def __execute(
+        self,
+        code: str,
+        on_output: OutputCallback | None = None,
+        modules: dict[str, str] | None = None,
+    ) -> tuple[str, str]:
+        return self.__bounded(
+            lambda write, follow: self.__execute_bounded(code, write, follow, modules),
+            on_output,
+        )
+
+    def __bounded(
+        self,
+        execute: Callable[[OutputCallback, bool], tuple[str, str]],
+        on_output: OutputCallback | None,
+    ) -> tuple[str, str]:
+        """
+        Run the execution, keeping only the head and tail of its output, and
+        append the messages it returns.
+        """
+        spill = self.output_spill
+
+        if spill is not None and os.path.isdir(spill):
+            # One file per execution
+            spill = os.path.join(
+                spill,
+                f"q8s-{datetime.now():%Y%m%d-%H%M%S}-{K8sContext.get_id()}.log",
+            )
+
+        output = BoundedOutput(self.output_head, self.output_tail, on_output, spill)
+
+        try:
+            message, stream = execute(output.write, on_output is not None)
+        finally:
+            kept = output.close()
+
+        if kept and message and not kept.endswith("\n"):
+            kept += "\n"
+
+        return kept + message, stream
+
+    def __execute_bounded(
+        self,
+        code: str,
+        on_output: OutputCallback,
+        follow: bool,
+        modules: dict[str, str] | None = None,
+    ) -> tuple[str, str]:
         """
-        Execute the given code.
+        Execute the given code, passing all of its output on. Only messages
+        about the execution itself are returned.
         """
+        if self.target == Target.local:
+            return self.__execute_locally(code, on_output, modules)
+
+        pool = self.__pools.get(self.target)
+
+        # Warm pods receive the code alone
+        if pool is not None and not modules and len(code.encode()) <= MAX_CODE_SIZE:
+            with self.timings.span("pool_acquire"):
+                pod = pool.acquire()
+
+            if pod is not None:
+                return self.__execute_in_pool(pool, pod, code, on_output)
+
+        self.__deadline = None if self.timeout is None else monotonic() + self.timeout
+        self.__pod = None
+        self.__job = None
 
         try:
-            self.__create_job_object(code=code)
+            self.__create_job_object(code=code, modules=modules)
 
             if self.jupyter_logger is not None:
                 self.jupyter_logger(f"Job {self.name} created")
 
+            if follow:
+                with self.timings.span("wait_for_pod"):
+                    pod = self.__wait_for_pod_start()
+                with self.timings.span("logs"):
+                    self.__follow_job_logs(pod, on_output)
+
+                self.__collect_artifacts()
+                stream = self.__complete_and_get_job_status()
+
+                return "", stream
+
+            self.__collect_artifacts()
             stream = self.__complete_and_get_job_status()
 
             job = self.__get_pods_in_job()
-            logs = self.__get_job_logs(job)
+            with self.timings.span("logs"):
+                self.__get_job_logs(job, on_output)
             self.__progress.console.print("Fetched job logs")
 
-            return logs, stream
+            return "", stream
+        except KeyboardInterrupt:
+            return "Task interrupted by user", "stderr"
+        except WatchTimeoutException:
+            return f"Execution did not finish within {self.timeout} seconds", "stderr"
+        except:
+            return "An error occurred.", "stderr"
+        finally:
+            with self.timings.span("cleanup"):
+                self.__delete_job()
+            self.__record_pod_timings()
+
+    def __wait_for_program_end(self) -> str | None:
+        """
+        Wait until the program of the job ended and get the name of its pod,
+        or None when the pod already completed.
+        """
+        for event in resumable_watch(
+            self.core_api_instance.list_namespaced_pod,
+            deadline=self.__deadline,
+            namespace=self.namespace,
+            label_selector=f"app={self.name}",
+        ):
+            pod = event["object"]
+            self.__pod = pod
+
+            if pod.status.phase in ("Succeeded", "Failed"):
+                return None
+
+            for status in pod.status.container_statuses or []:
+                if (
+                    status.name == self.__log_container
+                    and status.state is not None
+                    and status.state.terminated is not None
+                ):
+                    return pod.metadata.name
+
+    def __collect_artifacts(self):
+        """
+        Get the artifacts of the program once it ended, if collected.
+        """
+        if self.__log_container is None:
+            return
+
+        with self.timings.span("artifacts"):
+            pod = self.__wait_for_program_end()
+
+            if pod is None:
+                self.__progress.console.print("Artifacts no longer available")
+                return
+
+            try:
+                self.artifacts = collect_artifacts(
+                    self.exec_api_instance, pod, self.namespace
+                )
+            except Exception as e:
+                logging.warning(f"Failed to collect artifacts: {e}")
+                return
+
+        self.__progress.console.print(f"Collected {len(self.artifacts)} artifact(s)")
+
+    def __record_pod_timings(self):
+        """
+        Add the phases of the pod, as reported by the cluster, to the timings.
+        """
+        if self.__pod is None:
+            return
+
+        finished = None
+
+        if self.__job is not None:
+            status = self.__job.status
+            finished = status.completion_time or (
+                status.conditions[-1].last_transition_time
+                if status.conditions
+                else None
+            )
+
+        self.timings.extend(pod_spans(self.__pod, finished))
+
+    def __execute_locally(
+        self,
+        code: str,
+        on_output: OutputCallback | None = None,
+        modules: dict[str, str] | None = None,
+    ) -> tuple[str, str]:
+        """
+        Execute the given code in a subprocess on this machine.
+        """
+        execute_task = self.__progress.add_task("[cyan]Executing locally...", total=1)
+
+        try:
+            with self.timings.span("local_run"):
+                return extract_non_none_value(
+                    self.jm.hook.run(
+                        code=code,
+                        env=self.__env,
+                        target=self.target,
+                        timeout=self.timeout,
+                        on_output=on_output,
+                        files=modules or {},
+                    )
+                )
+        except KeyboardInterrupt:
+            return "Task interrupted by user", "stderr"
+        except:
+            return "An error occurred.", "stderr"
+        finally:
+            self.__progress.advance(execute_task, 1)
+
+    def __execute_in_pool(
+        self,
+        pool: WarmPool,
+        pod: str,
+        code: str,
+        on_output: OutputCallback | None = None,
+    ):
+        """
+        Execute the given code in a warm pod of the pool.
+        """
+        execute_task = self.__progress.add_task(
+            f"[cyan]Executing in warm pod {pod}...", total=1
+        )
+
+        if self.jupyter_logger is not None:
+            self.jupyter_logger(f"Warm pod {pod} claimed")
+
+        try:
+            with self.timings.span("pool_run"):
+                return pool.run(pod, code, on_output)
+        except KeyboardInterrupt:
+            return "Task interrupted by user", "stderr"
+        except:
+            return "An error occurred.", "stderr"
+        finally:
+            pool.release(pod)
+            self.__progress.advance(execute_task, 1)
+
+    def __execute_in_session(
+        self, code: str, on_output: OutputCallback | None = None
+    ) -> tuple[str, str]:
+        """
+        Execute the given code in the interpreter of the session.
+        """
+        execute_task = self.__progress.add_task(
+            "[cyan]Executing in session...", total=1
+        )
+
+        try:
+            with self.timings.span("session_start"):
+                notice = self.__session.ensure()
+
+            if notice is not None:
+                self.__progress.console.print(notice)
+                if self.jupyter_logger is not None:
+                    self.jupyter_logger(notice)
+
+            with self.timings.span("session_run"):
+                return self.__session.run(code, on_output)
         except KeyboardInterrupt:
             return "Task interrupted by user", "stderr"
+        except WatchTimeoutException:
+            return "Session did not start in time", "stderr"
         except:
             return "An error occurred.", "stderr"
+        finally:
+            self.__progress.advance(execute_task, 1)
+
+    def sweep(
+        self,
+        code: str,
+        parameters: list[dict],
+        parallelism: int = DEFAULT_PARALLELISM,
+    ) -> list[SweepResult]:
+        """
+        Execute the given code once per set of parameters in a single Indexed
+        Job and collect the status and output of every index.
+        """
+        if self.target == Target.local:
+            raise ValueError("Sweeps run in the cluster, choose another target")
+
+        self.timings = Timings()
+
+        with self.__routed(code):
+            return self.__sweep(code, parameters, parallelism)
+
+    def __sweep(
+        self, code: str, parameters: list[dict], parallelism: int
+    ) -> list[SweepResult]:
+        self.__deadline = None if self.timeout is None else monotonic() + self.timeout
+
+        try:
+            self.__create_job_object(code, parameters, parallelism)
+
+            self.__complete_and_get_job_status()
+
+            return self.__collect_sweep_results(parameters)
+        except KeyboardInterrupt:
+            return []
+        except WatchTimeoutException:
+            results = self.__collect_sweep_results(parameters)
+            completed = [
+                str(result.index) for result in results if result.status == "Succeeded"
+            ]
+            self.__progress.console.print(
+                f"[red]Sweep did not finish within {self.timeout} seconds, "
+                f"completed indexes: {', '.join(completed) or 'none'}"
+            )
+            return results
         finally:
             self.__delete_job()
-            pass
+
+    def __collect_sweep_results(self, parameters: list[dict]) -> list[SweepResult]:
+        """
+        Get the status and logs of the last pod of every index.
+        """
+        collect_task = self.__progress.add_task(
+            "[cyan]Collecting results...", total=len(parameters)
+        )
+
+        pods = latest_pods(
+            self.core_api_instance.list_namespaced_pod(
+                self.namespace, label_selector=f"app={self.name}"
+            ).items
+        )
+
+        def collect(index: int) -> SweepResult:
+            pod = pods.get(index)
+
+            if pod is None:
+                status, output = "Missing", ""
+            else:
+                status = pod.status.phase
+                try:
+                    output = self.__get_job_logs(pod.metadata.name)
+                except ApiException as e:
+                    output = f"Logs unavailable: {e.reason}"
+
+            self.__progress.advance(collect_task, 1)
+
+            return SweepResult(index, parameters[index], status, output)
+
+        with ThreadPoolExecutor(max_workers=LOG_WORKERS) as executor:
+            return list(executor.map(collect, range(len(parameters))))
 
     def abort(self):
         """
@@ -1,12 +1,17 @@
+import json
 import os
 from ipykernel.kernelbase import Kernel
 from ipykernel.comm import CommManager
 from rich.progress import Progress, SpinnerColumn, TextColumn
 import logging
 
-from q8s.enums import Target
+from q8s.cache import ResultCache
+from q8s.enums import Cleanup, Target
 from q8s.execution import K8sContext
+from q8s.logs import StreamBatcher
+from q8s.protocol import Frame, FrameParser
 from q8s.project import CacheNotBuiltException, Project, ProjectNotFoundException
+from q8s.routing import Router, RunHistory
 
 FORMAT = "[%(levelname)s %(asctime)-15s q8s_kernel] %(message)s"
 logging.basicConfig(level=logging.INFO, format=FORMAT)
@@ -15,6 +20,9 @@ CODE = ["test_function", "import json; json.dumps(test_function)"]
 
 kernel_comm_identifier = "dev.qubernetes.kernel"
 
+# Comment making a cell run even when the result cache holds its result
+NO_CACHE_COMMENT = "# q8s: no-cache"
+
 
 class Q8sKernel(Kernel):
     implementation = "q8s-kernel"
@@ -30,6 +38,9 @@ class Q8sKernel(Kernel):
     }
     banner = "q8s"
     comm_manager: CommManager = None
+    __streaming: bool = False
+    __session: bool = False
+    __timings: bool = False
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -57,11 +68,53 @@ class Q8sKernel(Kernel):
             ),
         )
         self.k8s_context.set_container_image(self.docker_image)
+        self.k8s_context.set_target(Target(os.environ.get("Q8S_TARGET", "gpu")))
+        if self.k8s_context.target == Target.auto:
+            self.__route_targets()
         self.k8s_context.set_registry_pat(os.environ.get("REGISTRY_PAT", None))
+        self.k8s_context.set_suspended_start(
+            os.environ.get("Q8S_SUSPENDED_START", "0") == "1"
+        )
+        self.k8s_context.set_cleanup(Cleanup(os.environ.get("Q8S_CLEANUP", "server")))
+        if os.environ.get("Q8S_RESULT_CACHE", "0") == "1":
+            self.k8s_context.set_result_cache(ResultCache())
+        self.k8s_context.set_router(Router(RunHistory()))
+        self.k8s_context.set_output_limit(spill=os.environ.get("Q8S_OUTPUT_SPILL"))
+        self.__session = os.environ.get("Q8S_SESSION", "0") == "1"
+        self.__timings = os.environ.get("Q8S_TIMINGS", "0") == "1"
+        self.k8s_context.set_artifacts(os.environ.get("Q8S_ARTIFACTS", "0") == "1")
+        self.k8s_context.set_session(self.__session)
+        self.__start_pool()
 
         logging.info("q8s kernel started")
         logging.info(f"docker image: {self.docker_image}")
 
+    def __route_targets(self):
+        """
+        Give the auto target the built images of the targets it routes to.
+        """
+        try:
+            self.k8s_context.set_target_images(Project().routed_images())
+        except ProjectNotFoundException as e:
+            logging.warning(f"No images to route to: {e}")
+
+    def __start_pool(self):
+        """
+        Start the warm pool of the current target when the project defines one.
+        """
+        if self.k8s_context.target in (Target.local, Target.auto):
+            return
+
+        try:
+            policy = Project().pool_policy(self.k8s_context.target.value)
+        except ProjectNotFoundException:
+            return
+        except Exception as e:
+            logging.warning(f"Warm pool not started: {e}")
+            return
+
+        self.k8s_context.set_pool_policy(policy)
+
     def __initialize_comm_manager(self):
         self.comm_manager = CommManager(
             kernel=self,
@@ -85,50 +138,71 @@ class Q8sKernel(Kernel):
     ):
         logging.debug(f"Executing code:\n{code}")
 
-        output, stream_name = self.k8s_context.execute(code)
+        self.__streaming = False
+        frames, batches = self.__output("stdout")
+
+        def on_output(text):
+            if not self.__streaming:
+                # Replace the progress messages with the output
+                self.send_response(self.iopub_socket, "clear_output", {"wait": True})
+                self.__streaming = True
+
+            frames.write(text)
+
+        output, stream_name = self.k8s_context.execute(
+            code, on_output=on_output, cache=NO_CACHE_COMMENT not in code
+        )
 
-        self.send_response(self.iopub_socket, "clear_output", {"wait": True})
+        if not self.__streaming:
+            self.send_response(self.iopub_socket, "clear_output", {"wait": True})
 
         logging.debug(output)
         logging.debug(stream_name)
 
-        for line in output.split("\n"):
-            if line.startswith("data:image/png;base64,"):
-                self.send_response(
-                    self.iopub_socket,
-                    "display_data",
-                    {
-                        "data": {"image/png": line[22:]},
-                        "metadata": {},
-                    },
-                )
-            elif line.startswith("data:image/jpeg;base64,"):
-                self.send_response(
-                    self.iopub_socket,
-                    "display_data",
-                    {
-                        "data": {"image/jpeg": line[23:]},
-                        "metadata": {},
-                    },
-                )
-            elif line.startswith("data:image/svg+xml;base64,"):
-                self.send_response(
-                    self.iopub_socket,
-                    "display_data",
-                    {
-                        "data": {"image/svg+xml": line[25:]},
-                        "metadata": {},
+        frames.close()
+        batches.flush()
+
+        if output:
+            frames, batches = self.__output(stream_name)
+            frames.write(output)
+            frames.close()
+            batches.flush()
+
+        if self.k8s_context.cached:
+            self.send_response(
+                self.iopub_socket,
+                "display_data",
+                {
+                    "data": {
+                        "text/plain": "Cached result, add the comment "
+                        f"{NO_CACHE_COMMENT} to the cell to run it again"
                     },
-                )
-            else:
-                self.send_response(
-                    self.iopub_socket,
-                    "display_data",
-                    {
-                        "data": {"text/plain": line},
-                        "metadata": {},
+                    "metadata": {},
+                },
+            )
+
+        for artifact in self.k8s_context.artifacts:
+            self.send_response(
+                self.iopub_socket,
+                "display_data",
+                {"data": artifact.mimebundle(), "metadata": {}},
+            )
+
+        timings = self.k8s_context.timings
+        logging.info(f"Execution timings: {json.dumps(timings.to_dict()['spans'])}")
+
+        if self.__timings:
+            self.send_response(
+                self.iopub_socket,
+                "display_data",
+                {
+                    "data": {
+                        "text/plain": timings.summary(),
+                        "application/json": timings.to_dict()["spans"],
                     },
-                )
+                    "metadata": {},
+                },
+            )
 
         return {
             "status": "ok",
@@ -138,7 +212,47 @@ class Q8sKernel(Kernel):
             "user_expressions": {},
         }
 
+    def __output(self, stream_name: str) -> tuple[FrameParser, StreamBatcher]:
+        """
+        Send the output as batched stream messages, and its rich output frames
+        as separate messages.
+        """
+        batches = StreamBatcher(lambda text: self.__send_stream(stream_name, text))
+
+        def on_frame(frame: Frame):
+            # Keep the output preceding the frame before it
+            batches.flush()
+            self.__send_frame(frame)
+
+        return FrameParser(batches.write, on_frame), batches
+
+    def __send_stream(self, stream_name: str, text: str):
+        self.send_response(
+            self.iopub_socket,
+            "stream",
+            {"name": stream_name, "text": text},
+        )
+
+    def __send_frame(self, frame: Frame):
+        try:
+            content = frame.display_data()
+        except ValueError:
+            self.__send_stream("stderr", f"[invalid {frame.mimetype} output]\n")
+            return
+
+        self.send_response(self.iopub_socket, "display_data", content)
+
+    def do_shutdown(self, restart):
+        self.k8s_context.shutdown()
+
+        return super().do_shutdown(restart)
+
     def progress(self, msg):
+        if self.__streaming:
+            # Status updates would interleave with the streamed output
+            logging.info(msg)
+            return
+
         self.send_response(
             self.iopub_socket,
             "display_data",
@@ -157,7 +271,8 @@ class Q8sKernel(Kernel):
         comm.send(
             {
                 "command": "init",
-                "targets": Project().configuration.targets.keys(),
+                "targets": Project().configuration.targets.keys()
+                + [Target.auto.value, Target.local.value],
                 "selected_target": self.k8s_context.target.name,
             }
         )
@@ -171,8 +286,18 @@ class Q8sKernel(Kernel):
             if data["command"] == "set_target":
                 self.k8s_context.set_target(Target(data["payload"]["target"]))
                 project = Project()
-                image = project.cached_images(data["payload"]["target"])
-                self.k8s_context.set_container_image(image)
+                if self.k8s_context.target == Target.auto:
+                    self.k8s_context.set_target_images(project.routed_images())
+                elif self.k8s_context.target != Target.local:
+                    image = project.cached_images(data["payload"]["target"])
+                    self.k8s_context.set_container_image(image)
+                # Local and routed executions run without warm pods
+                self.k8s_context.set_pool_policy(
+                    None
+                    if self.k8s_context.target in (Target.local, Target.auto)
+                    else project.pool_policy(data["payload"]["target"])
+                )
+                self.k8s_context.set_session(self.__session)
                 logging.info(f"Updated execution target to {data['payload']['target']}")
             else:
                 logging.warning(f"Unknown command: {data['command']}")
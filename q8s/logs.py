@@ -0,0 +1,191 @@
+import codecs
+from collections import deque
+import os
+import threading
+from typing import Callable, Iterator, TextIO
+
+from urllib3 import HTTPResponse
+
+# Largest chunk forwarded at once while following a log
+LOG_CHUNK_SIZE = 64 * 1024
+
+# Characters of the output kept from its start and its end, the rest is
+# omitted. A negative head keeps the whole output.
+OUTPUT_HEAD = int(os.environ.get("Q8S_OUTPUT_HEAD", 1024 * 1024))
+OUTPUT_TAIL = int(os.environ.get("Q8S_OUTPUT_TAIL", 1024 * 1024))
+
+# Characters of streamed output gathered into one message, and the longest
+# time, in seconds, output waits to be passed on
+STREAM_BATCH_SIZE = 64 * 1024
+STREAM_BATCH_INTERVAL = 0.1
+
+OutputCallback = Callable[[str], None]
+
+
+def iter_text(
+    response: HTTPResponse, chunk_size: int = LOG_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Decode a raw log response incrementally, chunk by chunk as it arrives.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    try:
+        for chunk in response.stream(chunk_size, decode_content=True):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+    finally:
+        response.release_conn()
+
+
+class BoundedOutput:
+    """
+    Keep the head and tail of streamed output, omitting what lies between, so
+    that the memory it takes does not depend on how much is written.
+
+    The head is passed on as it arrives when following, otherwise it is held
+    along with the tail until the output is closed. The whole output can be
+    copied to a file as well.
+    """
+
+    def __init__(
+        self,
+        head: int = OUTPUT_HEAD,
+        tail: int = OUTPUT_TAIL,
+        on_output: OutputCallback | None = None,
+        spill: str | os.PathLike | None = None,
+    ):
+        self.__head = head
+        self.__tail = tail
+        self.__on_output = on_output
+        self.__spill = spill
+        self.__file: TextIO | None = (
+            None if spill is None else open(spill, "w", encoding="utf-8")
+        )
+        self.__kept: list[str] = []
+        self.__ending: deque[str] = deque()
+        self.__ending_size = 0
+        self.__omitted = 0
+
+    def __emit(self, text: str):
+        if not text:
+            return
+
+        if self.__on_output is not None:
+            self.__on_output(text)
+        else:
+            self.__kept.append(text)
+
+    def write(self, text: str):
+        if self.__file is not None:
+            self.__file.write(text)
+
+        if self.__head < 0:
+            self.__emit(text)
+            return
+
+        if self.__head > 0:
+            kept = text[: self.__head]
+            self.__emit(kept)
+            self.__head -= len(kept)
+            text = text[len(kept) :]
+
+        if not text:
+            return
+
+        self.__ending.append(text)
+        self.__ending_size += len(text)
+
+        # Drop the chunks no longer needed to fill the tail
+        while (
+            self.__ending and self.__ending_size - len(self.__ending[0]) >= self.__tail
+        ):
+            dropped = self.__ending.popleft()
+            self.__ending_size -= len(dropped)
+            self.__omitted += len(dropped)
+
+    @property
+    def omitted(self) -> int:
+        return self.__omitted + max(0, self.__ending_size - self.__tail)
+
+    def close(self) -> str:
+        """
+        Pass on the rest of the output, and get what was not passed on.
+        """
+        ending = "".join(self.__ending)
+        omitted = self.omitted
+        ending = ending[len(ending) - min(len(ending), self.__tail) :]
+
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+        if omitted:
+            where = "" if self.__spill is None else f", see {self.__spill}"
+            self.__emit(f"\n[... {omitted} characters omitted{where} ...]\n")
+
+        self.__emit(ending)
+        self.__ending = deque()
+        self.__ending_size = 0
+
+        kept, self.__kept = "".join(self.__kept), []
+
+        return kept
+
+
+class StreamBatcher:
+    """
+    Gather streamed text into batches, passed on once they reach a size or once
+    their first text waited for an interval, so that a long output takes few
+    messages.
+    """
+
+    def __init__(
+        self,
+        on_batch: Callable[[str], None],
+        size: int = STREAM_BATCH_SIZE,
+        interval: float = STREAM_BATCH_INTERVAL,
+    ):
+        self.__on_batch = on_batch
+        self.__size = size
+        self.__interval = interval
+        # Batches are passed on from the timer thread as well
+        self.__lock = threading.Lock()
+        self.__pending: list[str] = []
+        self.__pending_size = 0
+        self.__timer: threading.Timer | None = None
+
+    def write(self, text: str):
+        if not text:
+            return
+
+        with self.__lock:
+            self.__pending.append(text)
+            self.__pending_size += len(text)
+
+            if self.__pending_size >= self.__size:
+                self.__flush()
+            elif self.__timer is None:
+                self.__timer = threading.Timer(self.__interval, self.flush)
+                self.__timer.daemon = True
+                self.__timer.start()
+
+    def flush(self):
+        with self.__lock:
+            self.__flush()
+
+    def __flush(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+        if self.__pending:
+            batch = "".join(self.__pending)
+            self.__pending = []
+            self.__pending_size = 0
+            self.__on_batch(batch)
@@ -1,23 +1,20 @@
-import base64
 import io
 import matplotlib.backend_bases
 from matplotlib.backends.backend_agg import FigureCanvasAgg
 
+from q8s.protocol import display
+
 
 class Q8SLoggerBackend(FigureCanvasAgg):
-    """Custom Matplotlib backend that logs images as base64-encoded strings."""
+    """Custom Matplotlib backend that logs images as rich output frames."""
 
     def print_png(self, filename_or_obj, *args, **kwargs):
-        """Override the PNG printing to log Base64 instead of saving to a file."""
+        """Override the PNG printing to log a frame instead of saving to a file."""
         buf = io.BytesIO()
         super().print_png(buf, *args, **kwargs)
 
-        # Convert to base64
-        buf.seek(0)
-        encoded_image = base64.b64encode(buf.getvalue()).decode("utf-8")
-
-        # Log to console
-        print(f"data:image/png;base64,{encoded_image}\n")
+        # Log to console, the kernel displays it
+        display("image/png", buf.getvalue())
 
 
 FigureCanvas = Q8SLoggerBackend
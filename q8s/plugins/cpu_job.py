@@ -1,7 +1,8 @@
-from q8s.plugins.job_template_spec import hookimpl
+from q8s.plugins.job_template_spec import hookimpl, image_pull_policy
 from q8s.enums import Target
 from kubernetes import client
 from q8s.constants import WORKSPACE
+from q8s.prepull import puller_template
 from typing import Dict
 
 
@@ -30,7 +31,7 @@ class CPUJobTemplatePlugin:
             env=env,
             command=["python"],
             args=[f"{WORKSPACE}/main.py"],
-            image_pull_policy="Always",
+            image_pull_policy=image_pull_policy(container_image),
             volume_mounts=[
                 client.V1VolumeMount(
                     name="app-volume", mount_path=WORKSPACE, read_only=True
@@ -62,3 +63,17 @@ class CPUJobTemplatePlugin:
         )
 
         return template
+
+    @hookimpl
+    def prepull(
+        self,
+        name: str,
+        registry_credentials_secret_name: str | None,
+        container_image: str,
+        target: Target,
+    ) -> client.V1PodTemplateSpec | None:
+
+        if target != Target.cpu:
+            return None
+
+        return puller_template(name, container_image, registry_credentials_secret_name)
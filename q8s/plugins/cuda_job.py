@@ -3,10 +3,14 @@ from typing import Dict
 from kubernetes import client
 from q8s.constants import WORKSPACE
 from q8s.enums import Target
-from q8s.plugins.job_template_spec import hookimpl
+from q8s.plugins.job_template_spec import hookimpl, image_pull_policy
+from q8s.prepull import puller_template
 
 MEMORY = os.environ.get("MEMORY", "32Gi")
 
+# Label of the nodes with a GPU, as set by the NVIDIA GPU feature discovery
+GPU_NODE_LABEL = os.environ.get("Q8S_GPU_NODE_LABEL", "nvidia.com/gpu.present=true")
+
 
 class CUDAJobTemplatePlugin:
     """
@@ -36,7 +40,7 @@ class CUDAJobTemplatePlugin:
             env=env,
             command=["python"],
             args=[f"{WORKSPACE}/main.py"],
-            image_pull_policy="Always",
+            image_pull_policy=image_pull_policy(container_image),
             resources=(
                 client.V1ResourceRequirements(
                     limits=(
@@ -91,3 +95,31 @@ class CUDAJobTemplatePlugin:
         )
 
         return template
+
+    @hookimpl
+    def prepull(
+        self,
+        name: str,
+        registry_credentials_secret_name: str | None,
+        container_image: str,
+        target: Target,
+    ) -> client.V1PodTemplateSpec | None:
+
+        if target != Target.gpu:
+            return None
+
+        template = puller_template(
+            name, container_image, registry_credentials_secret_name
+        )
+        key, _, value = GPU_NODE_LABEL.partition("=")
+
+        # The nodes the jobs get their GPU on, without taking one
+        template.spec.runtime_class_name = "nvidia"
+        template.spec.node_selector = {key: value}
+        template.spec.tolerations = [
+            client.V1Toleration(
+                key="nvidia.com/gpu", operator="Exists", effect="NoSchedule"
+            )
+        ]
+
+        return template
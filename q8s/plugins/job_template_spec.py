@@ -1,5 +1,5 @@
 import os
-from typing import Dict
+from typing import Callable, Dict
 import pluggy
 from kubernetes import client
 
@@ -10,6 +10,14 @@ hookspec = pluggy.HookspecMarker("q8s")
 hookimpl = pluggy.HookimplMarker("q8s")
 
 
+def image_pull_policy(image: str) -> str:
+    """
+    Pull images pinned by digest only when missing from the node, the content
+    behind a tag may change.
+    """
+    return "IfNotPresent" if "@sha256:" in image else "Always"
+
+
 class JobTemplatePluginSpec:
 
     @hookspec
@@ -40,6 +48,39 @@ class JobTemplatePluginSpec:
     ) -> client.V1PodTemplateSpec:
         return None
 
+    @hookspec
+    def prepull(
+        self,
+        name: str,
+        registry_credentials_secret_name: str | None,
+        container_image: str,
+        target: Target,
+    ) -> client.V1PodTemplateSpec | None:
+        """
+        Pod template of a DaemonSet pulling the image onto the nodes the jobs
+        of the target run on, or None for other targets.
+        """
+        return None
+
+    @hookspec
+    def run(
+        self,
+        code: str,
+        env: Dict[
+            str,
+            str | None,
+        ],
+        target: Target,
+        timeout: int | None,
+        on_output: Callable[[str], None] | None,
+        files: Dict[str, str],
+    ) -> tuple[str, str] | None:
+        """
+        Run the code, next to the given files, without a job, returning its
+        output and stream, or None when the target runs in the cluster.
+        """
+        return None
+
     @hookspec
     def cleanup(self, name: str, namespace: str) -> None:
         pass
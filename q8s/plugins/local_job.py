@@ -0,0 +1,121 @@
+import codecs
+import os
+from os.path import join
+from subprocess import Popen, PIPE, STDOUT
+import sys
+from tempfile import TemporaryDirectory
+import threading
+from typing import Callable, Dict
+
+from q8s.enums import Target
+from q8s.logs import LOG_CHUNK_SIZE
+from q8s.plugins.job_template_spec import hookimpl
+
+# Figures are written as rich output frames, as in the container images
+MATPLOTLIB_BACKEND = "module://q8s.matplotlib.backend"
+
+
+class LocalJobTemplatePlugin:
+    """
+    This plugin runs the code in a subprocess of the Python environment of the
+    project, in a working directory holding only the code and its modules,
+    instead of a job.
+    """
+
+    @hookimpl
+    def run(
+        self,
+        code: str,
+        env: Dict[
+            str,
+            str | None,
+        ],
+        target: Target,
+        timeout: int | None,
+        on_output: Callable[[str], None] | None,
+        files: Dict[str, str],
+    ) -> tuple[str, str] | None:
+
+        if target != Target.local:
+            return None
+
+        environment = {
+            **os.environ,
+            "MPLBACKEND": MATPLOTLIB_BACKEND,
+            **{key: value for key, value in env.items() if value is not None},
+            "PYTHONUNBUFFERED": "1",
+        }
+
+        with TemporaryDirectory(prefix="q8s-") as workspace:
+            for name, content in {**files, "main.py": code}.items():
+                path = join(workspace, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    f.write(content)
+
+            # Standard error is interleaved with the output, like container logs
+            process = Popen(
+                [sys.executable, "main.py"],
+                cwd=workspace,
+                env=environment,
+                stdin=PIPE,
+                stdout=PIPE,
+                stderr=STDOUT,
+            )
+            process.stdin.close()
+
+            expired = threading.Event()
+
+            def expire():
+                expired.set()
+                process.kill()
+
+            timer = None
+            if timeout is not None:
+                timer = threading.Timer(timeout, expire)
+                timer.daemon = True
+                timer.start()
+
+            try:
+                output = self.__read_output(process, on_output)
+                returncode = process.wait()
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                process.stdout.close()
+
+        if expired.is_set():
+            return f"Execution did not finish within {timeout} seconds", "stderr"
+
+        return output, "stdout" if returncode == 0 else "stderr"
+
+    def __read_output(
+        self, process: Popen, on_output: Callable[[str], None] | None
+    ) -> str:
+        """
+        Decode the output as it arrives, forwarding it when following.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        chunks = []
+
+        def write(text: str):
+            if not text:
+                return
+            if on_output is not None:
+                on_output(text)
+            else:
+                chunks.append(text)
+
+        while True:
+            data = process.stdout.read1(LOG_CHUNK_SIZE)
+            if not data:
+                break
+            write(decoder.decode(data))
+
+        write(decoder.decode(b"", final=True))
+
+        return "".join(chunks)
@@ -0,0 +1,290 @@
+import logging
+import random
+import string
+import threading
+from time import monotonic
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from kubernetes.stream import stream
+from kubernetes.stream.ws_client import ERROR_CHANNEL
+
+from q8s.logs import OutputCallback
+from q8s.project import Q8SPoolPolicy
+
+POOL_LABEL = "qubernetes.dev/pool"
+
+BUSY_MARKER = "/tmp/q8s.busy"
+
+# Extra lifetime of an idle pod, so a pod claimed just before its TTL runs out
+# is still alive when the code arrives
+IDLE_GRACE = 60
+
+# Largest cell handed to a warm pod, the code travels as an exec argument
+MAX_CODE_SIZE = 100_000
+
+# Keep the pod alive for the idle TTL, and afterwards for as long as a cell runs
+IDLE_COMMAND = f"""
+import os, sys, time
+time.sleep(int(sys.argv[1]))
+while os.path.exists("{BUSY_MARKER}"):
+    time.sleep(1)
+"""
+
+RUN_COMMAND = f"""
+import os, sys
+code = sys.argv[1]
+sys.argv = ["main.py"]
+open("{BUSY_MARKER}", "w").close()
+try:
+    exec(compile(code, "main.py", "exec"), {{"__name__": "__main__"}})
+finally:
+    os.remove("{BUSY_MARKER}")
+"""
+
+
+def exec_in_pod(
+    api: client.CoreV1Api,
+    name: str,
+    namespace: str,
+    command: list[str],
+    on_output: OutputCallback | None = None,
+    container: str | None = None,
+) -> tuple[str, int]:
+    """
+    Run the command in the pod, or the given container of it, and get its
+    output and return code, forwarding the output as it arrives when a
+    callback is given.
+    """
+    response = stream(
+        api.connect_get_namespaced_pod_exec,
+        name,
+        namespace,
+        command=command,
+        container=container,
+        stderr=True,
+        stdin=False,
+        stdout=True,
+        tty=False,
+        _preload_content=False,
+    )
+
+    if on_output is None:
+        response.run_forever()
+        # Read first, read_all drops the channel holding the status
+        returncode = response.returncode
+        output = response.read_all()
+    else:
+        while response.is_open():
+            response.update(timeout=1)
+            if response.peek_channel(ERROR_CHANNEL):
+                # The command ended, keep its status for the return code
+                if response.peek_stdout():
+                    on_output(response.read_stdout())
+                if response.peek_stderr():
+                    on_output(response.read_stderr())
+            else:
+                # Reading the output also drops the copy the client keeps of
+                # it, so that following a long output stays bounded
+                output = response.read_all()
+                if output:
+                    on_output(output)
+        returncode = response.returncode
+        output = ""
+
+    response.close()
+
+    return output, returncode
+
+
+class WarmPool:
+    """
+    Idle, already running pods of a target waiting for code.
+
+    Every pod runs a single cell and is replaced in the background afterwards.
+    """
+
+    name: str
+    namespace: str
+    policy: Q8SPoolPolicy
+
+    def __init__(
+        self,
+        name: str,
+        namespace: str,
+        template: client.V1PodTemplateSpec,
+        policy: Q8SPoolPolicy,
+    ):
+        self.name = name
+        self.namespace = namespace
+        self.policy = policy
+
+        self.core_api_instance = client.CoreV1Api()
+        # stream() swaps the request method of its api client, keep it separate
+        # from the client used by the background refill
+        self.exec_api_instance = client.CoreV1Api(client.ApiClient())
+
+        self.__template = self.__idle_template(template)
+        self.__idle: dict[str, float] = {}
+        self.__busy: set[str] = set()
+        self.__lock = threading.Lock()
+        self.__closed = False
+
+    def __idle_template(self, template: client.V1PodTemplateSpec):
+        """
+        Turn the job template into the template of an idle pod.
+        """
+        spec = template.spec
+        container = spec.containers[0]
+
+        container.command = ["python", "-c", IDLE_COMMAND]
+        container.args = [str(self.policy.idle_ttl + IDLE_GRACE)]
+        container.volume_mounts = None
+        spec.volumes = None
+
+        template.metadata = client.V1ObjectMeta(labels={POOL_LABEL: self.name})
+
+        return template
+
+    def __create_pod(self):
+        name = f"{self.name}-" + "".join(
+            random.choices(string.ascii_lowercase + string.digits, k=6)
+        )
+
+        pod = client.V1Pod(
+            api_version="v1",
+            kind="Pod",
+            metadata=client.V1ObjectMeta(
+                name=name,
+                namespace=self.namespace,
+                labels=self.__template.metadata.labels,
+            ),
+            spec=self.__template.spec,
+        )
+
+        self.core_api_instance.create_namespaced_pod(namespace=self.namespace, body=pod)
+
+        return name
+
+    def __delete_pod(self, name: str):
+        try:
+            self.core_api_instance.delete_namespaced_pod(
+                name, self.namespace, grace_period_seconds=0
+            )
+        except ApiException as e:
+            if e.status != 404:
+                logging.warning(f"Failed to delete pool pod {name}: {e.reason}")
+
+    def __fill(self):
+        """
+        Create pods until the pool holds its size of idle pods.
+        """
+        while True:
+            with self.__lock:
+                if (
+                    self.__closed
+                    or len(self.__idle) >= self.policy.size
+                    or len(self.__idle) + len(self.__busy) >= self.policy.max_size
+                ):
+                    return
+                # Reserve the slot before the slow API call
+                placeholder = f"pending-{len(self.__idle)}-{monotonic()}"
+                self.__idle[placeholder] = monotonic()
+
+            try:
+                name = self.__create_pod()
+            except ApiException as e:
+                logging.warning(f"Failed to create pool pod: {e.reason}")
+                name = None
+            finally:
+                with self.__lock:
+                    created = self.__idle.pop(placeholder)
+                    if name is not None:
+                        self.__idle[name] = created
+
+            if name is None:
+                return
+
+    def __recycle(self, name: str):
+        self.__delete_pod(name)
+
+        with self.__lock:
+            self.__busy.discard(name)
+
+        self.__fill()
+
+    def refill(self):
+        """
+        Refill the pool in the background.
+        """
+        threading.Thread(target=self.__fill, daemon=True).start()
+
+    def acquire(self) -> str | None:
+        """
+        Claim a running idle pod, or None when no pod is ready yet.
+        """
+        running = self.core_api_instance.list_namespaced_pod(
+            self.namespace,
+            label_selector=f"{POOL_LABEL}={self.name}",
+            field_selector="status.phase=Running",
+        )
+        ready = {pod.metadata.name for pod in running.items}
+
+        chosen = None
+        expired = []
+
+        with self.__lock:
+            for name, created in list(self.__idle.items()):
+                if name in ready and chosen is None:
+                    del self.__idle[name]
+                    self.__busy.add(name)
+                    chosen = name
+                elif monotonic() - created > self.policy.idle_ttl:
+                    # The pod terminated itself after the idle TTL
+                    del self.__idle[name]
+                    expired.append(name)
+
+        for name in expired:
+            self.__delete_pod(name)
+
+        self.refill()
+
+        return chosen
+
+    def release(self, name: str):
+        """
+        Drop a used pod and replace it in the background.
+        """
+        threading.Thread(target=self.__recycle, args=(name,), daemon=True).start()
+
+    def run(
+        self, name: str, code: str, on_output: OutputCallback | None = None
+    ) -> tuple[str, str]:
+        """
+        Run the code in the given pod, forwarding the output as it arrives when
+        a callback is given.
+        """
+        output, returncode = exec_in_pod(
+            self.exec_api_instance,
+            name,
+            self.namespace,
+            ["python", "-c", RUN_COMMAND, code],
+            on_output,
+        )
+
+        return output, "stdout" if returncode == 0 else "stderr"
+
+    def shutdown(self):
+        """
+        Remove all the pods of the pool.
+        """
+        with self.__lock:
+            self.__closed = True
+            self.__idle.clear()
+            self.__busy.clear()
+
+        self.core_api_instance.delete_collection_namespaced_pod(
+            self.namespace,
+            label_selector=f"{POOL_LABEL}={self.name}",
+            grace_period_seconds=0,
+        )
@@ -0,0 +1,168 @@
+import os
+from time import monotonic, sleep
+from typing import Callable
+
+from kubernetes import client
+
+from q8s.plugins.job_template_spec import image_pull_policy
+from q8s.watcher import WatchTimeoutException, resumable_watch
+
+# Image keeping the pods of the DaemonSet running once the image was pulled
+PAUSE_IMAGE = os.environ.get("Q8S_PAUSE_IMAGE", "registry.k8s.io/pause:3.9")
+
+# Longest time, in seconds, the nodes may take to pull an image
+PREPULL_TIMEOUT = int(os.environ.get("Q8S_PREPULL_TIMEOUT", 30 * 60))
+
+PULL_CONTAINER = "q8s-pull"
+
+# Reasons a container waits for its image that the kubelet retries
+PULL_ERRORS = ("ErrImagePull", "ImagePullBackOff", "InvalidImageName")
+
+NodeCallback = Callable[[str, str], None]
+
+
+def puller_template(
+    name: str, image: str, registry_credentials_secret_name: str | None
+) -> client.V1PodTemplateSpec:
+    """
+    Pod pulling the image, with a container that only starts, then staying
+    around without using the node.
+    """
+    requests = client.V1ResourceRequirements(requests={"cpu": "1m", "memory": "16Mi"})
+
+    return client.V1PodTemplateSpec(
+        metadata=client.V1ObjectMeta(labels={"app": name}),
+        spec=client.V1PodSpec(
+            init_containers=[
+                client.V1Container(
+                    name=PULL_CONTAINER,
+                    image=image,
+                    image_pull_policy=image_pull_policy(image),
+                    command=["python", "-c", "pass"],
+                    resources=requests,
+                )
+            ],
+            containers=[
+                client.V1Container(name="pause", image=PAUSE_IMAGE, resources=requests)
+            ],
+            image_pull_secrets=(
+                [client.V1LocalObjectReference(name=registry_credentials_secret_name)]
+                if registry_credentials_secret_name
+                else []
+            ),
+            termination_grace_period_seconds=0,
+        ),
+    )
+
+
+def node_state(pod: client.V1Pod) -> str:
+    """
+    Where the node of the pod is with pulling the image.
+    """
+    for status in pod.status.init_container_statuses or []:
+        if status.name != PULL_CONTAINER:
+            continue
+
+        # The container started, so the image is on the node
+        if status.state.running is not None or status.state.terminated is not None:
+            return "pulled"
+
+        waiting = status.state.waiting
+        if waiting is not None and waiting.reason in PULL_ERRORS:
+            return f"failed ({waiting.reason}), retrying"
+
+    return "pulling" if pod.spec.node_name else "scheduling"
+
+
+def prepull(
+    apps_api: client.AppsV1Api,
+    core_api: client.CoreV1Api,
+    namespace: str,
+    name: str,
+    template: client.V1PodTemplateSpec,
+    on_node: NodeCallback | None = None,
+    timeout: int = PREPULL_TIMEOUT,
+) -> list[str]:
+    """
+    Pull the image of the pod template onto every node it may run on, with a
+    DaemonSet removed once all of them have it, and get their names. The state
+    of each node is passed on as it changes.
+    """
+    deadline = monotonic() + timeout
+
+    apps_api.create_namespaced_daemon_set(
+        namespace,
+        client.V1DaemonSet(
+            api_version="apps/v1",
+            kind="DaemonSet",
+            metadata=client.V1ObjectMeta(name=name, labels={"app": name}),
+            spec=client.V1DaemonSetSpec(
+                selector=client.V1LabelSelector(match_labels={"app": name}),
+                template=template,
+            ),
+        ),
+    )
+
+    try:
+        nodes = _desired_nodes(apps_api, namespace, name, deadline)
+
+        if nodes == 0:
+            return []
+
+        return _wait_for_nodes(core_api, namespace, name, nodes, on_node, deadline)
+    finally:
+        apps_api.delete_namespaced_daemon_set(
+            name, namespace, propagation_policy="Background"
+        )
+
+
+def _desired_nodes(
+    apps_api: client.AppsV1Api, namespace: str, name: str, deadline: float
+) -> int:
+    """
+    Number of nodes the DaemonSet runs on, once its controller counted them.
+    """
+    while monotonic() < deadline:
+        status = apps_api.read_namespaced_daemon_set_status(name, namespace).status
+
+        if status is not None and status.observed_generation:
+            return status.desired_number_scheduled
+
+        sleep(0.5)
+
+    raise WatchTimeoutException("Deadline reached while waiting for the DaemonSet")
+
+
+def _wait_for_nodes(
+    core_api: client.CoreV1Api,
+    namespace: str,
+    name: str,
+    nodes: int,
+    on_node: NodeCallback | None,
+    deadline: float,
+) -> list[str]:
+    states = {}
+
+    for event in resumable_watch(
+        core_api.list_namespaced_pod,
+        deadline=deadline,
+        namespace=namespace,
+        label_selector=f"app={name}",
+    ):
+        pod = event["object"]
+        node = pod.spec.node_name
+
+        if event["type"] == "DELETED" or node is None:
+            continue
+
+        state = node_state(pod)
+
+        if states.get(node) != state:
+            states[node] = state
+            if on_node is not None:
+                on_node(node, state)
+
+        pulled = sorted(node for node, state in states.items() if state == "pulled")
+
+        if len(pulled) >= nodes:
+            return pulled
@@ -1,9 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
+import hashlib
 from io import StringIO
+from json import loads
+import logging
+import os
 import selectors
+import subprocess
 from subprocess import Popen, PIPE, STDOUT
+import threading
 from os.path import join
 from typing import List, Optional
 from rich.progress import Progress
@@ -12,6 +19,15 @@ from dacite import from_dict
 
 from q8s.constants import BASE_IMAGES, WORKSPACE
 
+# Targets built and pushed at the same time
+BUILD_PARALLELISM = 3
+
+# Where pip keeps downloaded and built wheels between builds
+PIP_CACHE = "/root/.cache/pip"
+
+# Time, in seconds, a registry lookup may take
+INSPECT_TIMEOUT = 30
+
 
 def load(path: str):
     """
@@ -36,14 +52,137 @@ def rmdir(directory):
     directory.rmdir()
 
 
+def image_entry(value: str | dict) -> dict:
+    """
+    Entry of a target in the images cache, older caches holding only the name
+    of the image.
+    """
+    return {"image": value} if isinstance(value, str) else value
+
+
+def pinned_image(entry: dict) -> str:
+    """
+    Reference of the image of an images cache entry, by its digest once it was
+    pushed, so that nodes pull it only when it changes.
+    """
+    if "digest" in entry:
+        return f"{entry['image']}@{entry['digest']}"
+
+    return entry["image"]
+
+
+def image_exists(image: str, remote: bool) -> bool:
+    """
+    Whether the image is in its registry, or else in the local Docker daemon.
+    """
+    command = (
+        ["docker", "buildx", "imagetools", "inspect", image]
+        if remote
+        else ["docker", "image", "inspect", image]
+    )
+
+    try:
+        process = subprocess.run(command, capture_output=True, timeout=INSPECT_TIMEOUT)
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.debug(f"Image {image} not inspected: {e}")
+        return False
+
+    return process.returncode == 0
+
+
+def local_image_id(image: str) -> str | None:
+    """
+    ID of the image in the local Docker daemon, the digest of its
+    configuration.
+    """
+    try:
+        process = subprocess.run(
+            ["docker", "image", "inspect", "--format", "{{.Id}}", image],
+            capture_output=True,
+            text=True,
+            timeout=INSPECT_TIMEOUT,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.debug(f"Image {image} not inspected: {e}")
+        return None
+
+    return process.stdout.strip() if process.returncode == 0 else None
+
+
+def builder_driver(builder: str | None) -> str | None:
+    """
+    Driver of the buildx builder, the current one when no name is given, None
+    when buildx or the builder is missing.
+    """
+    command = ["docker", "buildx", "inspect"] + ([builder] if builder else [])
+
+    try:
+        process = subprocess.run(
+            command, capture_output=True, text=True, timeout=INSPECT_TIMEOUT
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.debug(f"Builder {builder} not inspected: {e}")
+        return None
+
+    if process.returncode != 0:
+        return None
+
+    for line in process.stdout.splitlines():
+        name, _, value = line.partition(":")
+        if name.strip() == "Driver":
+            return value.strip()
+
+    return None
+
+
+def remote_digest(image: str) -> str | None:
+    """
+    Digest of the image in its registry, None when it cannot be told.
+    """
+    try:
+        process = subprocess.run(
+            [
+                "docker",
+                "buildx",
+                "imagetools",
+                "inspect",
+                "--format",
+                "{{json .Manifest}}",
+                image,
+            ],
+            capture_output=True,
+            text=True,
+            timeout=INSPECT_TIMEOUT,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.debug(f"Digest of {image} not resolved: {e}")
+        return None
+
+    if process.returncode != 0:
+        return None
+
+    try:
+        return loads(process.stdout)["digest"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
 @dataclass
 class Q8SPythonEnv:
     dependencies: List[str]
 
 
+@dataclass
+class Q8SPoolPolicy:
+    size: int = 1
+    max_size: int = 2
+    idle_ttl: int = 600
+
+
 @dataclass
 class Q8STarget:
     python_env: Q8SPythonEnv
+    pool: Optional[Q8SPoolPolicy] = None
 
 
 @dataclass
@@ -60,9 +199,20 @@ class Q8STargets:
         ]
 
 
+@dataclass
+class Q8SBuildCache:
+    # Folder of a local layer cache, one subfolder per target
+    directory: Optional[str] = None
+    # Registry repository of the layer cache, one tag per target
+    registry: Optional[str] = None
+    # Buildx builder exporting the cache, the default docker driver cannot
+    builder: Optional[str] = None
+
+
 @dataclass
 class Q8SDocker:
     username: str
+    cache: Optional[Q8SBuildCache] = None
 
 
 @dataclass
@@ -99,6 +249,9 @@ class Project:
         self.configuration = configuration
         self.name = self.configuration.name
         self.__path = path
+        # Whether the builder exports caches and stamps layers, checked once
+        self.__builder_ready: bool | None = None
+        self.__builder_lock = threading.Lock()
 
         self.load_images_cache()
 
@@ -106,6 +259,12 @@ class Project:
     def kubeconfig(self):
         return Path(self.configuration.kubeconfig)
 
+    def pool_policy(self, target: str) -> Q8SPoolPolicy | None:
+        """
+        Get the warm pool policy of the target, if any
+        """
+        return self.__get_target(target=target).pool
+
     def init_cache(self):
         """
         Initialize the cache directory
@@ -137,7 +296,11 @@ class Project:
             self.__images = {}
         else:
             with open(cachepath, "r") as f:
-                self.__images = yaml.safe_load(f)
+                images = yaml.safe_load(f) or {}
+
+            self.__images = {
+                target: image_entry(value) for target, value in images.items()
+            }
 
     def cached_images(self, target: str) -> str:
         """
@@ -151,82 +314,368 @@ class Project:
             )
 
         with open(cachepath, "r") as f:
-            return yaml.safe_load(f)[target]
+            return pinned_image(image_entry(yaml.safe_load(f)[target]))
+
+    def routed_images(self) -> dict[str, str]:
+        """
+        Built images of the targets the auto target routes to
+        """
+        images = {}
+
+        for target in ("cpu", "gpu"):
+            if target not in self.configuration.targets.keys():
+                continue
+            try:
+                images[target] = self.cached_images(target)
+            except (CacheNotBuiltException, KeyError):
+                pass
+
+        return images
+
+    def fingerprint(self, target: str) -> str | None:
+        """
+        Hash of what the image of the target is built from: its requirements,
+        its Dockerfile and the digest of its base image. None when the base
+        image cannot be looked up.
+        """
+        base = remote_digest(BASE_IMAGES[target])
+
+        if base is None:
+            return None
+
+        digest = hashlib.sha256()
+
+        for file in ("requirements.txt", "Dockerfile"):
+            try:
+                with open(join(self.__path, ".q8s_cache", target, file), "rb") as f:
+                    content = f.read()
+            except OSError:
+                return None
+
+            digest.update(f"{file}\0{len(content)}\0".encode())
+            digest.update(content)
+
+        digest.update(f"FROM\0{base}".encode())
+
+        return f"sha256:{digest.hexdigest()}"
 
     def build_container(
-        self, target: str, progress: Progress, silent: bool, push: bool = True
+        self,
+        target: str,
+        progress: Progress,
+        silent: bool,
+        push: bool = True,
+        force: bool = False,
     ):
         """
-        Build the container image
+        Build the container image, unless the image built from the same inputs
+        is still available
         """
-        targetpath = join(self.__path, ".q8s_cache", target)
+        fingerprint = self.fingerprint(target)
+
+        if not force and self.__up_to_date(target, fingerprint, remote=push):
+            progress.console.print(
+                f"Container {self.__image_name(target)} is up to date"
+            )
+            return
 
         task = progress.add_task(
             description=f"[cyan]Building container for {target}...", total=1
         )
 
-        # start the docker build command in subprocess and capture the output
-        build_process = Popen(
-            [
-                "docker",
-                "build",
-                "--progress",
-                "plain",
-                "--platform",
-                "linux/amd64",
-                "--tag",
-                self.__image_name(target),
-                targetpath,
-            ],
-            stdout=PIPE,
-            stderr=STDOUT,
-            bufsize=1,
-            universal_newlines=True,
+        returncode = self.__run(
+            self.__build_command(target, self.__image_name(target), progress),
+            target,
+            progress,
+            silent,
         )
 
-        def handle_output(stream, mask):
-            # Because the process' output is line buffered, there's only ever one
-            # line to read when this function is called
-            line = stream.readline()
-            if not silent:
-                progress.console.print(line, end="")
-
-        # Register callback for an "available for read" event from subprocess' stdout stream
-        selector = selectors.DefaultSelector()
-        selector.register(build_process.stdout, selectors.EVENT_READ, handle_output)
-
-        # Loop until subprocess is terminated
-        while build_process.poll() is None:
-            # Wait for events and handle them with their registered callbacks
-            events = selector.select()
-            for key, mask in events:
-                callback = key.data
-                callback(key.fileobj, mask)
-
-        selector.close()
-
-        if build_process.returncode != 0:
+        if returncode != 0:
+            progress.update(
+                task, description=f"[red]Failed to build container for {target}"
+            )
             progress.advance(task)
             raise Exception("Failed to build the container")
         else:
             progress.console.print(f"Container {self.__image_name(target)} built")
             progress.advance(task, 1)
 
-        if push:
-            self.push_container(target, progress, silent)
+        digest = self.push_container(target, progress, silent) if push else None
+
+        self.__images[target] = {"image": self.__image_name(target)}
+
+        if fingerprint is not None:
+            self.__images[target]["fingerprint"] = fingerprint
+        if digest is not None:
+            self.__images[target]["digest"] = digest
+
+    def build_containers(
+        self,
+        targets: List[str],
+        progress: Progress,
+        silent: bool,
+        push: bool = True,
+        parallelism: int = BUILD_PARALLELISM,
+        force: bool = False,
+    ) -> dict[str, Exception]:
+        """
+        Build the container images of the targets, at most parallelism at the
+        same time, and get the failures by target. A failed target does not
+        stop the others.
+        """
+        failures = {}
+
+        def build(target: str):
+            try:
+                self.build_container(
+                    target, progress=progress, silent=silent, push=push, force=force
+                )
+            except Exception as e:
+                failures[target] = e
+                progress.console.print(f"[red]{target}: {e}")
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, parallelism), thread_name_prefix="q8s-build"
+        ) as executor:
+            list(executor.map(build, targets))
+
+        return {target: failures[target] for target in targets if target in failures}
+
+    def verify_container(
+        self, target: str, progress: Progress, silent: bool
+    ) -> tuple[str, str]:
+        """
+        Rebuild the image of the target from scratch, and get the IDs of the
+        built image and of the rebuilt one, the same for a reproducible build.
+        """
+        image = self.__image_name(target)
+        built = local_image_id(image)
+
+        if built is None:
+            raise Exception(f"Image {image} not found, build it first")
+
+        cache_config = self.configuration.docker.cache
+
+        # The docker driver leaves the files of the layers unstamped, so the
+        # rebuild would always differ
+        if (
+            cache_config is None
+            or cache_config.builder is None
+            or not self.__check_builder(progress)
+        ):
+            raise Exception(
+                "Reproducible rebuilds need a buildx builder with the "
+                "docker-container driver, set docker.cache.builder in Q8Sproject"
+            )
+
+        task = progress.add_task(
+            description=f"[cyan]Rebuilding container for {target}...", total=1
+        )
+        rebuild = f"{image}-verify"
+
+        try:
+            returncode = self.__run(
+                self.__build_command(target, rebuild, progress, cache=False),
+                target,
+                progress,
+                silent,
+            )
+
+            if returncode != 0:
+                progress.update(
+                    task, description=f"[red]Failed to rebuild container for {target}"
+                )
+                raise Exception("Failed to rebuild the container")
 
-        self.__images[target] = self.__image_name(target)
+            return built, local_image_id(rebuild)
+        finally:
+            progress.advance(task)
+            subprocess.run(["docker", "image", "rm", rebuild], capture_output=True)
 
-    def push_container(self, target: str, progress: Progress, silent: bool):
+    def push_container(
+        self, target: str, progress: Progress, silent: bool
+    ) -> str | None:
         """
-        Push the container image to the registry
+        Push the container image to the registry, and get its digest there
         """
         task = progress.add_task(
             description=f"[cyan]Pushing container for {target}...", total=1
         )
 
-        push_process = Popen(
-            ["docker", "push", self.__image_name(target)],
+        returncode = self.__run(
+            ["docker", "push", self.__image_name(target)], target, progress, silent
+        )
+
+        if returncode != 0:
+            progress.update(
+                task, description=f"[red]Failed to push container for {target}"
+            )
+            progress.advance(task)
+            raise Exception("Failed to push the container")
+        else:
+            progress.advance(task)
+
+        return remote_digest(self.__image_name(target))
+
+    def update_images_cache(self):
+        """
+        Update the images cache
+        """
+        with open(join(self.__path, ".q8s_cache", "images"), "w") as f:
+            yaml.dump(self.__images, f)
+
+    def clear_cache(self):
+        """
+        Clear the cache directory
+        """
+        cachepath = join(self.__path, ".q8s_cache")
+        rmdir(cachepath)
+
+    def __up_to_date(self, target: str, fingerprint: str | None, remote: bool) -> bool:
+        """
+        Whether the image of the target was built from the inputs of the given
+        fingerprint, and is still in the registry, or locally for dry runs.
+        """
+        entry = self.__images.get(target, {})
+
+        if fingerprint is None or entry.get("fingerprint") != fingerprint:
+            return False
+
+        if entry.get("image") != self.__image_name(target):
+            return False
+
+        if remote and "digest" in entry:
+            # The tag may have been pushed over since
+            return remote_digest(entry["image"]) == entry["digest"]
+
+        return image_exists(entry["image"], remote)
+
+    def source_date_epoch(self) -> int:
+        """
+        Time the image is stamped with: SOURCE_DATE_EPOCH when set, else the
+        time of the last commit of the project configuration, so that the
+        same sources give the same image.
+        """
+        if "SOURCE_DATE_EPOCH" in os.environ:
+            return int(os.environ["SOURCE_DATE_EPOCH"])
+
+        try:
+            process = subprocess.run(
+                ["git", "log", "-1", "--format=%ct", "--", "Q8Sproject"],
+                cwd=self.__path,
+                capture_output=True,
+                text=True,
+                timeout=INSPECT_TIMEOUT,
+            )
+            return int(process.stdout.strip())
+        except (OSError, subprocess.SubprocessError, ValueError):
+            # Not committed, the start of the epoch is as reproducible
+            return 0
+
+    def __check_builder(self, progress: Progress) -> bool:
+        """
+        Whether the configured builder, or else the current one, exports layer
+        caches and stamps the files of the layers, which the docker driver
+        cannot. A warning is printed when it does not.
+        """
+        with self.__builder_lock:
+            if self.__builder_ready is None:
+                builder = self.configuration.docker.cache.builder
+                driver = builder_driver(builder)
+                self.__builder_ready = driver not in (None, "docker")
+
+                if not self.__builder_ready:
+                    found = (
+                        "not found"
+                        if driver is None
+                        else "uses the docker driver, which cannot export caches"
+                    )
+                    progress.console.print(
+                        f"[yellow]Builder {builder or '(current)'} {found}, "
+                        "building without the layer cache. Create one with "
+                        "docker buildx create --name q8s --driver docker-container"
+                    )
+
+            return self.__builder_ready
+
+    def __build_command(
+        self, target: str, tag: str, progress: Progress, cache: bool = True
+    ) -> List[str]:
+        """
+        The docker build command of the image of the target, reusing the
+        layers of earlier builds unless cache is False.
+        """
+        command = [
+            "docker",
+            "build",
+            "--progress",
+            "plain",
+            "--platform",
+            "linux/amd64",
+            "--build-arg",
+            f"SOURCE_DATE_EPOCH={self.source_date_epoch()}",
+        ]
+
+        cache_config = self.configuration.docker.cache
+
+        if cache_config is not None and not self.__check_builder(progress):
+            cache_config = None
+
+        if cache_config is not None and cache_config.builder is not None:
+            # Images stay in the builder unless loaded for the push, with the
+            # files of their layers stamped with the epoch as well
+            command += [
+                "--builder",
+                cache_config.builder,
+                "--output",
+                "type=docker,rewrite-timestamp=true",
+            ]
+
+        if not cache:
+            command.append("--no-cache")
+        elif cache_config is not None:
+            command += self.__cache_options(cache_config, target)
+
+        return command + ["--tag", tag, join(self.__path, ".q8s_cache", target)]
+
+    def __cache_options(self, cache: Q8SBuildCache, target: str) -> List[str]:
+        """
+        Options of docker build importing and exporting the layer cache of the
+        target, as configured in the project.
+        """
+        options = []
+
+        if cache.directory is not None:
+            directory = join(self.__path, cache.directory, target)
+            options += [
+                "--cache-from",
+                f"type=local,src={directory}",
+                "--cache-to",
+                f"type=local,dest={directory},mode=max",
+            ]
+
+        if cache.registry is not None:
+            ref = f"{cache.registry}:{target}"
+            options += [
+                "--cache-from",
+                f"type=registry,ref={ref}",
+                "--cache-to",
+                f"type=registry,ref={ref},mode=max",
+            ]
+
+        return options
+
+    def __run(
+        self, command: List[str], target: str, progress: Progress, silent: bool
+    ) -> int:
+        """
+        Run the docker command, printing its output prefixed with the target so
+        that concurrent builds can be told apart.
+        """
+        process = Popen(
+            command,
+            # Cache mounts need BuildKit
+            env={**os.environ, "DOCKER_BUILDKIT": "1"},
             stdout=PIPE,
             stderr=STDOUT,
             bufsize=1,
@@ -237,15 +686,15 @@ class Project:
             # Because the process' output is line buffered, there's only ever one
             # line to read when this function is called
             line = stream.readline()
-            if not silent:
-                progress.console.print(line, end="")
+            if not silent and line:
+                progress.console.print(f"{target} | {line}", end="", markup=False)
 
         # Register callback for an "available for read" event from subprocess' stdout stream
         selector = selectors.DefaultSelector()
-        selector.register(push_process.stdout, selectors.EVENT_READ, handle_output)
+        selector.register(process.stdout, selectors.EVENT_READ, handle_output)
 
         # Loop until subprocess is terminated
-        while push_process.poll() is None:
+        while process.poll() is None:
             # Wait for events and handle them with their registered callbacks
             events = selector.select()
             for key, mask in events:
@@ -254,25 +703,13 @@ class Project:
 
         selector.close()
 
-        if push_process.returncode != 0:
-            progress.advance(task)
-            raise Exception("Failed to push the container")
-        else:
-            progress.advance(task)
-
-    def update_images_cache(self):
-        """
-        Update the images cache
-        """
-        with open(join(self.__path, ".q8s_cache", "images"), "w") as f:
-            yaml.dump(self.__images, f)
+        # Output left when the process ended
+        for line in process.stdout:
+            if not silent:
+                progress.console.print(f"{target} | {line}", end="", markup=False)
+        process.stdout.close()
 
-    def clear_cache(self):
-        """
-        Clear the cache directory
-        """
-        cachepath = join(self.__path, ".q8s_cache")
-        rmdir(cachepath)
+        return process.returncode
 
     def __docker_login(self) -> str:
         return self.configuration.docker.username
@@ -311,6 +748,8 @@ class Project:
             print(f"{dep}", file=f)
 
     def __create_dockerfile(self, target: str, f):
+        # Parser directives come before any other comment
+        print("# syntax=docker/dockerfile:1", file=f)
         print("# This file is autogenerated by q8sctl", file=f)
         print("# Do not edit manually\n", file=f)
 
@@ -323,16 +762,23 @@ class Project:
         print(f"FROM {BASE_IMAGES[target]}", file=f)
         print("", file=f)
 
+        # Stamped with the time of the sources, not of the build
+        created = datetime.fromtimestamp(self.source_date_epoch(), timezone.utc)
         print(
-            f"LABEL org.opencontainers.image.created={datetime.now().isoformat()}",
+            f"LABEL org.opencontainers.image.created={created.isoformat()}",
             file=f,
         )
         print(f"LABEL org.opencontainers.image.title={self.name}", file=f)
         print("", file=f)
 
+        # Python stamps the bytecode pip compiles with it when given
+        print("ARG SOURCE_DATE_EPOCH", file=f)
         print(f"WORKDIR {WORKSPACE}", file=f)
         print("COPY requirements.txt .", file=f)
-        print("RUN pip install -r requirements.txt", file=f)
+        print(
+            f"RUN --mount=type=cache,target={PIP_CACHE} pip install -r requirements.txt",
+            file=f,
+        )
 
     def __get_target(self, target: str) -> Q8STarget:
         if hasattr(self.configuration.targets, target) is False:
@@ -0,0 +1,214 @@
+import base64
+from dataclasses import dataclass, field
+from json import dumps, loads
+import sys
+from typing import Any, Callable, TextIO
+
+# Frames of rich output are delimited in the program output by these markers,
+# starting with the ASCII record separator that plain output does not contain
+SEPARATOR = "\x1e"
+BEGIN = f"{SEPARATOR}q8s:begin "
+END = f"{SEPARATOR}q8s:end\n"
+
+# Longest header line, the rest of an unterminated header is plain output
+MAX_HEADER = 64 * 1024
+
+# Largest payload of a frame, in characters
+MAX_FRAME = 64 * 1024 * 1024
+
+
+@dataclass
+class Frame:
+    """
+    Rich output of the program, the data of a single mimetype as text, binary
+    data being base64 encoded as in Jupyter messages.
+    """
+
+    mimetype: str
+    data: str
+    metadata: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def content(self) -> Any:
+        """
+        The data as Jupyter expects it, JSON mimetypes as objects.
+        """
+        if self.mimetype == "application/json" or self.mimetype.endswith("+json"):
+            return loads(self.data)
+
+        return self.data
+
+    def display_data(self) -> dict[str, Any]:
+        return {"data": {self.mimetype: self.content}, "metadata": self.metadata}
+
+
+def encode(
+    mimetype: str, data: str | bytes, metadata: dict[str, Any] | None = None
+) -> str:
+    """
+    The frame of the rich output, to be written to the program output.
+    """
+    if isinstance(data, bytes):
+        data = base64.b64encode(data).decode()
+
+    header = dumps(
+        {"mimetype": mimetype, "length": len(data), "metadata": metadata or {}},
+        separators=(",", ":"),
+    )
+
+    return f"{BEGIN}{header}\n{data}{END}"
+
+
+def display(
+    mimetype: str,
+    data: str | bytes,
+    metadata: dict[str, Any] | None = None,
+    file: TextIO | None = None,
+):
+    """
+    Show the data as rich output of the program, for any mimetype Jupyter
+    renders: HTML, JSON, LaTeX, images...
+    """
+    file = sys.stdout if file is None else file
+    file.write(encode(mimetype, data, metadata))
+    file.flush()
+
+
+class FrameParser:
+    """
+    Separate the frames of rich output from the plain output, in a single pass
+    over the output as it arrives, whatever the boundaries of its chunks.
+    """
+
+    def __init__(
+        self,
+        on_text: Callable[[str], None],
+        on_frame: Callable[[Frame], None],
+    ):
+        self.__on_text = on_text
+        self.__on_frame = on_frame
+        # Output held until it can be told apart
+        self.__pending = ""
+        self.__header: dict[str, Any] | None = None
+        self.__payload: list[str] = []
+        self.__received = 0
+
+    def write(self, text: str):
+        text = self.__pending + text
+        self.__pending = ""
+        position = 0
+
+        while position < len(text):
+            if self.__header is not None:
+                position = self.__read_payload(text, position)
+            else:
+                position = self.__read_text(text, position)
+
+            if position < 0:
+                return
+
+    def close(self):
+        """
+        Pass on the output held back, an incomplete frame as a note.
+        """
+        if self.__header is not None:
+            self.__on_text(f"[incomplete {self.__header['mimetype']} output]\n")
+        elif self.__pending:
+            self.__on_text(self.__pending)
+
+        self.__pending = ""
+        self.__reset()
+
+    def __hold(self, text: str, position: int) -> int:
+        self.__pending = text[position:]
+
+        return -1
+
+    def __read_text(self, text: str, position: int) -> int:
+        start = text.find(SEPARATOR, position)
+
+        if start == -1:
+            self.__on_text(text[position:])
+            return len(text)
+
+        if start > position:
+            self.__on_text(text[position:start])
+
+        if len(text) - start < len(BEGIN):
+            if BEGIN.startswith(text[start:]):
+                return self.__hold(text, start)
+        elif text.startswith(BEGIN, start):
+            return self.__read_header(text, start)
+
+        self.__on_text(SEPARATOR)
+
+        return start + 1
+
+    def __read_header(self, text: str, start: int) -> int:
+        end = text.find("\n", start + len(BEGIN), start + len(BEGIN) + MAX_HEADER)
+
+        if end == -1:
+            if len(text) - start < len(BEGIN) + MAX_HEADER:
+                return self.__hold(text, start)
+        else:
+            header = self.__parse_header(text[start + len(BEGIN) : end])
+            if header is not None:
+                self.__header = header
+                return end + 1
+
+        # Not a frame after all
+        self.__on_text(SEPARATOR)
+
+        return start + 1
+
+    def __parse_header(self, line: str) -> dict[str, Any] | None:
+        try:
+            header = loads(line)
+        except ValueError:
+            return None
+
+        if not isinstance(header, dict) or not isinstance(header.get("mimetype"), str):
+            return None
+
+        length = header.get("length")
+        if not isinstance(length, int) or not 0 <= length <= MAX_FRAME:
+            return None
+
+        if not isinstance(header.get("metadata", {}), dict):
+            return None
+
+        return header
+
+    def __read_payload(self, text: str, position: int) -> int:
+        missing = self.__header["length"] - self.__received
+
+        if missing > 0:
+            data = text[position : position + missing]
+            self.__payload.append(data)
+            self.__received += len(data)
+            return position + len(data)
+
+        if len(text) - position < len(END):
+            if END.startswith(text[position:]):
+                return self.__hold(text, position)
+        elif text.startswith(END, position):
+            self.__on_frame(
+                Frame(
+                    self.__header["mimetype"],
+                    "".join(self.__payload),
+                    self.__header.get("metadata", {}),
+                )
+            )
+            self.__reset()
+            return position + len(END)
+
+        # The payload was cut, most likely by omitted output
+        self.__on_text(f"[incomplete {self.__header['mimetype']} output]\n")
+        self.__reset()
+
+        return position
+
+    def __reset(self):
+        self.__header = None
+        self.__payload = []
+        self.__received = 0
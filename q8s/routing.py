@@ -0,0 +1,171 @@
+from dataclasses import dataclass, field
+from json import dump, load
+import logging
+import os
+from pathlib import Path
+from statistics import median
+import tempfile
+import threading
+
+from q8s.deps.code_analyzer import CircuitAnalyzer
+from q8s.enums import Target
+
+ROUTING_HISTORY = os.environ.get("Q8S_ROUTING_HISTORY", ".q8s_cache/routing.json")
+
+# Circuits of at least this many qubits are simulated on a GPU
+GPU_QUBITS = int(os.environ.get("Q8S_AUTO_GPU_QUBITS", 20))
+
+# Run times kept per number of qubits and target
+HISTORY_SIZE = 20
+
+# Memory requested besides the state vector, in bytes
+BASE_MEMORY = 256 * 1024 * 1024
+
+# A state vector of complex doubles, twice for the copies the simulator makes
+BYTES_PER_AMPLITUDE = 2 * 16
+
+
+@dataclass
+class Routing:
+    target: Target
+    reason: str
+    qubits: int | None = None
+    resources: dict[str, str] = field(default_factory=dict)
+
+
+def memory_request(qubits: int) -> str:
+    """
+    Memory to request for the state vector of the qubits, in MiB.
+    """
+    size = BASE_MEMORY + BYTES_PER_AMPLITUDE * 2**qubits
+
+    return f"{-(-size // (1024 * 1024))}Mi"
+
+
+def circuit_qubits(code: str) -> int | None:
+    try:
+        return CircuitAnalyzer(code).qubits
+    except SyntaxError:
+        return None
+
+
+class RunHistory:
+    """
+    Recent run times of successful simulations, per number of qubits and
+    target, kept in a JSON file.
+    """
+
+    def __init__(self, path: str | os.PathLike = ROUTING_HISTORY):
+        self.path = Path(path)
+        self.__lock = threading.Lock()
+
+    def __load(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, qubits: int, target: Target, seconds: float):
+        with self.__lock:
+            history = self.__load()
+            runs = history.setdefault(str(qubits), {}).setdefault(target.value, [])
+            runs.append(seconds)
+            del runs[:-HISTORY_SIZE]
+
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with tempfile.NamedTemporaryFile(
+                    "w", dir=self.path.parent, delete=False
+                ) as f:
+                    dump(history, f)
+                os.replace(f.name, self.path)
+            except OSError as e:
+                logging.warning(f"Failed to record run time: {e}")
+
+    def median(self, qubits: int, target: Target) -> float | None:
+        runs = self.__load().get(str(qubits), {}).get(target.value)
+
+        return median(runs) if runs else None
+
+
+class Router:
+    """
+    Choose between the CPU and GPU targets from the size of the circuits the
+    code simulates, preferring the one that ran similar circuits faster.
+    """
+
+    def __init__(
+        self,
+        history: RunHistory | None = None,
+        gpu_qubits: int = GPU_QUBITS,
+    ):
+        self.history = history
+        self.gpu_qubits = gpu_qubits
+
+    def route(self, code: str) -> Routing:
+        try:
+            analysis = CircuitAnalyzer(code)
+        except SyntaxError:
+            return Routing(Target.cpu, "the code could not be parsed")
+
+        if analysis.device == "GPU":
+            return Routing(
+                Target.gpu, "the simulator asks for the GPU device", analysis.qubits
+            )
+
+        qubits = analysis.qubits
+
+        if qubits is None:
+            if analysis.quantum:
+                return Routing(
+                    Target.gpu, "the size of the circuits could not be determined"
+                )
+            return Routing(Target.cpu, "the code does not simulate circuits")
+
+        measured = self.__measured(qubits)
+        if measured is not None:
+            return measured
+
+        if qubits >= self.gpu_qubits:
+            return Routing(
+                Target.gpu,
+                f"circuits of {qubits} qubits, at least {self.gpu_qubits}",
+                qubits,
+            )
+
+        return Routing(
+            Target.cpu,
+            f"circuits of {qubits} qubits, fewer than {self.gpu_qubits}",
+            qubits,
+            {"memory": memory_request(qubits)},
+        )
+
+    def __measured(self, qubits: int) -> Routing | None:
+        """
+        Route to the faster target when both ran circuits of this size.
+        """
+        if self.history is None:
+            return None
+
+        cpu = self.history.median(qubits, Target.cpu)
+        gpu = self.history.median(qubits, Target.gpu)
+
+        if cpu is None or gpu is None:
+            return None
+
+        reason = (
+            f"circuits of {qubits} qubits took {cpu:.1f} s on cpu "
+            f"and {gpu:.1f} s on gpu"
+        )
+
+        if cpu <= gpu:
+            return Routing(
+                Target.cpu, reason, qubits, {"memory": memory_request(qubits)}
+            )
+
+        return Routing(Target.gpu, reason, qubits)
+
+    def record(self, qubits: int, target: Target, seconds: float):
+        if self.history is not None:
+            self.history.record(qubits, target, seconds)
@@ -0,0 +1,300 @@
+import logging
+import os
+from time import monotonic
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from q8s.logs import OutputCallback
+from q8s.pool import MAX_CODE_SIZE, exec_in_pod
+from q8s.watcher import resumable_watch
+
+SESSION_LABEL = "qubernetes.dev/session"
+
+SESSION_SOCKET = "/tmp/q8s.sock"
+
+# Time, in seconds, the interpreter waits for a cell before it exits
+SESSION_IDLE_TIMEOUT = int(os.environ.get("Q8S_SESSION_IDLE_TIMEOUT", 30 * 60))
+
+# Longest time, in seconds, the session pod may take to start
+SESSION_START_TIMEOUT = 10 * 60
+
+# Return code of the client when the interpreter is not reachable or died
+# while running the cell
+UNAVAILABLE = 75
+
+# Interpreter kept alive in the session pod. It runs the cells it receives on a
+# unix socket in one namespace and sends their output back in frames: a kind
+# byte, "o" for output or "x" for the exit status, a length and the data.
+SERVER_COMMAND = """
+import io, os, socket, struct, sys, traceback
+
+idle, path = int(sys.argv[1]), sys.argv[2]
+namespace = {"__name__": "__main__"}
+
+
+class Channel(io.TextIOBase):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        data = text.encode()
+        if data:
+            try:
+                self.conn.sendall(b"o" + struct.pack("!I", len(data)) + data)
+            except OSError:
+                pass
+        return len(text)
+
+
+def receive(conn, size):
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+
+if os.path.exists(path):
+    os.remove(path)
+
+server = socket.socket(socket.AF_UNIX)
+server.bind(path)
+server.listen(1)
+server.settimeout(idle)
+
+while True:
+    try:
+        conn, _ = server.accept()
+    except socket.timeout:
+        break
+
+    with conn:
+        conn.settimeout(None)
+        try:
+            size = struct.unpack("!I", receive(conn, 4))[0]
+            code = receive(conn, size).decode()
+        except EOFError:
+            continue
+
+        sys.stdout = sys.stderr = Channel(conn)
+        status = 0
+        try:
+            exec(compile(code, "<cell>", "exec"), namespace)
+        except SystemExit as e:
+            status = 0 if e.code in (None, 0) else 1
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+
+        try:
+            conn.sendall(b"x" + struct.pack("!I", 1) + str(status).encode())
+        except OSError:
+            pass
+"""
+
+CLIENT_COMMAND = f"""
+import socket, struct, sys, time
+
+path, code = sys.argv[1], sys.argv[2].encode()
+
+# The interpreter may still be starting after a restart
+for attempt in range(30):
+    try:
+        conn = socket.socket(socket.AF_UNIX)
+        conn.connect(path)
+        break
+    except OSError:
+        time.sleep(1)
+else:
+    sys.exit({UNAVAILABLE})
+
+conn.sendall(struct.pack("!I", len(code)) + code)
+frames = conn.makefile("rb")
+
+while True:
+    header = frames.read(5)
+    if len(header) < 5:
+        sys.exit({UNAVAILABLE})
+    data = frames.read(struct.unpack("!I", header[1:])[0])
+    if header[:1] == b"x":
+        sys.exit(int(data))
+    sys.stdout.buffer.write(data)
+    sys.stdout.flush()
+"""
+
+
+class RemoteSession:
+    """
+    Long lived pod running one interpreter for all the cells, so that their
+    variables and imports persist.
+
+    The interpreter exits after being idle for the timeout, and the pod
+    restarts it when it crashes. Either way its state is lost and the next cell
+    starts from a fresh interpreter.
+    """
+
+    name: str
+    namespace: str
+    idle_timeout: int
+
+    def __init__(
+        self,
+        name: str,
+        namespace: str,
+        template: client.V1PodTemplateSpec,
+        idle_timeout: int = SESSION_IDLE_TIMEOUT,
+    ):
+        self.name = name
+        self.namespace = namespace
+        self.idle_timeout = idle_timeout
+
+        self.core_api_instance = client.CoreV1Api()
+        # stream() swaps the request method of its api client, keep it separate
+        self.exec_api_instance = client.CoreV1Api(client.ApiClient())
+
+        self.__template = self.__session_template(template)
+        self.__generation = 0
+        self.__pod: str | None = None
+        self.__restarts = 0
+
+    def __session_template(self, template: client.V1PodTemplateSpec):
+        """
+        Turn the job template into the template of the interpreter pod.
+        """
+        spec = template.spec
+        container = spec.containers[0]
+
+        container.command = ["python", "-c", SERVER_COMMAND]
+        container.args = [str(self.idle_timeout), SESSION_SOCKET]
+        container.volume_mounts = None
+        spec.volumes = None
+        # Restart the interpreter when it crashes, not when it exits idle
+        spec.restart_policy = "OnFailure"
+
+        template.metadata = client.V1ObjectMeta(labels={SESSION_LABEL: self.name})
+
+        return template
+
+    def __start(self) -> str:
+        self.__generation += 1
+        name = f"{self.name}-{self.__generation}"
+
+        pod = client.V1Pod(
+            api_version="v1",
+            kind="Pod",
+            metadata=client.V1ObjectMeta(
+                name=name,
+                namespace=self.namespace,
+                labels=self.__template.metadata.labels,
+            ),
+            spec=self.__template.spec,
+        )
+
+        self.core_api_instance.create_namespaced_pod(namespace=self.namespace, body=pod)
+
+        self.__pod = name
+        self.__restarts = 0
+        self.__wait_for_pod()
+
+        return name
+
+    def __wait_for_pod(self):
+        for event in resumable_watch(
+            self.core_api_instance.list_namespaced_pod,
+            deadline=monotonic() + SESSION_START_TIMEOUT,
+            namespace=self.namespace,
+            field_selector=f"metadata.name={self.__pod}",
+        ):
+            if event["object"].status.phase in ("Running", "Succeeded", "Failed"):
+                return
+
+    def __delete_pod(self):
+        if self.__pod is None:
+            return
+
+        try:
+            self.core_api_instance.delete_namespaced_pod(
+                self.__pod, self.namespace, grace_period_seconds=0
+            )
+        except ApiException as e:
+            if e.status != 404:
+                logging.warning(f"Failed to delete session pod: {e.reason}")
+
+        self.__pod = None
+
+    def ensure(self) -> str | None:
+        """
+        Make sure the interpreter runs, starting a new one when needed, and
+        describe what happened to the state of the session, if anything.
+        """
+        if self.__pod is None:
+            self.__start()
+            return f"Session {self.__pod} started"
+
+        try:
+            pod = self.core_api_instance.read_namespaced_pod(self.__pod, self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            pod = None
+
+        if pod is not None and pod.status.phase == "Pending":
+            self.__wait_for_pod()
+            return None
+
+        if pod is None or pod.status.phase != "Running":
+            reason = (
+                f"ended after being idle for {self.idle_timeout} seconds"
+                if pod is not None and pod.status.phase == "Succeeded"
+                else "was lost"
+            )
+            self.__delete_pod()
+            self.__start()
+            return f"Session {reason}, started {self.__pod}, state was reset"
+
+        restarts = sum(
+            status.restart_count for status in pod.status.container_statuses or []
+        )
+
+        if restarts > self.__restarts:
+            self.__restarts = restarts
+            return "Session interpreter crashed and was restarted, state was reset"
+
+        return None
+
+    def run(self, code: str, on_output: OutputCallback | None = None):
+        """
+        Run the code in the interpreter of the session.
+        """
+        if len(code.encode()) > MAX_CODE_SIZE:
+            return (
+                f"Cells larger than {MAX_CODE_SIZE} bytes cannot run in a session",
+                "stderr",
+            )
+
+        output, returncode = exec_in_pod(
+            self.exec_api_instance,
+            self.__pod,
+            self.namespace,
+            ["python", "-c", CLIENT_COMMAND, SESSION_SOCKET, code],
+            on_output,
+        )
+
+        if returncode == UNAVAILABLE:
+            output += "\nSession interpreter stopped while running the cell"
+
+        return output, "stdout" if returncode == 0 else "stderr"
+
+    def shutdown(self):
+        """
+        Remove the pod of the session.
+        """
+        self.__delete_pod()
@@ -0,0 +1,146 @@
+from dataclasses import dataclass
+from itertools import product
+from json import dumps
+import os
+from typing import Any
+
+from kubernetes import client
+import yaml
+
+from q8s.constants import WORKSPACE
+
+# Pods of a sweep running at the same time
+DEFAULT_PARALLELISM = 10
+
+PARAMETERS_FILE = "params.json"
+
+INDEX_ANNOTATION = "batch.kubernetes.io/job-completion-index"
+
+# Load the parameters of the completion index into the environment, then run
+# the program
+SWEEP_COMMAND = """
+import json, os, runpy, sys
+
+main, parameters = sys.argv[1], sys.argv[2]
+index = int(os.environ["JOB_COMPLETION_INDEX"])
+
+with open(parameters) as f:
+    parameters = json.load(f)[index]
+
+os.environ["Q8S_SWEEP_INDEX"] = str(index)
+os.environ["Q8S_PARAMS"] = json.dumps(parameters)
+for key, value in parameters.items():
+    os.environ["Q8S_PARAM_" + key.upper()] = (
+        value if isinstance(value, str) else json.dumps(value)
+    )
+
+sys.argv = [main]
+runpy.run_path(main, run_name="__main__")
+"""
+
+
+@dataclass
+class SweepResult:
+    index: int
+    parameters: dict[str, Any]
+    status: str
+    output: str
+
+
+def parameter_grid(grid: dict[str, list]) -> list[dict[str, Any]]:
+    """
+    Every combination of the values of the parameters.
+    """
+    names = list(grid.keys())
+
+    return [dict(zip(names, values)) for values in product(*grid.values())]
+
+
+def sweep_parameters(grid: Any, options: list[str]) -> list[dict[str, Any]]:
+    """
+    Sets of parameters of a sweep, from the content of the grid file, a list
+    of values per parameter or a list of sets, and the name=value1,value2,...
+    options adding parameters to the grid.
+    """
+    if isinstance(grid, list):
+        if options:
+            raise ValueError(
+                "Parameters cannot be added to a grid file listing parameter sets"
+            )
+        return grid
+
+    if grid is not None and not isinstance(grid, dict):
+        raise ValueError("The grid file holds neither parameters nor parameter sets")
+
+    values = dict(grid or {})
+
+    for option in options:
+        name, _, listed = option.partition("=")
+        values[name] = [yaml.safe_load(value) for value in listed.split(",")]
+
+    return parameter_grid(values)
+
+
+def make_indexed(
+    job: client.V1Job, parameters: list[dict[str, Any]], parallelism: int
+) -> client.V1Job:
+    """
+    Turn the job of a program into an Indexed Job running it once per set of
+    parameters, at most parallelism at a time.
+    """
+    spec = job.spec
+    spec.completion_mode = "Indexed"
+    spec.completions = len(parameters)
+    spec.parallelism = min(parallelism, len(parameters))
+    # A failing index does not stop the others
+    spec.backoff_limit_per_index = 0
+
+    container = spec.template.spec.containers[0]
+    container.command = ["python", "-c", SWEEP_COMMAND]
+    container.args = [f"{WORKSPACE}/main.py", f"{WORKSPACE}/{PARAMETERS_FILE}"]
+
+    job.metadata.labels["qubernetes.dev/job.type"] = "sweep"
+
+    return job
+
+
+def parameters_file(parameters: list[dict[str, Any]]) -> dict[str, str]:
+    """
+    Config map data with the parameters of every index.
+    """
+    return {PARAMETERS_FILE: dumps(parameters)}
+
+
+def pod_index(pod: client.V1Pod) -> int | None:
+    annotations = pod.metadata.annotations or {}
+
+    if INDEX_ANNOTATION not in annotations:
+        return None
+
+    return int(annotations[INDEX_ANNOTATION])
+
+
+def latest_pods(pods: list[client.V1Pod]) -> dict[int, client.V1Pod]:
+    """
+    Last pod of every completion index.
+    """
+    latest = {}
+
+    for pod in sorted(
+        pods,
+        key=lambda pod: (
+            pod.metadata.creation_timestamp is not None,
+            pod.metadata.creation_timestamp,
+        ),
+    ):
+        index = pod_index(pod)
+
+        if index is not None:
+            latest[index] = pod
+
+    return latest
+
+
+def write_results(results: list[SweepResult], path: str | os.PathLike):
+    with open(path, "w") as f:
+        f.write(dumps([result.__dict__ for result in results], indent=2))
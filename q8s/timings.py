@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from json import dumps
+import os
+from time import time
+
+from kubernetes import client
+
+
+@dataclass
+class Span:
+    """
+    Phase of an execution, with start and end in seconds since the epoch.
+
+    Client spans are measured by the client, pod spans derived from the
+    condition and container timestamps the cluster reports, at a resolution
+    of one second.
+    """
+
+    name: str
+    start: float
+    end: float
+    source: str = "client"
+
+    @property
+    def duration(self) -> float:
+        """
+        Duration in milliseconds.
+        """
+        return (self.end - self.start) * 1000
+
+
+@dataclass
+class Timings:
+    spans: list[Span] = field(default_factory=list)
+
+    def add(self, name: str, start: float, end: float, source: str = "client"):
+        self.spans.append(Span(name, start, end, source))
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        Record the time spent in the block as a client span.
+        """
+        start = time()
+        try:
+            yield
+        finally:
+            self.add(name, start, time())
+
+    def extend(self, spans: list[Span]):
+        self.spans.extend(spans)
+
+    def summary(self) -> str:
+        return "\n".join(
+            f"{span.name:<24} {span.duration:>10.0f} ms  ({span.source})"
+            for span in self.spans
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Spans as structured records, along with the same spans as Trace Event
+        Format records, so the file opens in trace viewers as well.
+        """
+        return {
+            "spans": [
+                {**asdict(span), "duration": span.duration} for span in self.spans
+            ],
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": span.source,
+                    "ph": "X",
+                    "ts": span.start * 1_000_000,
+                    "dur": (span.end - span.start) * 1_000_000,
+                    "pid": os.getpid(),
+                    "tid": span.source,
+                }
+                for span in self.spans
+            ],
+        }
+
+    def to_json(self) -> str:
+        return dumps(self.to_dict(), indent=2)
+
+    def write(self, path: str | os.PathLike):
+        with open(path, "w") as f:
+            f.write(self.to_json())
+
+
+def timestamp(value: datetime | None) -> float | None:
+    return None if value is None else value.timestamp()
+
+
+def pod_spans(pod: client.V1Pod, finished: datetime | None = None) -> list[Span]:
+    """
+    Scheduling, sandbox and image pull, and run phases of a pod, from its
+    condition and container timestamps. The end of the run falls back to the
+    given time when the container has not terminated yet.
+    """
+    conditions = {
+        condition.type: timestamp(condition.last_transition_time)
+        for condition in pod.status.conditions or []
+    }
+
+    created = timestamp(pod.metadata.creation_timestamp)
+    scheduled = conditions.get("PodScheduled")
+    # Set once the sandbox and volumes are ready, before pulling the image
+    ready_to_start = conditions.get(
+        "PodReadyToStartContainers", conditions.get("Initialized")
+    )
+
+    started = None
+    ended = timestamp(finished)
+
+    for status in pod.status.container_statuses or []:
+        state = status.state
+
+        if state is None:
+            continue
+
+        if state.running is not None:
+            started = timestamp(state.running.started_at)
+        elif state.terminated is not None:
+            started = timestamp(state.terminated.started_at)
+            ended = timestamp(state.terminated.finished_at)
+
+    phases = [
+        ("scheduling", created, scheduled),
+        ("sandbox", scheduled, ready_to_start),
+        ("pull_and_start", ready_to_start, started),
+        ("run", started, ended),
+    ]
+
+    return [
+        Span(name, start, end, "pod")
+        for name, start, end in phases
+        if start is not None and end is not None and end >= start
+    ]
@@ -0,0 +1,84 @@
+from time import monotonic
+from typing import Callable, Iterator
+
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+# Longest single watch request, the server closes it and the watch resumes
+WATCH_WINDOW = 60
+
+# Time the client waits past the server side timeout before it gives up on a
+# connection that went silent
+REQUEST_GRACE = 10
+
+HTTP_GONE = 410
+
+
+class WatchTimeoutException(Exception):
+    pass
+
+
+def resumable_watch(
+    func: Callable,
+    deadline: float | None = None,
+    stopped: Callable[[], bool] | None = None,
+    window: int = WATCH_WINDOW,
+    **kwargs,
+) -> Iterator[dict]:
+    """
+    Watch the objects selected by the keyword arguments until the caller stops,
+    the deadline, a monotonic clock value, passes or stopped is true between
+    two requests of at most window seconds.
+
+    Every request is bounded in time and resumes from the last seen resource
+    version, bookmarks included. When the version expired, the watch restarts
+    from the current state of the selected objects.
+    """
+    resource_version = None
+
+    while True:
+        if stopped is not None and stopped():
+            return
+
+        remaining = window if deadline is None else deadline - monotonic()
+
+        if remaining <= 0:
+            raise WatchTimeoutException("Deadline reached while watching the job")
+
+        seconds = max(1, int(min(window, remaining)))
+
+        if resource_version is not None:
+            kwargs["resource_version"] = resource_version
+        else:
+            kwargs.pop("resource_version", None)
+
+        w = watch.Watch()
+        events = w.stream(
+            func,
+            allow_watch_bookmarks=True,
+            timeout_seconds=seconds,
+            _request_timeout=seconds + REQUEST_GRACE,
+            **kwargs,
+        )
+
+        try:
+            for event in events:
+                if event["type"] == "BOOKMARK":
+                    resource_version = event["raw_object"]["metadata"][
+                        "resourceVersion"
+                    ]
+                    continue
+
+                resource_version = event["object"].metadata.resource_version
+                yield event
+        except ApiException as e:
+            if e.status != HTTP_GONE:
+                raise
+            resource_version = None
+        except (ProtocolError, ReadTimeoutError):
+            # The connection dropped or went silent, resume where it stopped
+            pass
+        finally:
+            w.stop()
+            events.close()
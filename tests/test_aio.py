@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from kubernetes import client
+
+from q8s.aio import AsyncK8sContext, CONTEXT_LABEL
+from q8s.timings import Timings
+
+
+def completed_job(name):
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(name=name),
+        status=client.V1JobStatus(
+            conditions=[client.V1JobCondition(type="Complete", status="True")],
+            start_time="2025-01-01T00:00:00Z",
+        ),
+    )
+
+
+class FakeContext:
+    registry_pat = None
+    result_cache = None
+    namespace = "default"
+    timeout = None
+
+    def __init__(self, name="base"):
+        self.name = name
+        self.forks = 0
+        self.timings = Timings()
+
+    def fork(self):
+        self.forks += 1
+        context = FakeContext(f"job-{self.forks}")
+        context.timeout = self.timeout
+        context.core_api_instance = self.core_api_instance
+        context.batch_api_instance = self.batch_api_instance
+        return context
+
+    def route(self, code):
+        return None
+
+    def get_pod_logs(self, name):
+        return self.core_api_instance.read_namespaced_pod_log(
+            name=name, namespace=self.namespace
+        )
+
+    def create_job_object(self, code):
+        return client.V1Job(
+            metadata=client.V1ObjectMeta(name=self.name, labels={"a": "b"})
+        )
+
+    def create_config_map_object(self, code):
+        return client.V1ConfigMap(data={"main.py": code})
+
+    def create_environment_secret_object(self):
+        return client.V1Secret()
+
+    def ensure_secret(self, secret):
+        pass
+
+    def collect_garbage(self):
+        pass
+
+
+@patch("q8s.aio.client.ApiClient")
+@patch("q8s.aio.client.BatchV1Api")
+@patch("q8s.aio.client.CoreV1Api")
+@patch("q8s.aio.K8sContext")
+class TestAsyncK8sContext(unittest.TestCase):
+
+    def test_concurrent_executions(
+        self, MockK8sContext, MockCoreV1Api, MockBatchV1Api, MockApiClient
+    ):
+        MockK8sContext.return_value = FakeContext()
+        core = MockCoreV1Api.return_value
+        batch = MockBatchV1Api.return_value
+
+        created = []
+        lock = threading.Condition()
+
+        def create_job(namespace, body):
+            with lock:
+                created.append(body)
+                lock.notify_all()
+
+        batch.create_namespaced_job.side_effect = create_job
+
+        def watch(func, stopped, **kwargs):
+            seen = 0
+            while not stopped():
+                with lock:
+                    lock.wait_for(lambda: len(created) > seen, timeout=0.1)
+                    jobs = created[seen:]
+                    seen = len(created)
+                for job in jobs:
+                    yield {
+                        "type": "MODIFIED",
+                        "object": completed_job(job.metadata.name),
+                    }
+
+        pod = client.V1Pod(metadata=client.V1ObjectMeta(name="pod"))
+        core.list_namespaced_pod.return_value = client.V1PodList(items=[pod])
+        core.read_namespaced_pod_log.return_value = "hello"
+
+        async def run():
+            async with AsyncK8sContext("kubeconfig", concurrency=4) as context:
+                executions = [context.submit("print('hello')") for _ in range(10)]
+                return await asyncio.gather(*executions)
+
+        with patch("q8s.aio.resumable_watch", side_effect=watch):
+            results = asyncio.run(run())
+
+        self.assertEqual(results, [("hello", "stdout")] * 10)
+        self.assertEqual(len(created), 10)
+        self.assertTrue(
+            all(job.metadata.labels[CONTEXT_LABEL] == "base" for job in created)
+        )
+        self.assertEqual(batch.delete_namespaced_job.call_count, 10)
+
+    def test_timeout(
+        self, MockK8sContext, MockCoreV1Api, MockBatchV1Api, MockApiClient
+    ):
+        MockK8sContext.return_value = FakeContext()
+        MockK8sContext.return_value.timeout = 0.1
+        batch = MockBatchV1Api.return_value
+
+        def watch(func, stopped, **kwargs):
+            # The job is never reported complete
+            while not stopped():
+                time.sleep(0.01)
+            yield from []
+
+        async def run():
+            async with AsyncK8sContext("kubeconfig", concurrency=4) as context:
+                execution = context.submit("print('hello')")
+                return await execution, execution.status
+
+        with patch("q8s.aio.resumable_watch", side_effect=watch):
+            result, status = asyncio.run(run())
+
+        self.assertEqual(
+            result, ("Execution did not finish within 0.1 seconds", "stderr")
+        )
+        self.assertEqual(status, "Timed out")
+        batch.delete_namespaced_job.assert_called_once()
+
+    @patch("q8s.watcher.watch.Watch")
+    def test_close_stops_quiet_watch(
+        self, MockWatch, MockK8sContext, MockCoreV1Api, MockBatchV1Api, MockApiClient
+    ):
+        MockK8sContext.return_value = FakeContext()
+        requests = []
+
+        def stream(func, **kwargs):
+            # A namespace without changes, every window ends without events
+            requests.append(kwargs["timeout_seconds"])
+            time.sleep(0.01)
+            yield from []
+
+        MockWatch.return_value.stream.side_effect = stream
+
+        async def run():
+            context = AsyncK8sContext("kubeconfig", concurrency=4)
+            context.submit("print('hello')").cancel()
+            await asyncio.sleep(0.05)
+            await asyncio.wait_for(context.close(), timeout=5)
+
+        asyncio.run(run())
+
+        self.assertFalse(
+            any(thread.name == "q8s-watch" for thread in threading.enumerate())
+        )
+        self.assertTrue(requests)
+        self.assertTrue(all(seconds <= 5 for seconds in requests))
+
+
+if __name__ == "__main__":
+    unittest.main()
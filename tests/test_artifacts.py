@@ -0,0 +1,133 @@
+import base64
+from io import BytesIO
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import unittest
+
+from kubernetes import client
+import numpy
+
+from q8s.artifacts import (
+    ARCHIVE_COMMAND,
+    ARTIFACTS_PATH,
+    COLLECTOR_COMMAND,
+    COLLECTOR_CONTAINER,
+    DONE_MARKER,
+    RUN_COMMAND,
+    Artifact,
+    make_collected,
+    unpack,
+)
+from tests.test_pool import make_template
+
+
+def archive(files):
+    buffer = BytesIO()
+
+    with tarfile.open(fileobj=buffer, mode="w:gz") as files_archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            files_archive.addfile(info, BytesIO(data))
+
+    return buffer.getvalue()
+
+
+class TestArtifact(unittest.TestCase):
+
+    def test_load(self):
+        buffer = BytesIO()
+        numpy.savez(buffer, counts=numpy.arange(4))
+
+        self.assertEqual(Artifact("r.json", b'{"a": 1}').load(), {"a": 1})
+        self.assertEqual(Artifact("notes.txt", b"hello").load(), "hello")
+        self.assertEqual(Artifact("plot.png", b"\x89PNG").load(), b"\x89PNG")
+        self.assertEqual(
+            list(Artifact("r.npz", buffer.getvalue()).load()["counts"]), [0, 1, 2, 3]
+        )
+
+    def test_mimebundle(self):
+        self.assertEqual(
+            Artifact("plot.png", b"\x89PNG").mimebundle(),
+            {
+                "image/png": base64.b64encode(b"\x89PNG").decode(),
+                "text/plain": "plot.png (4 bytes, image/png)",
+            },
+        )
+        self.assertEqual(
+            Artifact("r.json", b"[1]").mimebundle()["application/json"], [1]
+        )
+        self.assertEqual(
+            Artifact("blob.bin", b"xx").mimebundle(),
+            {"text/plain": "blob.bin (2 bytes, application/octet-stream)"},
+        )
+
+    def test_unpack(self):
+        artifacts = unpack(
+            archive({"b.txt": b"b", "sub/a.json": b"{}", "../escape.txt": b"x"})
+        )
+
+        self.assertEqual([a.name for a in artifacts], ["b.txt", "sub/a.json"])
+
+
+class TestMakeCollected(unittest.TestCase):
+
+    def test_make_collected(self):
+        job = client.V1Job(spec=client.V1JobSpec(template=make_template()))
+
+        make_collected(job)
+
+        spec = job.spec.template.spec
+        program, collector = spec.containers
+        self.assertEqual(program.command, ["python", "-c", RUN_COMMAND])
+        self.assertEqual(program.args, [DONE_MARKER, "python", "/app/main.py"])
+        self.assertIn(
+            client.V1EnvVar(name="Q8S_OUTPUT_DIR", value=ARTIFACTS_PATH), program.env
+        )
+        self.assertEqual(collector.name, COLLECTOR_CONTAINER)
+        self.assertEqual(collector.image, program.image)
+        self.assertEqual(
+            {v.name for v in spec.volumes}, {"app-volume", "q8s-artifacts"}
+        )
+
+
+class TestCommands(unittest.TestCase):
+
+    def test_run_collect_and_archive(self):
+        with tempfile.TemporaryDirectory() as path:
+            done = os.path.join(path, ".q8s-done")
+            collected = os.path.join(path, ".q8s-collected")
+
+            collector = subprocess.Popen(
+                [sys.executable, "-c", COLLECTOR_COMMAND, "30", done, collected]
+            )
+
+            program = subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    RUN_COMMAND,
+                    done,
+                    sys.executable,
+                    "-c",
+                    f"import json; json.dump([1, 2], open({path!r} + '/r.json', 'w'))"
+                    "; raise SystemExit(3)",
+                ]
+            )
+            self.assertEqual(program.returncode, 3)
+            self.assertIsNone(collector.poll())
+
+            output = subprocess.run(
+                [sys.executable, "-c", ARCHIVE_COMMAND, path, collected],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+
+            self.assertEqual(collector.wait(timeout=10), 0)
+            artifacts = unpack(base64.b64decode(output))
+            self.assertEqual([a.name for a in artifacts], ["r.json"])
+            self.assertEqual(artifacts[0].load(), [1, 2])
@@ -1,13 +1,15 @@
+import base64
+from contextlib import redirect_stdout
+import io
 import unittest
-from unittest.mock import patch, MagicMock
 from q8s.matplotlib.backend import Q8SLoggerBackend
+from q8s.protocol import FrameParser
 
 import matplotlib.pyplot as plt
 
 
 class TestQ8SLoggerBackend(unittest.TestCase):
-    @patch("builtins.print")
-    def test_print_png_logs_base64(self, mock_print):
+    def test_print_png_logs_frame(self):
         # Create a simple plot
         fig, ax = plt.subplots()
         ax.plot([0, 1], [0, 1])
@@ -16,12 +18,20 @@ class TestQ8SLoggerBackend(unittest.TestCase):
         canvas = Q8SLoggerBackend(fig)
 
         # Call the print_png method
-        canvas.print_png(None)
-
-        # Check that print was called with the expected base64 string
-        self.assertTrue(mock_print.called)
-        args, _ = mock_print.call_args
-        self.assertTrue(args[0].startswith("data:image/png;base64,"))
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            canvas.print_png(None)
+
+        # Check that the output is a single PNG frame
+        text, frames = [], []
+        parser = FrameParser(text.append, frames.append)
+        parser.write(stdout.getvalue())
+        parser.close()
+
+        self.assertEqual(text, [])
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0].mimetype, "image/png")
+        self.assertTrue(base64.b64decode(frames[0].data).startswith(b"\x89PNG"))
 
 
 if __name__ == "__main__":
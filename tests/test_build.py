@@ -0,0 +1,357 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from rich.console import Console
+from rich.progress import Progress
+
+from q8s.constants import BASE_IMAGES
+from q8s.project import Project
+
+PROJECT = """
+name: Example
+
+python_env:
+  dependencies:
+    - qiskit==1.1.0
+
+targets:
+  cpu:
+    python_env:
+      dependencies:
+        - qiskit-aer==0.15.1
+  gpu:
+    python_env:
+      dependencies:
+        - qiskit-aer-gpu==0.15.1
+  qpu:
+    python_env:
+      dependencies: []
+
+kubeconfig: kubeconfig.yaml
+
+docker:
+  username: example
+"""
+
+
+class TestBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, "Q8Sproject"), "w") as f:
+            f.write(PROJECT)
+
+        # Keep the registry out of the builds
+        patcher = patch("q8s.project.remote_digest", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.project = Project(self.directory.name)
+        self.project.init_cache()
+        self.console = Console(file=open(os.devnull, "w"), record=True)
+        self.progress = Progress(console=self.console)
+
+    def tearDown(self):
+        self.console.file.close()
+        self.directory.cleanup()
+
+    def write_project(self, extra: str):
+        with open(os.path.join(self.directory.name, "Q8Sproject"), "a") as f:
+            f.write(extra)
+
+        self.project = Project(self.directory.name)
+
+    def commands(self, target: str, push: bool = True) -> list[list[str]]:
+        commands = []
+
+        def popen(command, **kwargs):
+            commands.append(command)
+            return subprocess.Popen([sys.executable, "-c", "pass"], **kwargs)
+
+        with patch("q8s.project.Popen", popen):
+            self.project.build_container(target, self.progress, silent=True, push=push)
+
+        return commands
+
+    def test_pip_cache_mount(self):
+        with open(os.path.join(self.directory.name, ".q8s_cache/cpu/Dockerfile")) as f:
+            dockerfile = f.read()
+
+        self.assertTrue(dockerfile.startswith("# syntax=docker/dockerfile:1\n"))
+        self.assertIn(
+            "RUN --mount=type=cache,target=/root/.cache/pip pip install -r requirements.txt",
+            dockerfile,
+        )
+
+    @patch.dict("os.environ", {"SOURCE_DATE_EPOCH": "1700000000"})
+    def test_deterministic_dockerfile(self):
+        path = os.path.join(self.directory.name, ".q8s_cache/gpu/Dockerfile")
+
+        self.project.init_cache()
+        with open(path) as f:
+            dockerfile = f.read()
+
+        time.sleep(0.01)
+        self.project.init_cache()
+        with open(path) as f:
+            self.assertEqual(f.read(), dockerfile)
+
+        self.assertIn(
+            "LABEL org.opencontainers.image.created=2023-11-14T22:13:20+00:00",
+            dockerfile,
+        )
+        self.assertIn("ARG SOURCE_DATE_EPOCH\n", dockerfile)
+        self.assertIn("SOURCE_DATE_EPOCH=1700000000", self.commands("gpu")[0])
+
+    @patch("q8s.project.builder_driver", return_value="docker-container")
+    def test_verify(self, mock_driver):
+        self.write_project("  cache:\n    builder: q8s\n")
+        ids = {
+            "example/q8s-example:cpu": "sha256:built",
+            "example/q8s-example:cpu-verify": "sha256:rebuilt",
+        }
+
+        with patch("q8s.project.local_image_id", lambda image: ids.get(image)):
+            with (
+                patch("q8s.project.Popen") as mock_popen,
+                patch("q8s.project.subprocess.run") as mock_run,
+            ):
+                mock_popen.side_effect = lambda command, **kwargs: subprocess.Popen(
+                    [sys.executable, "-c", "pass"], **kwargs
+                )
+                built, rebuilt = self.project.verify_container(
+                    "cpu", self.progress, silent=True
+                )
+
+        self.assertEqual((built, rebuilt), ("sha256:built", "sha256:rebuilt"))
+        command = mock_popen.call_args[0][0]
+        self.assertIn("--no-cache", command)
+        self.assertNotIn("--cache-to", command)
+        self.assertEqual(
+            command[command.index("--tag") + 1], "example/q8s-example:cpu-verify"
+        )
+        mock_run.assert_called_with(
+            ["docker", "image", "rm", "example/q8s-example:cpu-verify"],
+            capture_output=True,
+        )
+
+    @patch("q8s.project.local_image_id", return_value=None)
+    def test_verify_without_image(self, mock_id):
+        with self.assertRaises(Exception):
+            self.project.verify_container("cpu", self.progress, silent=True)
+
+    @patch("q8s.project.builder_driver", return_value="docker")
+    @patch("q8s.project.local_image_id", return_value="sha256:built")
+    def test_verify_without_builder(self, mock_id, mock_driver):
+        for extra in ["", "  cache:\n    builder: default\n"]:
+            self.write_project(extra)
+
+            with patch("q8s.project.Popen") as mock_popen:
+                with self.assertRaisesRegex(Exception, "docker-container driver"):
+                    self.project.verify_container("cpu", self.progress, silent=True)
+
+            mock_popen.assert_not_called()
+
+    def test_no_layer_cache(self):
+        build, push = self.commands("cpu")
+
+        self.assertNotIn("--cache-from", build)
+        self.assertEqual(push, ["docker", "push", "example/q8s-example:cpu"])
+
+    @patch("q8s.project.builder_driver", return_value="docker-container")
+    def test_layer_cache(self, mock_driver):
+        self.write_project(
+            "  cache:\n"
+            "    directory: .buildcache\n"
+            "    registry: example/q8s-example-cache\n"
+            "    builder: q8s\n"
+        )
+        directory = os.path.join(self.directory.name, ".buildcache", "gpu")
+
+        build, _ = self.commands("gpu")
+
+        self.assertEqual(build[build.index("--builder") + 1], "q8s")
+        self.assertEqual(
+            build[build.index("--output") + 1], "type=docker,rewrite-timestamp=true"
+        )
+        self.assertEqual(
+            [
+                build[i + 1]
+                for i, option in enumerate(build)
+                if option == "--cache-from"
+            ],
+            [
+                f"type=local,src={directory}",
+                "type=registry,ref=example/q8s-example-cache:gpu",
+            ],
+        )
+        self.assertEqual(
+            [build[i + 1] for i, option in enumerate(build) if option == "--cache-to"],
+            [
+                f"type=local,dest={directory},mode=max",
+                "type=registry,ref=example/q8s-example-cache:gpu,mode=max",
+            ],
+        )
+
+    @patch("q8s.project.builder_driver", return_value="docker")
+    def test_layer_cache_without_builder(self, mock_driver):
+        self.write_project(
+            "  cache:\n"
+            "    registry: example/q8s-example-cache\n"
+            "    builder: default\n"
+        )
+
+        build, _ = self.commands("gpu")
+        self.commands("cpu")
+
+        for option in ["--builder", "--output", "--cache-from", "--cache-to"]:
+            self.assertNotIn(option, build)
+        self.assertIn("cannot export caches", self.console.export_text())
+        # Checked once for all the builds
+        mock_driver.assert_called_once_with("default")
+
+    @patch("q8s.project.image_exists", return_value=True)
+    @patch("q8s.project.remote_digest")
+    def test_unchanged_inputs(self, mock_digest, mock_exists):
+        registry = {
+            BASE_IMAGES["cpu"]: "sha256:base",
+            "example/q8s-example:cpu": "sha256:image",
+        }
+        mock_digest.side_effect = registry.get
+
+        self.assertEqual(len(self.commands("cpu")), 2)
+        self.project.update_images_cache()
+
+        self.project = Project(self.directory.name)
+        self.assertEqual(self.commands("cpu"), [])
+        self.assertIn(
+            "example/q8s-example:cpu is up to date", self.console.export_text()
+        )
+
+        # A new dependency
+        with open(
+            os.path.join(self.directory.name, ".q8s_cache/cpu/requirements.txt"), "a"
+        ) as f:
+            f.write("numpy\n")
+        self.assertEqual(len(self.commands("cpu")), 2)
+
+        # A new base image
+        registry[BASE_IMAGES["cpu"]] = "sha256:updated"
+        self.assertEqual(len(self.commands("cpu")), 2)
+
+        # The tag pushed over by another build
+        registry["example/q8s-example:cpu"] = "sha256:other"
+        self.assertEqual(len(self.commands("cpu")), 2)
+        self.assertEqual(self.commands("cpu"), [])
+
+    @patch("q8s.project.image_exists", return_value=True)
+    @patch("q8s.project.remote_digest", return_value="sha256:base")
+    def test_unchanged_inputs_dry_run(self, mock_digest, mock_exists):
+        self.assertEqual(len(self.commands("cpu", push=False)), 1)
+        self.assertEqual(self.commands("cpu", push=False), [])
+        mock_exists.assert_called_with("example/q8s-example:cpu", False)
+
+        # An image removed from the daemon
+        mock_exists.return_value = False
+        self.assertEqual(len(self.commands("cpu", push=False)), 1)
+
+    @patch("q8s.project.remote_digest", return_value="sha256:image")
+    def test_pinned_image(self, mock_digest):
+        self.commands("cpu")
+        self.project.update_images_cache()
+
+        self.assertEqual(
+            self.project.cached_images("cpu"), "example/q8s-example:cpu@sha256:image"
+        )
+
+        self.commands("gpu", push=False)
+        self.project.update_images_cache()
+
+        self.assertEqual(self.project.cached_images("gpu"), "example/q8s-example:gpu")
+
+    @patch("q8s.project.image_exists", return_value=True)
+    @patch("q8s.project.remote_digest", return_value=None)
+    def test_unknown_base_image(self, mock_digest, mock_exists):
+        self.commands("cpu")
+
+        self.assertEqual(len(self.commands("cpu")), 2)
+
+    @patch("q8s.project.Project._Project__up_to_date", return_value=True)
+    def test_forced_builds(self, mock_up_to_date):
+        def popen(command, **kwargs):
+            commands.append(command)
+            return subprocess.Popen([sys.executable, "-c", "pass"], **kwargs)
+
+        commands = []
+        with patch("q8s.project.Popen", popen):
+            self.project.build_containers(["cpu"], self.progress, silent=True)
+        self.assertEqual(commands, [])
+
+        with patch("q8s.project.Popen", popen):
+            failures = self.project.build_containers(
+                ["cpu"], self.progress, silent=True, force=True
+            )
+        self.assertEqual(failures, {})
+        self.assertEqual(len(commands), 2)
+
+    def test_images_cache_of_names(self):
+        with open(os.path.join(self.directory.name, ".q8s_cache/images"), "w") as f:
+            f.write("cpu: example/q8s-example:cpu\n")
+
+        project = Project(self.directory.name)
+
+        self.assertEqual(project.cached_images("cpu"), "example/q8s-example:cpu")
+
+    def test_parallel_builds(self):
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        def build_container(target, progress, silent, push=True, force=False):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.1)
+            with lock:
+                running[0] -= 1
+
+            if target == "gpu":
+                raise Exception("Failed to build the container")
+
+        with patch.object(self.project, "build_container", build_container):
+            failures = self.project.build_containers(
+                ["cpu", "gpu", "qpu"], self.progress, silent=True, parallelism=2
+            )
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(list(failures), ["gpu"])
+        self.assertEqual(str(failures["gpu"]), "Failed to build the container")
+
+    def test_output_per_target(self):
+        def popen(command, **kwargs):
+            # Stand in for docker, failing the push of the gpu image
+            code = "print('step 1')\nprint('step 2')\n"
+            if command[:2] == ["docker", "push"] and command[2].endswith(":gpu"):
+                code += "raise SystemExit(1)"
+            return subprocess.Popen([sys.executable, "-c", code], **kwargs)
+
+        with patch("q8s.project.Popen", popen):
+            failures = self.project.build_containers(
+                ["cpu", "gpu"], self.progress, silent=False
+            )
+
+        output = self.console.export_text()
+
+        self.assertEqual(list(failures), ["gpu"])
+        self.assertEqual(output.count("cpu | step 1"), 2)
+        self.assertEqual(output.count("gpu | step 2"), 2)
+        self.assertIn("gpu: Failed to push the container", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import base64
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from kubernetes import client
+
+from q8s.bundle import (
+    BUNDLE_PATH,
+    UNPACK_COMMAND,
+    collect_modules,
+    make_bundled,
+    pack,
+    part_names,
+    split,
+)
+from tests.test_pool import make_template
+
+
+class TestBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        return path
+
+    def test_collect_modules(self):
+        entry = self.write(
+            "main.py", "import os\nimport helpers\nfrom .circuits import ghz\n"
+        )
+        self.write("helpers.py", "from . import shared\n")
+        self.write("shared.py", "VALUE = 1\n")
+        self.write("circuits/__init__.py", "")
+        self.write("circuits/ghz.py", "import main\n")
+        self.write("circuits/__pycache__/ghz.py", "")
+        self.write("unused.py", "")
+
+        self.assertEqual(
+            sorted(collect_modules(entry)),
+            ["circuits/__init__.py", "circuits/ghz.py", "helpers.py", "shared.py"],
+        )
+
+    def test_pack_is_deterministic(self):
+        files = {"main.py": "print(1)\n", "b.py": "x = 1\n"}
+
+        self.assertEqual(pack(files), pack(dict(reversed(files.items()))))
+
+    def test_split(self):
+        parts = split(b"abcdefg", size=3)
+
+        self.assertEqual(
+            [base64.b64decode(list(part.values())[0]) for part in parts],
+            [b"abc", b"def", b"g"],
+        )
+        self.assertEqual(
+            [list(part)[0] for part in parts], ["part-000", "part-001", "part-002"]
+        )
+        self.assertEqual(part_names("job", 3), ["job", "job-1", "job-2"])
+
+    def test_make_bundled(self):
+        job = client.V1Job(
+            metadata=client.V1ObjectMeta(labels={}),
+            spec=client.V1JobSpec(template=make_template()),
+        )
+
+        make_bundled(job, ["job", "job-1"])
+
+        spec = job.spec.template.spec
+        self.assertEqual(spec.containers[0].command[:2], ["python", "-c"])
+        self.assertEqual(
+            {m.name: m.mount_path for m in spec.containers[0].volume_mounts},
+            {"bundle": BUNDLE_PATH, "app-volume": "/app"},
+        )
+        volumes = {volume.name: volume for volume in spec.volumes}
+        self.assertIsNotNone(volumes["app-volume"].empty_dir)
+        self.assertEqual(
+            [s.config_map.name for s in volumes["bundle"].projected.sources],
+            ["job", "job-1"],
+        )
+
+    def test_unpack_and_run(self):
+        archive = pack(
+            {
+                "main.py": "import helpers\nhelpers.hello()\n# " + "x" * 5000,
+                "helpers.py": "def hello():\n    print('hello')\n",
+            }
+        )
+        parts = self.root / "parts"
+        workspace = self.root / "workspace"
+        parts.mkdir()
+        workspace.mkdir()
+
+        for part in split(archive, size=100):
+            for key, value in part.items():
+                (parts / key).write_bytes(base64.b64decode(value))
+
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                UNPACK_COMMAND,
+                str(parts),
+                str(workspace),
+                os.path.join(workspace, "main.py"),
+            ],
+            capture_output=True,
+            text=True,
+        )
+
+        self.assertEqual(process.stdout, "hello\n", process.stderr)
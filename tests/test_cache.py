@@ -0,0 +1,112 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from q8s.cache import ResultCache, resolve_image_digest
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.directory.name, size=150)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get("key"))
+
+        self.cache.put("key", "output", "stdout")
+
+        self.assertEqual(self.cache.get("key"), ("output", "stdout"))
+
+    def test_least_recently_used_evicted(self):
+        self.cache.put("a", "a" * 30, "stdout")
+        self.cache.put("b", "b" * 30, "stdout")
+        # Make "a" older than "b", then use it
+        os.utime(os.path.join(self.directory.name, "a.json"), (0, 0))
+        self.cache.get("a")
+        os.utime(os.path.join(self.directory.name, "b.json"), (1, 1))
+
+        self.cache.put("c", "c" * 30, "stdout")
+
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_failure_not_stored(self):
+        self.cache.run("key", lambda forward: ("error", "stderr"))
+
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_streamed_output_replayed(self):
+        def execute(forward):
+            forward("streamed\n")
+            return "rest", "stdout"
+
+        chunks = []
+        self.assertEqual(
+            self.cache.run("key", execute, chunks.append), ("rest", "stdout")
+        )
+        self.assertEqual(chunks, ["streamed\n"])
+
+        chunks = []
+        self.assertEqual(self.cache.run("key", execute, chunks.append), ("", "stdout"))
+        self.assertEqual(chunks, ["streamed\nrest"])
+
+    def test_single_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+
+        def execute(forward):
+            runs.append(1)
+            started.set()
+            release.wait(5)
+            return "output", "stdout"
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(self.cache.run("key", execute))
+        )
+        leader.start()
+        started.wait(5)
+
+        with patch.object(self.cache, "get", return_value=None):
+            follower = threading.Thread(
+                target=lambda: results.append(self.cache.run("key", execute))
+            )
+            follower.start()
+            release.set()
+            follower.join(5)
+
+        leader.join(5)
+
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(results, [("output", "stdout")] * 2)
+
+
+class TestResolveImageDigest(unittest.TestCase):
+
+    def test_pinned_image(self):
+        self.assertEqual(resolve_image_digest("user/image@sha256:abc"), "sha256:abc")
+
+    @patch("q8s.cache.subprocess.run")
+    def test_local_image(self, mock_run):
+        mock_run.return_value.returncode = 0
+        mock_run.return_value.stdout = (
+            '["other/image@sha256:def","user/image@sha256:abc"]\n'
+        )
+
+        self.assertEqual(resolve_image_digest("user/image:gpu"), "sha256:abc")
+
+    @patch("q8s.cache.subprocess.run", side_effect=FileNotFoundError)
+    def test_unresolved_image(self, mock_run):
+        self.assertIsNone(resolve_image_digest("user/image:gpu"))
+
+
+if __name__ == "__main__":
+    unittest.main()
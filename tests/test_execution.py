@@ -0,0 +1,443 @@
+from datetime import datetime, timedelta, timezone
+import io
+import tempfile
+import unittest
+from unittest.mock import MagicMock, call, patch
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from rich.console import Console
+from rich.progress import Progress
+
+from q8s.artifacts import Artifact
+from q8s.bundle import part_names, split
+from q8s.cache import ResultCache
+from q8s.enums import Cleanup, Target
+from q8s.execution import LAST_USED_ANNOTATION, K8sContext
+from q8s.project import Q8SPoolPolicy
+from q8s.sweep import SweepResult
+from q8s.watcher import WatchTimeoutException
+
+
+def make_context():
+    with patch("q8s.execution.config") as mock_config:
+        mock_config.list_kube_config_contexts.return_value = (
+            None,
+            {"context": {"namespace": "test"}},
+        )
+        context = K8sContext("kubeconfig", progress=Progress(disable=True))
+
+    context.set_target(Target.cpu)
+    context.set_container_image("user/image:cpu")
+
+    return context
+
+
+@patch("q8s.execution.load_env", return_value={"KEY1": "value123"})
+@patch("q8s.execution.client.BatchV1Api")
+@patch("q8s.execution.client.CoreV1Api")
+class TestK8sContext(unittest.TestCase):
+
+    def test_suspended_start(self, MockCoreV1Api, MockBatchV1Api, mock_load_env):
+        calls = MagicMock()
+        MockCoreV1Api.return_value = calls.core
+        MockBatchV1Api.return_value = calls.batch
+
+        def create_job(body, namespace):
+            body.metadata.uid = "uid"
+            return body
+
+        calls.batch.create_namespaced_job.side_effect = create_job
+
+        context = make_context()
+        context.set_suspended_start(True)
+
+        context._K8sContext__create_job_object("print('hello')")
+
+        names = [c[0] for c in calls.mock_calls]
+        self.assertEqual(
+            names,
+            [
+                "batch.create_namespaced_job",
+                "core.create_namespaced_config_map",
+                "core.patch_namespaced_secret",
+                "batch.patch_namespaced_job",
+            ],
+        )
+        job = calls.batch.create_namespaced_job.call_args.kwargs["body"]
+        self.assertTrue(job.spec.suspend)
+        calls.batch.patch_namespaced_job.assert_called_once_with(
+            context.name, "test", {"spec": {"suspend": False}}
+        )
+        self.assertEqual(
+            set(context.startup_latency),
+            {"job", "config_map", "environment", "release"},
+        )
+        self.assertEqual(
+            [span.name for span in context.timings.spans],
+            ["job", "config_map", "environment", "release"],
+        )
+
+    def test_environment_secret_is_shared(
+        self, MockCoreV1Api, MockBatchV1Api, mock_load_env
+    ):
+        core = MockCoreV1Api.return_value
+        core.patch_namespaced_secret.side_effect = ApiException(status=404)
+
+        context = make_context()
+        fork = context.fork()
+
+        self.assertNotEqual(context.name, fork.name)
+        self.assertEqual(
+            context.environment_secret_name(), fork.environment_secret_name()
+        )
+
+        fork._K8sContext__create_environment_secret()
+
+        secret = core.create_namespaced_secret.call_args.kwargs["body"]
+        self.assertEqual(secret.metadata.name, context.environment_secret_name())
+        self.assertTrue(secret.immutable)
+        self.assertIn(LAST_USED_ANNOTATION, secret.metadata.annotations)
+
+    def test_shared_secret_marked_as_used(
+        self, MockCoreV1Api, MockBatchV1Api, mock_load_env
+    ):
+        core = MockCoreV1Api.return_value
+
+        context = make_context()
+        context._K8sContext__create_environment_secret()
+
+        name, namespace, body = core.patch_namespaced_secret.call_args.args
+        self.assertEqual(name, context.environment_secret_name())
+        self.assertIn(LAST_USED_ANNOTATION, body["metadata"]["annotations"])
+        core.create_namespaced_secret.assert_not_called()
+
+    def test_collect_garbage(self, MockCoreV1Api, MockBatchV1Api, mock_load_env):
+        core = MockCoreV1Api.return_value
+        batch = MockBatchV1Api.return_value
+        now = datetime.now(timezone.utc)
+
+        def secret(name, age, used=None):
+            return client.V1Secret(
+                metadata=client.V1ObjectMeta(
+                    name=name,
+                    creation_timestamp=now - timedelta(seconds=age),
+                    annotations=(
+                        None
+                        if used is None
+                        else {
+                            LAST_USED_ANNOTATION: (
+                                now - timedelta(seconds=used)
+                            ).isoformat()
+                        }
+                    ),
+                    resource_version="1",
+                )
+            )
+
+        core.list_namespaced_secret.return_value = client.V1SecretList(
+            items=[
+                secret("q8s-env-used", 3600),
+                secret("q8s-env-old", 3600),
+                secret("q8s-env-new", 10),
+                secret("q8s-env-reused", 3600, used=10),
+                secret("q8s-env-stale", 3600, used=3600),
+            ]
+        )
+
+        def delete_secret(name, namespace, body):
+            # Marked as used after the list
+            if name == "q8s-env-stale":
+                raise ApiException(status=409)
+
+        core.delete_namespaced_secret.side_effect = delete_secret
+        container = client.V1Container(
+            name="quantum-routine",
+            env=[
+                client.V1EnvVar(
+                    name="KEY1",
+                    value_from=client.V1EnvVarSource(
+                        secret_key_ref=client.V1SecretKeySelector(
+                            name="q8s-env-used", key="KEY1"
+                        )
+                    ),
+                )
+            ],
+        )
+        batch.list_namespaced_job.return_value = client.V1JobList(
+            items=[
+                client.V1Job(
+                    spec=client.V1JobSpec(
+                        template=client.V1PodTemplateSpec(
+                            spec=client.V1PodSpec(containers=[container])
+                        )
+                    )
+                )
+            ]
+        )
+        core.list_namespaced_pod.return_value = client.V1PodList(items=[])
+
+        context = make_context()
+
+        self.assertEqual(context.collect_garbage(grace=600), 1)
+        self.assertEqual(
+            [c.args for c in core.delete_namespaced_secret.call_args_list],
+            [("q8s-env-old", "test"), ("q8s-env-stale", "test")],
+        )
+        body = core.delete_namespaced_secret.call_args.kwargs["body"]
+        self.assertEqual(body.preconditions.resource_version, "1")
+
+    @patch("q8s.execution.threading.Thread")
+    def test_server_cleanup(
+        self, MockThread, MockCoreV1Api, MockBatchV1Api, mock_load_env
+    ):
+        MockThread.side_effect = lambda target, args, daemon: MagicMock(
+            start=lambda: target(*args)
+        )
+        core = MockCoreV1Api.return_value
+        batch = MockBatchV1Api.return_value
+        batch.create_namespaced_job.side_effect = self.create_job
+
+        context = make_context()
+        context.set_cleanup(Cleanup.server, job_ttl=60)
+        previous = context.name
+
+        context._K8sContext__create_job_object("print('hello')")
+        context._K8sContext__delete_job()
+
+        job = batch.create_namespaced_job.call_args.kwargs["body"]
+        self.assertNotEqual(job.metadata.name, previous)
+        self.assertEqual(job.spec.ttl_seconds_after_finished, 60)
+
+        config_map = core.create_namespaced_config_map.call_args.kwargs["body"]
+        self.assertEqual(config_map.metadata.owner_references[0].uid, "uid")
+
+        core.delete_namespaced_config_map.assert_not_called()
+        batch.delete_namespaced_job.assert_called_once()
+        self.assertEqual(
+            batch.delete_namespaced_job.call_args.kwargs["body"].propagation_policy,
+            "Background",
+        )
+
+    def test_auto_target(self, MockCoreV1Api, MockBatchV1Api, mock_load_env):
+        context = make_context()
+        context.set_target(Target.auto)
+        context.set_target_images({"cpu": "user/image:cpu", "gpu": "user/image:gpu"})
+        context.set_cleanup(Cleanup.ttl)
+
+        jobs = []
+
+        def execute(code, on_output=None, modules=None):
+            jobs.append(context.create_job_object(code))
+            return "", "stdout"
+
+        with patch.object(context, "_K8sContext__execute", execute):
+            context.execute("from qiskit import QuantumCircuit\nQuantumCircuit(3)")
+
+        container = jobs[0].spec.template.spec.containers[0]
+        self.assertEqual(container.image, "user/image:cpu")
+        self.assertEqual(container.resources.requests, {"memory": "257Mi"})
+        self.assertEqual(context.routing.target, Target.cpu)
+        self.assertEqual(context.target, Target.auto)
+        self.assertIsNone(context.resources)
+
+    def test_bundle(self, MockCoreV1Api, MockBatchV1Api, mock_load_env):
+        core = MockCoreV1Api.return_value
+        batch = MockBatchV1Api.return_value
+
+        def create_job(body, namespace):
+            body.metadata.uid = "uid"
+            return body
+
+        batch.create_namespaced_job.side_effect = create_job
+
+        context = make_context()
+
+        with patch("q8s.execution.split", side_effect=lambda data: split(data, 64)):
+            context._K8sContext__create_job_object(
+                "import helpers", modules={"helpers.py": "print('hello')"}
+            )
+
+        config_maps = [
+            c.kwargs["body"] for c in core.create_namespaced_config_map.call_args_list
+        ]
+        names = [config_map.metadata.name for config_map in config_maps]
+        self.assertGreater(len(names), 1)
+        self.assertEqual(names, part_names(context.name, len(names)))
+        self.assertTrue(all(c.data is None and c.binary_data for c in config_maps))
+
+        job = batch.create_namespaced_job.call_args.kwargs["body"]
+        sources = next(
+            v for v in job.spec.template.spec.volumes if v.name == "bundle"
+        ).projected.sources
+        self.assertEqual([s.config_map.name for s in sources], names)
+
+        context.set_cleanup(Cleanup.client)
+        context._K8sContext__delete_job()
+        self.assertEqual(
+            [c.args[0] for c in core.delete_namespaced_config_map.call_args_list],
+            names,
+        )
+
+    @patch("q8s.execution.collect_artifacts")
+    @patch("q8s.execution.resumable_watch")
+    def test_artifacts(
+        self,
+        mock_watch,
+        mock_collect,
+        MockCoreV1Api,
+        MockBatchV1Api,
+        mock_load_env,
+    ):
+        batch = MockBatchV1Api.return_value
+
+        def create_job(body, namespace):
+            body.metadata.uid = "uid"
+            return body
+
+        batch.create_namespaced_job.side_effect = create_job
+        artifacts = [Artifact("result.json", b"{}")]
+        mock_collect.return_value = artifacts
+
+        def pod(terminated):
+            return client.V1Pod(
+                metadata=client.V1ObjectMeta(name="pod"),
+                status=client.V1PodStatus(
+                    phase="Running",
+                    container_statuses=[
+                        client.V1ContainerStatus(
+                            name="quantum-routine",
+                            image="image",
+                            image_id="",
+                            ready=not terminated,
+                            restart_count=0,
+                            state=client.V1ContainerState(
+                                terminated=(
+                                    client.V1ContainerStateTerminated(exit_code=0)
+                                    if terminated
+                                    else None
+                                ),
+                                running=(
+                                    None
+                                    if terminated
+                                    else client.V1ContainerStateRunning()
+                                ),
+                            ),
+                        )
+                    ],
+                ),
+            )
+
+        mock_watch.return_value = iter([{"object": pod(False)}, {"object": pod(True)}])
+
+        context = make_context()
+        context.set_artifacts(True)
+        context._K8sContext__create_job_object("print('hello')")
+
+        job = batch.create_namespaced_job.call_args.kwargs["body"]
+        self.assertEqual(
+            [c.name for c in job.spec.template.spec.containers],
+            ["quantum-routine", "q8s-collector"],
+        )
+
+        context._K8sContext__collect_artifacts()
+
+        mock_collect.assert_called_once_with(context.exec_api_instance, "pod", "test")
+        self.assertEqual(context.artifacts, artifacts)
+        self.assertEqual([span.name for span in context.timings.spans][-1], "artifacts")
+
+    def test_ttl_cleanup(self, MockCoreV1Api, MockBatchV1Api, mock_load_env):
+        context = make_context()
+        context.set_cleanup(Cleanup.ttl)
+
+        context._K8sContext__delete_job()
+
+        MockBatchV1Api.return_value.delete_namespaced_job.assert_not_called()
+
+    @patch("q8s.execution.resolve_image_digest", return_value="sha256:abc")
+    def test_cached_result(
+        self, mock_digest, MockCoreV1Api, MockBatchV1Api, mock_load_env
+    ):
+        context = make_context()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        context.set_result_cache(ResultCache(directory.name))
+
+        with patch.object(
+            context,
+            "_K8sContext__execute_and_record",
+            return_value=("hello\n", "stdout"),
+        ) as mock_execute:
+            self.assertEqual(context.execute("print('hello')"), ("hello\n", "stdout"))
+            self.assertFalse(context.cached)
+
+            self.assertEqual(context.execute("print('hello')"), ("hello\n", "stdout"))
+            self.assertTrue(context.cached)
+
+            context.execute("print('hello')", cache=False)
+            self.assertFalse(context.cached)
+
+        self.assertEqual(mock_execute.call_count, 2)
+
+        # The digest is looked up once per image, forks included
+        context.fork().result_key("print('other')")
+        mock_digest.assert_called_once_with("user/image:cpu")
+
+    @patch("q8s.execution.WarmPool")
+    def test_pool_of_previous_target_stopped(
+        self, MockWarmPool, MockCoreV1Api, MockBatchV1Api, mock_load_env
+    ):
+        cpu_pool, gpu_pool = MagicMock(), MagicMock()
+        MockWarmPool.side_effect = [cpu_pool, gpu_pool]
+
+        context = make_context()
+
+        with patch.object(context, "_K8sContext__pod_template"):
+            context.set_pool_policy(Q8SPoolPolicy(size=1))
+            context.set_target(Target.gpu)
+            context.set_pool_policy(Q8SPoolPolicy(size=1))
+
+        cpu_pool.shutdown.assert_called_once()
+        gpu_pool.shutdown.assert_not_called()
+
+        context.set_target(Target.local)
+        context.set_pool_policy(None)
+
+        gpu_pool.shutdown.assert_called_once()
+
+    def test_sweep_timeout(self, MockCoreV1Api, MockBatchV1Api, mock_load_env):
+        parameters = [{"shots": 1}, {"shots": 2}]
+        results = [
+            SweepResult(0, parameters[0], "Succeeded", "done"),
+            SweepResult(1, parameters[1], "Running", ""),
+        ]
+        console = Console(file=io.StringIO(), width=200)
+
+        context = make_context()
+        context.set_timeout(10)
+        context._K8sContext__progress = Progress(console=console, disable=True)
+
+        with patch.multiple(
+            context,
+            _K8sContext__create_job_object=MagicMock(),
+            _K8sContext__complete_and_get_job_status=MagicMock(
+                side_effect=WatchTimeoutException
+            ),
+            _K8sContext__collect_sweep_results=MagicMock(return_value=results),
+            _K8sContext__delete_job=MagicMock(),
+        ):
+            self.assertEqual(context.sweep("print('hello')", parameters), results)
+            context._K8sContext__delete_job.assert_called_once()
+
+        self.assertIn(
+            "Sweep did not finish within 10 seconds, completed indexes: 0",
+            console.file.getvalue(),
+        )
+
+    @staticmethod
+    def create_job(body, namespace):
+        body.metadata.uid = "uid"
+        return body
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
 from unittest.mock import MagicMock, patch
-from q8s.kernel import Q8sKernel, kernel_comm_identifier
+from q8s.kernel import NO_CACHE_COMMENT, Q8sKernel, kernel_comm_identifier
+from q8s.enums import Target
+from q8s.timings import Timings
 
 
 class TestQ8sKernel(unittest.TestCase):
@@ -127,6 +129,126 @@ class TestQ8sKernel(unittest.TestCase):
         # Assert set_target was called on k8s_context with the correct argument
         mock_k8s_context.set_target.assert_called_once_with("cpu")
 
+    @patch("q8s.kernel.Project")
+    @patch("q8s.kernel.K8sContext")
+    @patch.dict(
+        "os.environ",
+        {"KUBECONFIG": "kubeconfig", "DOCKER_IMAGE": "mock_image", "Q8S_SESSION": "1"},
+    )
+    def send_set_target(self, target, MockK8sContext, MockProject):
+        mock_k8s_context = MockK8sContext.return_value
+        mock_k8s_context.target = Target.cpu
+        mock_k8s_context.set_target.side_effect = lambda target: setattr(
+            mock_k8s_context, "target", target
+        )
+        # Like the project, which only knows the cluster targets
+        MockProject.return_value.pool_policy.side_effect = Exception("Target not found")
+
+        kernel = Q8sKernel()
+        mock_k8s_context.reset_mock()
+
+        kernel.comm_manager.comm_open(
+            stream=None,
+            ident=None,
+            msg={
+                "header": {"msg_type": "comm_open"},
+                "content": {
+                    "comm_id": "mock_comm_id",
+                    "target_name": kernel_comm_identifier,
+                },
+            },
+        )
+        kernel.comm_manager.comm_msg(
+            ident=None,
+            stream=None,
+            msg={
+                "header": {"msg_type": "comm_msg"},
+                "content": {
+                    "comm_id": "mock_comm_id",
+                    "data": {
+                        "command": "set_target",
+                        "payload": {"target": target},
+                    },
+                },
+            },
+        )
+
+        return mock_k8s_context
+
+    @patch("q8s.kernel.Project")
+    @patch("q8s.kernel.K8sContext")
+    def start_kernel(self, target, MockK8sContext, MockProject):
+        mock_k8s_context = MockK8sContext.return_value
+        mock_k8s_context.set_target.side_effect = lambda target: setattr(
+            mock_k8s_context, "target", target
+        )
+
+        with patch.dict(
+            "os.environ",
+            {
+                "KUBECONFIG": "kubeconfig",
+                "DOCKER_IMAGE": "mock_image",
+                "Q8S_TARGET": target,
+            },
+        ):
+            kernel = Q8sKernel()
+
+        return kernel, mock_k8s_context, MockProject.return_value
+
+    def test_start_on_auto_target(self):
+        _, mock_k8s_context, mock_project = self.start_kernel("auto")
+
+        mock_k8s_context.set_target.assert_called_once_with(Target.auto)
+        mock_k8s_context.set_target_images.assert_called_once_with(
+            mock_project.routed_images.return_value
+        )
+        mock_k8s_context.set_pool_policy.assert_not_called()
+
+    def test_start_on_local_target(self):
+        _, mock_k8s_context, mock_project = self.start_kernel("local")
+
+        mock_k8s_context.set_target.assert_called_once_with(Target.local)
+        mock_k8s_context.set_target_images.assert_not_called()
+        mock_k8s_context.set_pool_policy.assert_not_called()
+
+    def test_cached_result(self):
+        kernel, mock_k8s_context, _ = self.start_kernel("cpu")
+        mock_k8s_context.execute.return_value = ("", "stdout")
+        mock_k8s_context.artifacts = []
+        mock_k8s_context.timings = Timings()
+
+        with patch.object(kernel, "send_response") as mock_send:
+            mock_k8s_context.cached = True
+            kernel.do_execute("print('hello')", silent=False)
+            self.assertTrue(mock_k8s_context.execute.call_args.kwargs["cache"])
+            self.assertIn(
+                "Cached result",
+                mock_send.call_args_list[-1].args[2]["data"]["text/plain"],
+            )
+
+            mock_send.reset_mock()
+            mock_k8s_context.cached = False
+            kernel.do_execute(f"{NO_CACHE_COMMENT}\nprint('hello')", silent=False)
+            self.assertFalse(mock_k8s_context.execute.call_args.kwargs["cache"])
+            self.assertNotIn(
+                "display_data", [c.args[1] for c in mock_send.call_args_list]
+            )
+
+    def test_set_target_local_resets_pool_and_session(self):
+        mock_k8s_context = self.send_set_target("local")
+
+        mock_k8s_context.set_target.assert_called_once_with(Target.local)
+        mock_k8s_context.set_pool_policy.assert_called_once_with(None)
+        mock_k8s_context.set_session.assert_called_once_with(True)
+
+    def test_set_target_auto_resets_pool_and_session(self):
+        mock_k8s_context = self.send_set_target("auto")
+
+        mock_k8s_context.set_target.assert_called_once_with(Target.auto)
+        mock_k8s_context.set_target_images.assert_called_once()
+        mock_k8s_context.set_pool_policy.assert_called_once_with(None)
+        mock_k8s_context.set_session.assert_called_once_with(True)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from q8s.enums import Target
+from q8s.plugins.local_job import LocalJobTemplatePlugin
+
+
+class TestLocalJobTemplatePlugin(unittest.TestCase):
+
+    def setUp(self):
+        self.plugin = LocalJobTemplatePlugin()
+
+    def run_code(
+        self, code, env={}, timeout=30, on_output=None, target=Target.local, files={}
+    ):
+        return self.plugin.run(
+            code=code,
+            env=env,
+            target=target,
+            timeout=timeout,
+            on_output=on_output,
+            files=files,
+        )
+
+    def test_other_targets(self):
+        self.assertIsNone(self.run_code("print('hello')", target=Target.cpu))
+
+    def test_output(self):
+        output, stream = self.run_code("print('hello')")
+
+        self.assertEqual(output, "hello\n")
+        self.assertEqual(stream, "stdout")
+
+    def test_error(self):
+        output, stream = self.run_code("import sys\nprint('out')\nsys.exit('failed')")
+
+        self.assertEqual(stream, "stderr")
+        self.assertIn("out\n", output)
+        self.assertIn("failed", output)
+
+    def test_environment(self):
+        output, _ = self.run_code(
+            "import os\nprint(os.environ['TOKEN'], os.environ['MPLBACKEND'])",
+            env={"TOKEN": "secret", "UNSET": None},
+        )
+
+        self.assertEqual(output, "secret module://q8s.matplotlib.backend\n")
+
+    def test_isolated_workspace(self):
+        output, _ = self.run_code("import os\nprint(sorted(os.listdir('.')))")
+
+        self.assertEqual(output, "['main.py']\n")
+
+    def test_modules(self):
+        output, _ = self.run_code(
+            "from helpers.greeting import hello\nhello()",
+            files={
+                "helpers/__init__.py": "",
+                "helpers/greeting.py": "def hello():\n    print('hello')",
+            },
+        )
+
+        self.assertEqual(output, "hello\n")
+
+    def test_follow(self):
+        chunks = []
+
+        output, stream = self.run_code(
+            "for i in range(3):\n    print(i)", on_output=chunks.append
+        )
+
+        self.assertEqual(output, "")
+        self.assertEqual(stream, "stdout")
+        self.assertEqual("".join(chunks), "0\n1\n2\n")
+
+    def test_timeout(self):
+        output, stream = self.run_code("import time\ntime.sleep(10)", timeout=0.5)
+
+        self.assertEqual(output, "Execution did not finish within 0.5 seconds")
+        self.assertEqual(stream, "stderr")
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from q8s.logs import BoundedOutput, StreamBatcher, iter_text
+
+
+class TestIterText(unittest.TestCase):
+    def test_split_multibyte_character(self):
+        response = MagicMock()
+        data = "ψ = |00⟩\n".encode()
+        response.stream.return_value = iter([data[:3], data[3:10], data[10:]])
+
+        self.assertEqual("".join(iter_text(response)), "ψ = |00⟩\n")
+        response.release_conn.assert_called_once()
+
+
+class TestStreamBatcher(unittest.TestCase):
+    def test_batches_by_size(self):
+        batches = []
+        batcher = StreamBatcher(batches.append, size=10, interval=60)
+
+        for i in range(6):
+            batcher.write(f"{i}...\n")
+        self.assertEqual(batches, ["0...\n1...\n", "2...\n3...\n", "4...\n5...\n"])
+
+        batcher.write("6")
+        batcher.flush()
+        self.assertEqual(batches[-1], "6")
+
+    def test_batches_by_time(self):
+        batches = []
+        batcher = StreamBatcher(batches.append, size=1024, interval=0.05)
+
+        batcher.write("first\n")
+        batcher.write("second\n")
+        self.assertEqual(batches, [])
+
+        deadline = time.monotonic() + 5
+        while not batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(batches, ["first\nsecond\n"])
+
+
+class TestBoundedOutput(unittest.TestCase):
+    def write(self, output, text, size=3):
+        for start in range(0, len(text), size):
+            output.write(text[start : start + size])
+
+    def test_short_output(self):
+        output = BoundedOutput(head=10, tail=10)
+        self.write(output, "hello\n")
+
+        self.assertEqual(output.close(), "hello\n")
+
+    def test_head_and_tail(self):
+        output = BoundedOutput(head=4, tail=5)
+        self.write(output, "0123456789abcdefghij")
+
+        self.assertEqual(output.omitted, 11)
+        self.assertEqual(output.close(), "0123\n[... 11 characters omitted ...]\nfghij")
+
+    def test_no_limit(self):
+        output = BoundedOutput(head=-1, tail=0)
+        self.write(output, "x" * 100)
+
+        self.assertEqual(output.close(), "x" * 100)
+
+    def test_follow(self):
+        chunks = []
+        output = BoundedOutput(head=4, tail=2, on_output=chunks.append)
+        self.write(output, "0123456789")
+
+        self.assertEqual("".join(chunks), "0123")
+        self.assertEqual(output.close(), "")
+        self.assertEqual("".join(chunks), "0123\n[... 4 characters omitted ...]\n89")
+
+    def test_spill(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "output.log")
+            output = BoundedOutput(head=2, tail=2, spill=path)
+            self.write(output, "0123456789")
+
+            self.assertEqual(
+                output.close(), f"01\n[... 6 characters omitted, see {path} ...]\n89"
+            )
+            with open(path) as f:
+                self.assertEqual(f.read(), "0123456789")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from q8s.enums import Target
+from q8s.plugins.cpu_job import CPUJobTemplatePlugin
+from q8s.plugins.cuda_job import CUDAJobTemplatePlugin
+
+
+class TestImagePullPolicy(unittest.TestCase):
+
+    def makejob(self, plugin, target, image):
+        template = plugin.makejob(
+            name="q8s-job",
+            registry_pat=None,
+            registry_credentials_secret_name="q8s-job-regcred",
+            container_image=image,
+            env=[],
+            target=target,
+        )
+
+        return template.spec.containers[0]
+
+    def test_pinned_image(self):
+        image = "user/q8s-example:gpu@sha256:abc"
+
+        for plugin, target in (
+            (CPUJobTemplatePlugin(), Target.cpu),
+            (CUDAJobTemplatePlugin(), Target.gpu),
+        ):
+            container = self.makejob(plugin, target, image)
+
+            self.assertEqual(container.image, image)
+            self.assertEqual(container.image_pull_policy, "IfNotPresent")
+
+    def test_tagged_image(self):
+        for plugin, target in (
+            (CPUJobTemplatePlugin(), Target.cpu),
+            (CUDAJobTemplatePlugin(), Target.gpu),
+        ):
+            container = self.makejob(plugin, target, "user/q8s-example:gpu")
+
+            self.assertEqual(container.image_pull_policy, "Always")
+
+
+if __name__ == "__main__":
+    unittest.main()
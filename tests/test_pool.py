@@ -0,0 +1,171 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from kubernetes import client
+
+from q8s.pool import IDLE_GRACE, POOL_LABEL, WarmPool, exec_in_pod
+from q8s.project import Q8SPoolPolicy
+
+
+def make_template():
+    container = client.V1Container(
+        name="quantum-routine",
+        image="test-image",
+        command=["python"],
+        args=["/app/main.py"],
+        volume_mounts=[client.V1VolumeMount(name="app-volume", mount_path="/app")],
+    )
+
+    return client.V1PodTemplateSpec(
+        metadata=client.V1ObjectMeta(labels={"app": "test"}),
+        spec=client.V1PodSpec(
+            containers=[container],
+            restart_policy="Never",
+            volumes=[client.V1Volume(name="app-volume")],
+        ),
+    )
+
+
+def make_pod_list(names):
+    return client.V1PodList(
+        items=[client.V1Pod(metadata=client.V1ObjectMeta(name=n)) for n in names]
+    )
+
+
+class FakeExecResponse:
+    """
+    Public interface of the websocket client of an exec, receiving one
+    message per update; read_all drops the channels as the real one does.
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = {}
+        self.received = []
+
+    def is_open(self):
+        return bool(self.messages)
+
+    def update(self, timeout=0):
+        if self.messages:
+            channel, data = self.messages.pop(0)
+            self.channels[channel] = self.channels.get(channel, "") + data
+            if channel in (1, 2):
+                self.received.append(data)
+
+    def run_forever(self):
+        while self.is_open():
+            self.update()
+
+    def peek_channel(self, channel, timeout=0):
+        return self.channels.get(channel, "")
+
+    def peek_stdout(self):
+        return self.peek_channel(1)
+
+    def peek_stderr(self):
+        return self.peek_channel(2)
+
+    def read_stdout(self):
+        return self.channels.pop(1, "")
+
+    def read_stderr(self):
+        return self.channels.pop(2, "")
+
+    def read_all(self):
+        output, self.received = "".join(self.received), []
+        self.channels = {}
+        return output
+
+    @property
+    def returncode(self):
+        status = self.channels[3]
+        return 0 if status == "Success" else int(status)
+
+    def close(self):
+        pass
+
+
+class TestExecInPod(unittest.TestCase):
+
+    @patch("q8s.pool.stream")
+    def test_output(self, mock_stream):
+        mock_stream.return_value = FakeExecResponse(
+            [(1, "out\n"), (2, "err\n"), (3, "1")]
+        )
+
+        self.assertEqual(
+            exec_in_pod(MagicMock(), "pod", "default", ["python"]), ("out\nerr\n", 1)
+        )
+
+    @patch("q8s.pool.stream")
+    def test_follow(self, mock_stream):
+        response = FakeExecResponse([(1, "a"), (2, "b"), (1, "c"), (3, "Success")])
+        mock_stream.return_value = response
+        chunks = []
+
+        self.assertEqual(
+            exec_in_pod(MagicMock(), "pod", "default", ["python"], chunks.append),
+            ("", 0),
+        )
+        self.assertEqual(chunks, ["a", "b", "c"])
+        # Nothing kept of the forwarded output
+        self.assertEqual(response.received, [])
+
+
+@patch("q8s.pool.client.ApiClient")
+@patch("q8s.pool.client.CoreV1Api")
+class TestWarmPool(unittest.TestCase):
+
+    def test_idle_template(self, MockCoreV1Api, MockApiClient):
+        pool = WarmPool("pool", "default", make_template(), Q8SPoolPolicy(idle_ttl=30))
+
+        pool._WarmPool__fill()
+
+        body = MockCoreV1Api.return_value.create_namespaced_pod.call_args.kwargs["body"]
+        container = body.spec.containers[0]
+
+        self.assertEqual(body.metadata.labels, {POOL_LABEL: "pool"})
+        self.assertEqual(container.args, [str(30 + IDLE_GRACE)])
+        self.assertIsNone(container.volume_mounts)
+        self.assertIsNone(body.spec.volumes)
+
+    def test_fill_respects_max_size(self, MockCoreV1Api, MockApiClient):
+        pool = WarmPool(
+            "pool", "default", make_template(), Q8SPoolPolicy(size=3, max_size=2)
+        )
+
+        pool._WarmPool__fill()
+
+        self.assertEqual(MockCoreV1Api.return_value.create_namespaced_pod.call_count, 2)
+
+    def test_acquire_running_pod(self, MockCoreV1Api, MockApiClient):
+        api = MockCoreV1Api.return_value
+        pool = WarmPool("pool", "default", make_template(), Q8SPoolPolicy(size=1))
+
+        pool._WarmPool__fill()
+        name = api.create_namespaced_pod.call_args.kwargs["body"].metadata.name
+
+        api.list_namespaced_pod.return_value = make_pod_list([])
+        with patch.object(pool, "refill"):
+            self.assertIsNone(pool.acquire())
+
+        api.list_namespaced_pod.return_value = make_pod_list([name])
+        with patch.object(pool, "refill"):
+            self.assertEqual(pool.acquire(), name)
+            self.assertIsNone(pool.acquire())
+
+    def test_shutdown(self, MockCoreV1Api, MockApiClient):
+        api = MockCoreV1Api.return_value
+        pool = WarmPool("pool", "default", make_template(), Q8SPoolPolicy(size=1))
+
+        pool.shutdown()
+        pool._WarmPool__fill()
+
+        api.create_namespaced_pod.assert_not_called()
+        api.delete_collection_namespaced_pod.assert_called_once_with(
+            "default", label_selector=f"{POOL_LABEL}=pool", grace_period_seconds=0
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
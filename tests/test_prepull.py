@@ -0,0 +1,163 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from kubernetes import client
+
+from q8s.enums import Target
+from q8s.plugins.cpu_job import CPUJobTemplatePlugin
+from q8s.plugins.cuda_job import CUDAJobTemplatePlugin
+from q8s.prepull import PULL_CONTAINER, node_state, prepull
+
+
+def pod(node, running=False, waiting=None):
+    state = client.V1ContainerState(
+        running=client.V1ContainerStateRunning() if running else None,
+        waiting=(
+            None if waiting is None else client.V1ContainerStateWaiting(reason=waiting)
+        ),
+    )
+
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(name=f"puller-{node}"),
+        spec=client.V1PodSpec(containers=[], node_name=node),
+        status=client.V1PodStatus(
+            init_container_statuses=[
+                client.V1ContainerStatus(
+                    name=PULL_CONTAINER,
+                    image="user/q8s-example:gpu",
+                    image_id="",
+                    ready=False,
+                    restart_count=0,
+                    state=state,
+                )
+            ]
+        ),
+    )
+
+
+class TestPrepull(unittest.TestCase):
+
+    def test_node_state(self):
+        self.assertEqual(node_state(pod(None)), "scheduling")
+        self.assertEqual(
+            node_state(pod("node-1", waiting="PodInitializing")), "pulling"
+        )
+        self.assertEqual(
+            node_state(pod("node-1", waiting="ImagePullBackOff")),
+            "failed (ImagePullBackOff), retrying",
+        )
+        self.assertEqual(node_state(pod("node-1", running=True)), "pulled")
+
+    def test_templates(self):
+        image = "user/q8s-example:gpu@sha256:abc"
+        cpu = CPUJobTemplatePlugin().prepull(
+            name="puller",
+            registry_credentials_secret_name="regcred",
+            container_image=image,
+            target=Target.cpu,
+        )
+        gpu = CUDAJobTemplatePlugin().prepull(
+            name="puller",
+            registry_credentials_secret_name=None,
+            container_image=image,
+            target=Target.gpu,
+        )
+
+        puller = cpu.spec.init_containers[0]
+        self.assertEqual(puller.image, image)
+        self.assertEqual(puller.image_pull_policy, "IfNotPresent")
+        self.assertEqual(cpu.spec.image_pull_secrets[0].name, "regcred")
+        self.assertIsNone(cpu.spec.node_selector)
+
+        self.assertEqual(gpu.spec.node_selector, {"nvidia.com/gpu.present": "true"})
+        self.assertEqual(gpu.spec.runtime_class_name, "nvidia")
+        # Pulling does not take a GPU from the jobs
+        self.assertIsNone(gpu.spec.init_containers[0].resources.limits)
+
+        self.assertIsNone(
+            CPUJobTemplatePlugin().prepull(
+                name="puller",
+                registry_credentials_secret_name=None,
+                container_image=image,
+                target=Target.gpu,
+            )
+        )
+
+    @patch("q8s.prepull.resumable_watch")
+    def test_prepull(self, mock_watch):
+        apps_api = MagicMock()
+        apps_api.read_namespaced_daemon_set_status.return_value.status = (
+            client.V1DaemonSetStatus(
+                current_number_scheduled=2,
+                desired_number_scheduled=2,
+                number_misscheduled=0,
+                number_ready=0,
+                observed_generation=1,
+            )
+        )
+        mock_watch.return_value = iter(
+            [
+                {"type": "ADDED", "object": pod(None)},
+                {
+                    "type": "MODIFIED",
+                    "object": pod("node-1", waiting="PodInitializing"),
+                },
+                {"type": "ADDED", "object": pod("node-2", waiting="PodInitializing")},
+                {"type": "MODIFIED", "object": pod("node-2", running=True)},
+                {"type": "MODIFIED", "object": pod("node-1", waiting="ErrImagePull")},
+                {"type": "MODIFIED", "object": pod("node-1", running=True)},
+            ]
+        )
+        states = []
+
+        nodes = prepull(
+            apps_api,
+            MagicMock(),
+            "default",
+            "puller",
+            client.V1PodTemplateSpec(),
+            on_node=lambda node, state: states.append((node, state)),
+        )
+
+        self.assertEqual(nodes, ["node-1", "node-2"])
+        self.assertEqual(
+            states,
+            [
+                ("node-1", "pulling"),
+                ("node-2", "pulling"),
+                ("node-2", "pulled"),
+                ("node-1", "failed (ErrImagePull), retrying"),
+                ("node-1", "pulled"),
+            ],
+        )
+        daemon_set = apps_api.create_namespaced_daemon_set.call_args[0][1]
+        self.assertEqual(daemon_set.spec.selector.match_labels, {"app": "puller"})
+        apps_api.delete_namespaced_daemon_set.assert_called_once_with(
+            "puller", "default", propagation_policy="Background"
+        )
+
+    @patch("q8s.prepull.resumable_watch")
+    def test_no_nodes(self, mock_watch):
+        apps_api = MagicMock()
+        apps_api.read_namespaced_daemon_set_status.return_value.status = (
+            client.V1DaemonSetStatus(
+                current_number_scheduled=0,
+                desired_number_scheduled=0,
+                number_misscheduled=0,
+                number_ready=0,
+                observed_generation=1,
+            )
+        )
+
+        self.assertEqual(
+            prepull(
+                apps_api, MagicMock(), "default", "puller", client.V1PodTemplateSpec()
+            ),
+            [],
+        )
+        mock_watch.assert_not_called()
+        apps_api.delete_namespaced_daemon_set.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
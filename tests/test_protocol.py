@@ -0,0 +1,92 @@
+import unittest
+
+from q8s.protocol import BEGIN, Frame, FrameParser, encode
+
+
+class TestFrameParser(unittest.TestCase):
+
+    def parse(self, chunks):
+        output = []
+        parser = FrameParser(
+            lambda text: output.append(("text", text)),
+            lambda frame: output.append(("frame", frame)),
+        )
+
+        for chunk in chunks:
+            parser.write(chunk)
+        parser.close()
+
+        # Join the consecutive text
+        joined = []
+        for kind, value in output:
+            if kind == "text" and joined and joined[-1][0] == "text":
+                joined[-1] = ("text", joined[-1][1] + value)
+            else:
+                joined.append((kind, value))
+
+        return joined
+
+    def test_plain_output(self):
+        self.assertEqual(
+            self.parse(["hello\n", "world\n"]), [("text", "hello\nworld\n")]
+        )
+
+    def test_frames(self):
+        html = "<table>\n<tr><td>1</td></tr>\n</table>"
+        output = (
+            "before\n"
+            + encode("text/html", html)
+            + encode("image/png", b"\x89PNG", {"width": 10})
+            + "after\n"
+        )
+
+        self.assertEqual(
+            self.parse([output]),
+            [
+                ("text", "before\n"),
+                ("frame", Frame("text/html", html)),
+                ("frame", Frame("image/png", "iVBORw==", {"width": 10})),
+                ("text", "after\n"),
+            ],
+        )
+
+    def test_any_chunk_boundaries(self):
+        output = "a\n" + encode("text/latex", "$x^2$") + "b\n"
+        expected = self.parse([output])
+
+        for size in range(1, 8):
+            chunks = [output[i : i + size] for i in range(0, len(output), size)]
+            self.assertEqual(self.parse(chunks), expected)
+
+    def test_separator_in_output(self):
+        self.assertEqual(
+            self.parse(["a\x1eb\n", BEGIN + "not json\n"]),
+            [("text", "a\x1eb\n" + BEGIN + "not json\n")],
+        )
+
+    def test_incomplete_frame(self):
+        output = encode("image/png", b"\x89PNG" * 100)
+
+        self.assertEqual(
+            self.parse([output[:100]]), [("text", "[incomplete image/png output]\n")]
+        )
+
+    def test_cut_frame(self):
+        output = encode("text/plain", "abcdef").replace("abcdef", "abcd") + "rest\n"
+
+        self.assertEqual(
+            self.parse([output]),
+            [("text", "[incomplete text/plain output]\n8s:end\nrest\n")],
+        )
+
+    def test_json_content(self):
+        frame = Frame("application/vnd.plotly.v1+json", '{"data": []}')
+
+        self.assertEqual(
+            frame.display_data(),
+            {"data": {"application/vnd.plotly.v1+json": {"data": []}}, "metadata": {}},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
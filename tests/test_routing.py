@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+
+from q8s.deps.code_analyzer import CircuitAnalyzer
+from q8s.enums import Target
+from q8s.routing import Router, RunHistory, memory_request
+
+SMALL = """
+from qiskit import QuantumCircuit, transpile
+from qiskit_aer import AerSimulator
+
+n = 5
+qc = QuantumCircuit(n, n)
+qc.h(0)
+result = AerSimulator().run(transpile(qc), shots=1000).result()
+"""
+
+LARGE = """
+from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister
+from qiskit.circuit.library import QFT
+
+N = 12
+a = QuantumRegister(N)
+b = QuantumRegister(N * 2)
+qc = QuantumCircuit(a, b, ClassicalRegister(3))
+"""
+
+
+class TestCircuitAnalyzer(unittest.TestCase):
+
+    def test_circuit_size(self):
+        analysis = CircuitAnalyzer(SMALL)
+
+        self.assertEqual(analysis.qubits, 5)
+        self.assertEqual(analysis.shots, 1000)
+        self.assertTrue(analysis.simulator)
+        self.assertTrue(analysis.quantum)
+
+    def test_registers(self):
+        self.assertEqual(CircuitAnalyzer(LARGE).qubits, 36)
+
+    def test_library_circuit(self):
+        self.assertEqual(CircuitAnalyzer("QFT(num_qubits=4 + 3)").qubits, 7)
+
+    def test_unknown_size(self):
+        analysis = CircuitAnalyzer(
+            "from qiskit import QuantumCircuit\nqc = QuantumCircuit(int(input()))"
+        )
+
+        self.assertIsNone(analysis.qubits)
+        self.assertTrue(analysis.quantum)
+
+    def test_device(self):
+        analysis = CircuitAnalyzer("AerSimulator(method='statevector', device='GPU')")
+
+        self.assertEqual(analysis.device, "GPU")
+
+
+class TestRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.history = RunHistory(os.path.join(self.directory.name, "routing.json"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_small_circuit(self):
+        routing = Router(gpu_qubits=20).route(SMALL)
+
+        self.assertEqual(routing.target, Target.cpu)
+        self.assertEqual(routing.qubits, 5)
+        self.assertEqual(routing.resources, {"memory": memory_request(5)})
+        self.assertIn("5 qubits", routing.reason)
+
+    def test_large_circuit(self):
+        routing = Router(gpu_qubits=20).route(LARGE)
+
+        self.assertEqual(routing.target, Target.gpu)
+        self.assertEqual(routing.resources, {})
+
+    def test_gpu_device(self):
+        routing = Router().route("AerSimulator(device='GPU')")
+
+        self.assertEqual(routing.target, Target.gpu)
+
+    def test_classical_code(self):
+        self.assertEqual(Router().route("print('hello')").target, Target.cpu)
+
+    def test_unknown_size(self):
+        routing = Router().route("from qiskit import QuantumCircuit\nQuantumCircuit(k)")
+
+        self.assertEqual(routing.target, Target.gpu)
+
+    def test_syntax_error(self):
+        self.assertEqual(Router().route("print(").target, Target.cpu)
+
+    def test_recorded_run_times(self):
+        router = Router(self.history, gpu_qubits=20)
+
+        router.record(24, Target.cpu, 3.0)
+        self.assertEqual(
+            router.route(LARGE.replace("N = 12", "N = 8")).target, Target.gpu
+        )
+
+        router.record(24, Target.gpu, 9.0)
+        router.record(24, Target.gpu, 11.0)
+        routing = router.route(LARGE.replace("N = 12", "N = 8"))
+
+        self.assertEqual(routing.target, Target.cpu)
+        self.assertIn("3.0 s on cpu and 10.0 s on gpu", routing.reason)
+
+    def test_history_size(self):
+        for i in range(30):
+            self.history.record(3, Target.cpu, float(i))
+
+        self.assertEqual(self.history.median(3, Target.cpu), 19.5)
+        self.assertIsNone(self.history.median(3, Target.gpu))
+
+
+class TestMemoryRequest(unittest.TestCase):
+
+    def test_memory_request(self):
+        self.assertEqual(memory_request(0), "257Mi")
+        self.assertEqual(memory_request(25), "1280Mi")
@@ -0,0 +1,143 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from kubernetes import client
+
+from q8s.session import (
+    CLIENT_COMMAND,
+    SERVER_COMMAND,
+    SESSION_LABEL,
+    UNAVAILABLE,
+    RemoteSession,
+)
+
+
+def make_template():
+    container = client.V1Container(
+        name="quantum-routine",
+        image="test-image",
+        command=["python"],
+        args=["/app/main.py"],
+        volume_mounts=[client.V1VolumeMount(name="app-volume", mount_path="/app")],
+    )
+
+    return client.V1PodTemplateSpec(
+        metadata=client.V1ObjectMeta(labels={"app": "test"}),
+        spec=client.V1PodSpec(
+            containers=[container],
+            restart_policy="Never",
+            volumes=[client.V1Volume(name="app-volume")],
+        ),
+    )
+
+
+def make_pod(phase, restarts=0):
+    return client.V1Pod(
+        status=client.V1PodStatus(
+            phase=phase,
+            container_statuses=[
+                client.V1ContainerStatus(
+                    name="quantum-routine",
+                    image="test-image",
+                    image_id="",
+                    ready=True,
+                    restart_count=restarts,
+                )
+            ],
+        )
+    )
+
+
+class TestInterpreter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket = os.path.join(self.directory.name, "q8s.sock")
+        self.server = subprocess.Popen(
+            [sys.executable, "-c", SERVER_COMMAND, "30", self.socket]
+        )
+
+    def tearDown(self):
+        self.server.kill()
+        self.server.wait()
+        self.directory.cleanup()
+
+    def run_cell(self, code):
+        return subprocess.run(
+            [sys.executable, "-c", CLIENT_COMMAND, self.socket, code],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+
+    def test_state_persists(self):
+        first = self.run_cell("import json\nvalue = 41")
+        second = self.run_cell("print(json.dumps(value + 1))")
+
+        self.assertEqual(first.returncode, 0)
+        self.assertEqual(second.returncode, 0)
+        self.assertEqual(second.stdout, "42\n")
+
+    def test_error(self):
+        result = self.run_cell("raise ValueError('boom')")
+
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("ValueError: boom", result.stdout)
+
+    def test_crash(self):
+        result = self.run_cell("import os\nos._exit(1)")
+
+        self.assertEqual(result.returncode, UNAVAILABLE)
+
+
+@patch("q8s.session.resumable_watch", return_value=iter([]))
+@patch("q8s.session.client.ApiClient")
+@patch("q8s.session.client.CoreV1Api")
+class TestRemoteSession(unittest.TestCase):
+
+    def test_session_template(self, MockCoreV1Api, MockApiClient, mock_watch):
+        api = MockCoreV1Api.return_value
+        session = RemoteSession("session", "default", make_template(), 60)
+
+        session.ensure()
+
+        body = api.create_namespaced_pod.call_args.kwargs["body"]
+        container = body.spec.containers[0]
+
+        self.assertEqual(body.metadata.name, "session-1")
+        self.assertEqual(body.metadata.labels, {SESSION_LABEL: "session"})
+        self.assertEqual(body.spec.restart_policy, "OnFailure")
+        self.assertEqual(container.args[0], "60")
+        self.assertIsNone(body.spec.volumes)
+
+    def test_restart_after_idle_exit(self, MockCoreV1Api, MockApiClient, mock_watch):
+        api = MockCoreV1Api.return_value
+        session = RemoteSession("session", "default", make_template(), 60)
+        session.ensure()
+
+        api.read_namespaced_pod.return_value = make_pod("Running")
+        self.assertIsNone(session.ensure())
+
+        api.read_namespaced_pod.return_value = make_pod("Succeeded")
+        self.assertIn("idle", session.ensure())
+        api.delete_namespaced_pod.assert_called_once()
+        self.assertEqual(
+            api.create_namespaced_pod.call_args.kwargs["body"].metadata.name,
+            "session-2",
+        )
+
+    def test_crash_reported(self, MockCoreV1Api, MockApiClient, mock_watch):
+        api = MockCoreV1Api.return_value
+        session = RemoteSession("session", "default", make_template(), 60)
+        session.ensure()
+
+        api.read_namespaced_pod.return_value = make_pod("Running", restarts=1)
+        self.assertIn("crashed", session.ensure())
+        self.assertIsNone(session.ensure())
+
+
+if __name__ == "__main__":
+    unittest.main()
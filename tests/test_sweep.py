@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from kubernetes import client
+
+from q8s.sweep import (
+    INDEX_ANNOTATION,
+    SWEEP_COMMAND,
+    latest_pods,
+    make_indexed,
+    parameter_grid,
+    parameters_file,
+    sweep_parameters,
+)
+
+
+def make_job():
+    container = client.V1Container(
+        name="quantum-routine", command=["python"], args=["/app/main.py"]
+    )
+
+    return client.V1Job(
+        metadata=client.V1ObjectMeta(
+            name="job", labels={"qubernetes.dev/job.type": "jupyter"}
+        ),
+        spec=client.V1JobSpec(
+            template=client.V1PodTemplateSpec(
+                spec=client.V1PodSpec(containers=[container])
+            )
+        ),
+    )
+
+
+def make_pod(name, index, minute):
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(
+            name=name,
+            annotations={INDEX_ANNOTATION: str(index)},
+            creation_timestamp=datetime(2025, 1, 1, 0, minute, tzinfo=timezone.utc),
+        )
+    )
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_parameter_grid(self):
+        self.assertEqual(
+            parameter_grid({"shots": [10, 100], "seed": [1, 2]}),
+            [
+                {"shots": 10, "seed": 1},
+                {"shots": 10, "seed": 2},
+                {"shots": 100, "seed": 1},
+                {"shots": 100, "seed": 2},
+            ],
+        )
+
+    def test_sweep_parameters(self):
+        self.assertEqual(
+            sweep_parameters({"shots": [10]}, ["seed=1,2"]),
+            [{"shots": 10, "seed": 1}, {"shots": 10, "seed": 2}],
+        )
+        self.assertEqual(sweep_parameters(None, ["name=a"]), [{"name": "a"}])
+
+        sets = [{"shots": 10}, {"shots": 100, "seed": 1}]
+        self.assertEqual(sweep_parameters(sets, []), sets)
+
+        with self.assertRaises(ValueError):
+            sweep_parameters(sets, ["seed=1,2"])
+        with self.assertRaises(ValueError):
+            sweep_parameters("shots", [])
+
+    def test_make_indexed(self):
+        job = make_indexed(make_job(), [{"seed": 1}, {"seed": 2}], parallelism=10)
+
+        self.assertEqual(job.spec.completion_mode, "Indexed")
+        self.assertEqual(job.spec.completions, 2)
+        self.assertEqual(job.spec.parallelism, 2)
+        self.assertEqual(job.spec.backoff_limit_per_index, 0)
+        self.assertEqual(
+            job.spec.template.spec.containers[0].args,
+            ["/app/main.py", "/app/params.json"],
+        )
+
+    def test_latest_pods(self):
+        pods = latest_pods(
+            [make_pod("retry", 0, 5), make_pod("first", 0, 1), make_pod("other", 1, 2)]
+        )
+
+        self.assertEqual(pods[0].metadata.name, "retry")
+        self.assertEqual(pods[1].metadata.name, "other")
+
+    def test_parameters_in_environment(self):
+        with tempfile.TemporaryDirectory() as directory:
+            main = os.path.join(directory, "main.py")
+            parameters = os.path.join(directory, "params.json")
+
+            with open(main, "w") as f:
+                f.write(
+                    "import os\n"
+                    "print(os.environ['Q8S_PARAM_SHOTS'], os.environ['Q8S_PARAM_NAME'])"
+                )
+            with open(parameters, "w") as f:
+                f.write(
+                    parameters_file(
+                        [{"shots": 10, "name": "a"}, {"shots": 20, "name": "b"}]
+                    )["params.json"]
+                )
+
+            result = subprocess.run(
+                [sys.executable, "-c", SWEEP_COMMAND, main, parameters],
+                capture_output=True,
+                text=True,
+                env={**os.environ, "JOB_COMPLETION_INDEX": "1"},
+            )
+
+        self.assertEqual(result.stdout, "20 b\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
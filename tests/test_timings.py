@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+import unittest
+from kubernetes import client
+
+from q8s.timings import Timings, pod_spans
+
+
+def at(second):
+    return datetime(2025, 1, 1, 0, 0, second, tzinfo=timezone.utc)
+
+
+def make_pod(state):
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(creation_timestamp=at(0)),
+        status=client.V1PodStatus(
+            conditions=[
+                client.V1PodCondition(
+                    type="PodScheduled", status="True", last_transition_time=at(2)
+                ),
+                client.V1PodCondition(
+                    type="PodReadyToStartContainers",
+                    status="True",
+                    last_transition_time=at(3),
+                ),
+            ],
+            container_statuses=[
+                client.V1ContainerStatus(
+                    name="quantum-routine",
+                    image="image",
+                    image_id="",
+                    ready=True,
+                    restart_count=0,
+                    state=state,
+                )
+            ],
+        ),
+    )
+
+
+class TestTimings(unittest.TestCase):
+
+    def test_span(self):
+        timings = Timings()
+
+        with timings.span("job"):
+            pass
+
+        self.assertEqual([span.name for span in timings.spans], ["job"])
+        self.assertGreaterEqual(timings.spans[0].duration, 0)
+
+        trace = timings.to_dict()["traceEvents"][0]
+        self.assertEqual(trace["ph"], "X")
+        self.assertEqual(trace["name"], "job")
+
+    def test_pod_spans_terminated(self):
+        pod = make_pod(
+            client.V1ContainerState(
+                terminated=client.V1ContainerStateTerminated(
+                    exit_code=0, started_at=at(10), finished_at=at(15)
+                )
+            )
+        )
+
+        spans = {span.name: span.duration for span in pod_spans(pod)}
+
+        self.assertEqual(
+            spans,
+            {
+                "scheduling": 2000,
+                "sandbox": 1000,
+                "pull_and_start": 7000,
+                "run": 5000,
+            },
+        )
+
+    def test_pod_spans_running(self):
+        pod = make_pod(
+            client.V1ContainerState(
+                running=client.V1ContainerStateRunning(started_at=at(10))
+            )
+        )
+
+        spans = {span.name: span.duration for span in pod_spans(pod, at(12))}
+
+        self.assertEqual(spans["run"], 2000)
+        self.assertEqual(spans["pull_and_start"], 7000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from time import monotonic
+from unittest.mock import MagicMock, patch
+from kubernetes.client.rest import ApiException
+
+from q8s.watcher import WatchTimeoutException, resumable_watch
+
+
+def event(type, resource_version):
+    obj = MagicMock()
+    obj.metadata.resource_version = resource_version
+
+    return {"type": type, "object": obj}
+
+
+def bookmark(resource_version):
+    return {
+        "type": "BOOKMARK",
+        "raw_object": {"metadata": {"resourceVersion": resource_version}},
+    }
+
+
+class TestResumableWatch(unittest.TestCase):
+
+    @patch("q8s.watcher.watch.Watch")
+    def test_resume_from_bookmark(self, MockWatch):
+        requests = []
+
+        def stream(func, **kwargs):
+            requests.append(dict(kwargs))
+            if len(requests) == 1:
+                yield event("ADDED", "1")
+                yield bookmark("5")
+            else:
+                yield event("MODIFIED", "6")
+
+        MockWatch.return_value.stream.side_effect = stream
+
+        events = resumable_watch(
+            MagicMock(), namespace="default", field_selector="metadata.name=job"
+        )
+
+        self.assertEqual(next(events)["type"], "ADDED")
+        self.assertEqual(next(events)["type"], "MODIFIED")
+
+        self.assertNotIn("resource_version", requests[0])
+        self.assertEqual(requests[1]["resource_version"], "5")
+        self.assertEqual(requests[1]["field_selector"], "metadata.name=job")
+        self.assertTrue(requests[1]["allow_watch_bookmarks"])
+
+    @patch("q8s.watcher.watch.Watch")
+    def test_restart_after_gone(self, MockWatch):
+        requests = []
+
+        def stream(func, **kwargs):
+            requests.append(dict(kwargs))
+            if len(requests) == 1:
+                yield event("ADDED", "1")
+                raise ApiException(status=410)
+            yield event("ADDED", "9")
+
+        MockWatch.return_value.stream.side_effect = stream
+
+        events = resumable_watch(MagicMock(), namespace="default")
+
+        next(events)
+        self.assertEqual(next(events)["object"].metadata.resource_version, "9")
+        self.assertNotIn("resource_version", requests[1])
+
+    @patch("q8s.watcher.watch.Watch")
+    def test_deadline(self, MockWatch):
+        MockWatch.return_value.stream.side_effect = lambda func, **kwargs: iter([])
+
+        with self.assertRaises(WatchTimeoutException):
+            next(resumable_watch(MagicMock(), deadline=monotonic()))
+
+    @patch("q8s.watcher.watch.Watch")
+    def test_stopped(self, MockWatch):
+        stops = iter([False, False, True])
+
+        def stream(func, **kwargs):
+            yield from []
+
+        MockWatch.return_value.stream.side_effect = stream
+
+        events = resumable_watch(MagicMock(), stopped=lambda: next(stops), window=1)
+
+        self.assertEqual(list(events), [])
+        self.assertEqual(MockWatch.return_value.stream.call_count, 2)
+        self.assertEqual(
+            MockWatch.return_value.stream.call_args.kwargs["timeout_seconds"], 1
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()